@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Удаление дерева с файлами "только для чтения": прежняя обработка (смена прав и пауза на каждом файле
+при ошибке удаления) против пакетного снятия защиты `functions.prepare_tree`.
+
+На Windows файл с атрибутом "только чтение" не удаляется, и прежний `onerror` вызывался для каждого такого файла.
+На других системах атрибут удалению не мешает, поэтому прежняя обработка воспроизводится явно: смена прав
+и пауза для каждого защищенного файла перед удалением.
+
+    python benchmarks/bench_readonly.py [--files 2000] [--sleep 0.3] [--legacy-limit 200]
+"""
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eiisclient.functions import prepare_tree, rmtree  # noqa: E402
+
+
+def make_tree(root: str, files: int, per_dir=100) -> str:
+    for n in range(files):
+        path = os.path.join(root, 'd{}'.format(n // per_dir), 'f{}.dbf'.format(n))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fp:
+            fp.write(b'x' * 128)
+        os.chmod(path, stat.S_IREAD)
+    return root
+
+
+def legacy_rmtree(root: str, sleep: float):
+    """Прежняя обработка: смена прав и пауза на каждом защищенном файле"""
+    for top, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(top, name)
+            if not os.access(path, os.W_OK) or not os.stat(path).st_mode & stat.S_IWRITE:
+                os.chmod(path, stat.S_IWUSR)
+                os.chmod(path, stat.S_IWRITE)
+                time.sleep(sleep)
+    shutil.rmtree(root)
+
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = ArgumentParser()
+    parser.add_argument('--files', type=int, default=2000, help='файлов в дереве')
+    parser.add_argument('--sleep', type=float, default=0.3, help='пауза прежнего onerror, сек.')
+    parser.add_argument('--legacy-limit', type=int, default=200,
+                        help='файлов для замера прежней обработки (результат пересчитывается на --files)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bench_readonly_') as tmp:
+        tree = make_tree(os.path.join(tmp, 'new'), args.files)
+        start = time.perf_counter()
+        changed = prepare_tree(tree)
+        prepared = time.perf_counter() - start
+        rmtree(tree)
+        total = time.perf_counter() - start
+
+        legacy_files = min(args.files, args.legacy_limit)
+        tree = make_tree(os.path.join(tmp, 'legacy'), legacy_files)
+        legacy = measure(legacy_rmtree, tree, args.sleep) * args.files / legacy_files
+
+    print('файлов: {}, защищенных: {}'.format(args.files, changed))
+    print('prepare_tree + rmtree: {:.3f} сек. (снятие защиты {:.3f} сек.)'.format(total, prepared))
+    print('прежняя обработка:     {:.3f} сек.{}'.format(
+        legacy, ' (оценка по {} файлам)'.format(legacy_files) if legacy_files < args.files else ''))
+    print('ускорение: x{:.0f}'.format(legacy / total if total else 0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Время запуска: импорт `eiisclient.manager`, создание `Manager` и первое обращение к перечням пакетов
+(чтение локального индекса и папки установки), чтение сохраненной сводки для отображения при запуске.
+
+Каждый замер выполняется в отдельном процессе (импорт модулей - с нуля) на синтетическом локальном индексе
+во временной рабочей директории; пути рабочей директории и папки установки подменяются.
+
+    python benchmarks/bench_startup.py [--packages 60] [--files 500] [--runs 5]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import SUPPRESS, ArgumentParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_index(work: str, eiis: str, packages: int, files: int):
+    index = {'meta': {'stamp': time.time()}, 'packages': {}}
+    for p in range(packages):
+        name = 'pack{}'.format(p)
+        entries = {'sub{}\\f{}.dbf'.format(f % 10, f): '{:040x}'.format(p * files + f) for f in range(files)}
+        index['packages'][name] = {'files': entries, 'sizes': {rel: 1024 for rel in entries},
+                                   'size': 1024 * files, 'alias': None, 'phash': '{:040x}'.format(p),
+                                   'execf': 'sub0\\f0.dbf'}
+        os.makedirs(os.path.join(eiis, name), exist_ok=True)
+    with open(os.path.join(work, 'index.json'), 'w', encoding='utf-8') as fp:
+        json.dump(index, fp, ensure_ascii=False, indent=4)
+    with open(os.path.join(work, 'index.json.sha1'), 'w', encoding='utf-8') as fp:
+        fp.write('{:040x}'.format(packages))
+
+
+def child(work: str, eiis: str):
+    """Замер в отдельном процессе; результат - json в stdout"""
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import eiisclient.manager  # noqa: F401
+    imported = time.perf_counter()
+    from benchenv import isolate_manager
+    manager = isolate_manager(work, eiis)
+
+    started = time.perf_counter()
+    mngr = manager.Manager()
+    created = time.perf_counter()
+    pack_list, _ = mngr.cached_summary()
+    summary = time.perf_counter()
+    len(mngr.pack_list), len(mngr.info_list)
+    loaded = time.perf_counter()
+    mngr.close()
+    print(json.dumps({
+        'import': imported - start,
+        'manager': created - started,
+        'summary': summary - created if pack_list is not None else None,
+        'lists': loaded - summary,
+    }))
+
+
+def measure(work: str, eiis: str) -> dict:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', work, eiis],
+                         cwd=work, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = ArgumentParser()
+    parser.add_argument('--packages', type=int, default=60, help='пакетов в индексе')
+    parser.add_argument('--files', type=int, default=500, help='файлов в пакете')
+    parser.add_argument('--runs', type=int, default=5, help='запусков')
+    parser.add_argument('--child', nargs=2, help=SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return child(*args.child)
+
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as tmp:
+        work, eiis = os.path.join(tmp, 'work'), os.path.join(tmp, 'eiis')
+        os.makedirs(work)
+        make_index(work, eiis, args.packages, args.files)
+        results = [measure(work, eiis) for _ in range(args.runs)]  # первый запуск сохраняет сводку
+
+    print('пакетов: {}, файлов в пакете: {}, запусков: {}'.format(args.packages, args.files, args.runs))
+    for key, title in (('import', 'импорт eiisclient.manager'), ('manager', 'создание Manager'),
+                       ('summary', 'сводка прошлого запуска'), ('lists', 'перечни пакетов (индекс)')):
+        values = [result[key] for result in results if result[key] is not None]
+        if values:
+            print('{:<28} {:.4f} сек. (медиана)'.format(title, statistics.median(values)))
+    first = statistics.median(result['import'] + result['manager'] + (result['summary'] or 0)
+                              for result in results[1:] or results)
+    print('{:<28} {:.4f} сек. (медиана)'.format('до первых данных в окне', first))
+
+
+if __name__ == '__main__':
+    main()
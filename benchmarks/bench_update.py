@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Замер полного цикла обновления на синтетическом репозитории
+
+Сценарии для каждого диспетчера (локальная папка - `FileDispatcher`, локальный FTP-сервер - `FTPDispatcher`):
+    install - установка всех пакетов на чистое рабочее место;
+    update - обновление после изменения части пакетов репозитория (см. `synthrepo.mutate`).
+Для каждого сценария замеряются этапы `check_updates`, `get_task`, `handle_tasks`, `flush_buffer` и общее время.
+
+Результаты выводятся таблицей и, с `--json`, записываются в файл. С `--baseline` результаты сравниваются
+с ранее записанными: этап, ставший медленнее более чем на `--tolerance` (и не менее чем на `--min-delta` сек.),
+считается регрессией, код завершения - 1.
+
+С `--profile` загрузка идет через имитацию канала связи (`eiisclient.netsim.PROFILES`), например
+`--profile branch-2mbit` - филиал с каналом 2 Мбит/с; `--profile-seed` задает последовательность сбоев.
+
+    python benchmarks/bench_update.py [--packages 200] [--files 50] [--dispatchers file,ftp]
+                                      [--profile branch-2mbit] [--json results.json] [--baseline baseline.json]
+"""
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import synthrepo
+from benchenv import isolate_manager
+from ftpserver import FTPStandIn
+
+from eiisclient import __version__
+from eiisclient.cli import ConsoleProgress
+from eiisclient.exceptions import NoUpdates, PartialUpdateError
+from eiisclient.manager import Manager
+from eiisclient.netsim import PROFILES
+
+PHASES = ('check_updates', 'get_task', 'handle_tasks', 'flush_buffer', 'total')
+DISPATCHERS = ('file', 'ftp')
+EXIT_OK, EXIT_REGRESSION = 0, 1
+
+
+class TimedManager(Manager):
+    """Менеджер с замером времени этапов обновления"""
+
+    def __init__(self, *args, **kwargs):
+        self.timings = OrderedDict((phase, 0.0) for phase in PHASES[:-1])
+        super(TimedManager, self).__init__(*args, **kwargs)
+
+    @contextmanager
+    def timed(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - start
+
+    def check_updates(self, processBar):
+        with self.timed('check_updates'):
+            return super(TimedManager, self).check_updates(processBar)
+
+    def get_task(self, pack_list):
+        tasks = super(TimedManager, self).get_task(pack_list)
+        while True:
+            with self.timed('get_task'):
+                task = next(tasks, None)
+            if task is None:
+                return
+            yield task
+
+    def handle_tasks(self, *args, **kwargs):
+        with self.timed('handle_tasks'):
+            return super(TimedManager, self).handle_tasks(*args, **kwargs)
+
+    def flush_buffer(self, *args, **kwargs):
+        with self.timed('flush_buffer'):
+            return super(TimedManager, self).flush_buffer(*args, **kwargs)
+
+
+def run_client(repopath: str, client: str, **config) -> OrderedDict:
+    """Проверка обновлений и обновление всех пакетов рабочего места `client`"""
+    isolate_manager(os.path.join(client, 'work'), os.path.join(client, 'eiis'), repopath=repopath, **config)
+    logger = logging.getLogger('bench_update')
+    logger.setLevel(logging.WARNING)
+    if not logger.handlers:  # сообщения менеджера не выводятся (вне Windows ярлыки не создаются)
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+    manager = TimedManager(logger=logger)
+    progress = ConsoleProgress()
+    failed = 0
+    start = time.perf_counter()
+    try:
+        try:
+            manager.check_updates(progress)
+        except NoUpdates:
+            pass
+        for data in manager.pack_list.values():
+            data.checked = True
+        try:
+            manager.start_update(progress)
+        except PartialUpdateError as err:  # сбои имитации канала связи, не исправленные повторами
+            failed = sum(len(files) for files in err.failures.values())
+            print('{}: {}'.format(client, err))
+    finally:
+        total = time.perf_counter() - start
+        manager.close()
+    result = OrderedDict(manager.timings)
+    result['total'] = total
+    if failed:
+        result['failed'] = failed
+    return result
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """
+    Регрессии относительно базовых результатов
+
+    :return: [(сценарий, этап, базовое время, текущее время), ..]
+    """
+    regressions = []
+    for scenario, timings in results.items():
+        for phase, value in timings.items():
+            base = baseline.get(scenario, {}).get(phase)
+            if base is None:
+                continue
+            if value > base * (1 + tolerance) and value - base >= min_delta:
+                regressions.append((scenario, phase, base, value))
+    return regressions
+
+
+def print_results(results: dict, baseline=None):
+    print('{:<16}'.format('сценарий') + ''.join('{:>15}'.format(phase) for phase in PHASES))
+    for scenario, timings in results.items():
+        line = '{:<16}'.format(scenario)
+        for phase in PHASES:
+            value = timings.get(phase)
+            if value is None:
+                line += '{:>15}'.format('-')
+                continue
+            base = (baseline or {}).get(scenario, {}).get(phase)
+            delta = ' {:+.0%}'.format(value / base - 1) if base else ''
+            line += '{:>15}'.format('{:.3f}{}'.format(value, delta))
+        print(line)
+
+
+def get_args(argv=None):
+    parser = ArgumentParser()
+    parser.add_argument('--packages', type=int, default=200, help='пакетов в репозитории')
+    parser.add_argument('--files', type=int, default=50, help='медиана количества файлов в пакете')
+    parser.add_argument('--size', type=int, default=16 * 1024, help='медиана размера файла, байт')
+    parser.add_argument('--sigma', type=float, default=1.5, help='разброс количества и размеров файлов')
+    parser.add_argument('--max-size', type=int, default=64 * 1024 * 1024, help='наибольший размер файла, байт')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--mutate', type=float, default=0.1, help='доля пакетов, изменяемых для сценария update')
+    parser.add_argument('--dispatchers', default=','.join(DISPATCHERS), help='диспетчеры через запятую')
+    parser.add_argument('--threads', type=int, default=None, help='потоков загрузки (по умолчанию - из настроек)')
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=None, help='имитация канала связи')
+    parser.add_argument('--profile-seed', type=int, default=1, help='начальное значение генератора сбоев')
+    parser.add_argument('--json', dest='json_file', default=None, help='записать результаты в файл')
+    parser.add_argument('--baseline', default=None, help='сравнить с результатами из файла')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление этапа, доля')
+    parser.add_argument('--min-delta', type=float, default=0.05, help='наименьшее учитываемое замедление, сек.')
+    parser.add_argument('--keep', default=None, help='папка для репозитория и рабочих мест (не удаляется)')
+    args = parser.parse_args(argv)
+    args.dispatchers = [name.strip() for name in args.dispatchers.split(',') if name.strip()]
+    unknown = set(args.dispatchers) - set(DISPATCHERS)
+    if unknown:
+        parser.error('неизвестные диспетчеры: {}'.format(', '.join(sorted(unknown))))
+    return args
+
+
+def main(argv=None) -> int:
+    args = get_args(argv)
+    config = {'threads': args.threads} if args.threads else {}
+    if args.profile:
+        config['net_profile'] = dict(PROFILES[args.profile], name=args.profile, seed=args.profile_seed)
+    tmp = args.keep or tempfile.mkdtemp(prefix='bench_update_')
+    cwd = os.getcwd()
+    repo = os.path.join(tmp, 'repo')
+    os.makedirs(repo, exist_ok=True)
+    server = FTPStandIn(repo).start() if 'ftp' in args.dispatchers else None
+    try:
+        results = OrderedDict()
+        stats = synthrepo.generate(repo, packages=args.packages, files=args.files, size=args.size,
+                                   sigma=args.sigma, max_size=args.max_size, seed=args.seed)
+        start = time.perf_counter()
+        synthrepo.index(repo)
+        results['repo/index'] = OrderedDict(total=time.perf_counter() - start)
+        print('репозиторий: пакетов {packages}, файлов {files}, {bytes} байт'.format(**stats))
+
+        urls = {'file': repo, 'ftp': server.url if server else None}
+        for name in args.dispatchers:
+            results['{}/install'.format(name)] = run_client(urls[name], os.path.join(tmp, name), **config)
+
+        mutated = synthrepo.mutate(repo, packages=args.mutate, seed=args.seed + 1)
+        synthrepo.index(repo)
+        print('изменено: пакетов {packages}, файлов {changed}, добавлено {added}, удалено {deleted}'.format(
+            **mutated))
+        for name in args.dispatchers:
+            results['{}/update'.format(name)] = run_client(urls[name], os.path.join(tmp, name), **config)
+    finally:
+        os.chdir(cwd)
+        if server is not None:
+            server.stop()
+        if not args.keep:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as fp:
+            baseline = json.load(fp)['results']
+    print_results(results, baseline)
+
+    if args.json_file:
+        data = {
+            'meta': OrderedDict(version=__version__, python=platform.python_version(), platform=platform.platform(),
+                                stamp=time.time(), repo=stats, mutated=mutated,
+                                params={key: value for key, value in vars(args).items()
+                                        if key not in ('json_file', 'baseline', 'keep')}),
+            'results': results,
+        }
+        with open(args.json_file, 'w', encoding='utf-8') as fp:
+            json.dump(data, fp, ensure_ascii=False, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta)
+        for scenario, phase, base, value in regressions:
+            print('регрессия: {} {}: {:.3f} -> {:.3f} сек.'.format(scenario, phase, base, value))
+        if regressions:
+            return EXIT_REGRESSION
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
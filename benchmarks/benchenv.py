@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+Окружение замеров: менеджер обновлений с рабочей директорией и папкой установки во временной папке
+
+Пути рабочей директории (%APPDATA%) и папки установки заданы константами `eiisclient.manager`;
+для замера они подменяются, настройки записываются в файл настроек во временной рабочей директории.
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import eiisclient.manager as manager  # noqa: E402
+
+WORK_FILES = ('LOCAL_INDEX_FILE', 'JOURNAL_FILE', 'STORE_DIR', 'FILE_STATE_CACHE', 'SUMMARY_FILE',
+              'INDEX_SNAPSHOT_FILE', 'RUN_REPORT_FILE', 'TIMELINE_FILE', 'TRACE_FILE',
+              'METRICS_FILE', 'HISTORY_FILE')
+
+
+def isolate_manager(work: str, eiis: str, **config):
+    """
+    Подмена путей менеджера на `work` и `eiis`, запись настроек `config`
+
+    :return: модуль `eiisclient.manager`
+    """
+    os.makedirs(work, exist_ok=True)
+    for name in WORK_FILES:
+        setattr(manager, name, os.path.join(work, os.path.basename(getattr(manager, name))))
+    manager.LOCAL_INDEX_FILE_HASH = '{}.sha1'.format(manager.LOCAL_INDEX_FILE)
+    manager.WORK_DIR = work
+    manager.CONFIGFILE = os.path.join(work, 'config.json')
+    manager.DEFAULT_INSTALL_PATH = eiis
+    with open(manager.CONFIGFILE, 'w', encoding='utf-8') as fp:
+        json.dump(config, fp)
+    os.chdir(work)
+    if not os.name == 'nt':  # временная папка менеджера - в %TEMP%, вне Windows - относительный путь
+        os.makedirs('%TEMP%', exist_ok=True)
+    return manager
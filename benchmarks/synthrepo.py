@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Синтетический репозиторий для замеров
+
+Количество файлов в пакетах и размеры файлов распределены неравномерно (логнормально): большинство пакетов
+небольшие, несколько - крупные; большинство файлов - мелкие, единицы - большие (размер ограничен `max_size`).
+Структура и размеры определяются `seed`, содержимое файлов - случайное. Индекс строится индексатором
+репозитория `tests.eiisrepo`.
+"""
+import math
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from tests.eiisrepo.eiisrepo import Manager as RepoIndexer  # noqa: E402
+
+EXTENSIONS = ('.dbf', '.exe', '.dll', '.ini', '.xls', '.frf', '.txt')
+CHUNK = 1024 * 1024
+
+
+def _lognormal(rnd: random.Random, median: float, sigma: float, low: int, high: int) -> int:
+    return int(min(max(rnd.lognormvariate(math.log(median), sigma), low), high))
+
+
+def _write(path: str, size: int):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        while size > 0:
+            fp.write(os.urandom(min(size, CHUNK)))
+            size -= CHUNK
+
+
+def generate(root: str, packages=200, files=50, size=16 * 1024, sigma=1.5, max_size=64 * 1024 * 1024,
+             seed=1) -> dict:
+    """
+    Создание пакетов репозитория
+
+    :param packages: пакетов
+    :param files: медиана количества файлов в пакете
+    :param size: медиана размера файла, байт
+    :param sigma: разброс (параметр логнормального распределения) количества файлов и размеров
+    :param max_size: наибольший размер файла, байт
+    :return: {'packages': .., 'files': .., 'bytes': ..}
+    """
+    rnd = random.Random(seed)
+    total_files = total_bytes = 0
+    for p in range(packages):
+        package = os.path.join(root, 'pack{:05d}'.format(p))
+        count = _lognormal(rnd, files, sigma, 1, files * 50)
+        for f in range(count):
+            rel = os.path.join('dir{}'.format(f % 7), 'file{}{}'.format(f, rnd.choice(EXTENSIONS)))
+            fsize = _lognormal(rnd, size, sigma, 0, max_size)
+            _write(os.path.join(package, rel), fsize)
+            total_bytes += fsize
+        total_files += count
+    return {'packages': packages, 'files': total_files, 'bytes': total_bytes}
+
+
+def mutate(root: str, packages=0.1, files=0.2, seed=2) -> dict:
+    """
+    Изменение части пакетов: перезапись доли файлов, добавление и удаление файла в каждом измененном пакете
+
+    :param packages: доля изменяемых пакетов
+    :param files: доля перезаписываемых файлов изменяемого пакета
+    :return: {'packages': .., 'changed': .., 'added': .., 'deleted': .., 'bytes': ..}
+    """
+    rnd = random.Random(seed)
+    names = sorted(name for name in os.listdir(root)
+                   if os.path.isdir(os.path.join(root, name)) and not name.startswith('__'))
+    result = dict(packages=0, changed=0, added=0, deleted=0, bytes=0)
+    for name in rnd.sample(names, max(1, int(len(names) * packages))):
+        package = os.path.join(root, name)
+        paths = sorted(os.path.join(top, fname) for top, _, fnames in os.walk(package) for fname in fnames)
+        for path in rnd.sample(paths, max(1, int(len(paths) * files))):
+            fsize = os.path.getsize(path)
+            _write(path, fsize)
+            result['changed'] += 1
+            result['bytes'] += fsize
+        if len(paths) > 1:
+            os.remove(rnd.choice(paths))
+            result['deleted'] += 1
+        fsize = rnd.randint(1024, 256 * 1024)
+        _write(os.path.join(package, 'new', 'added{}.dat'.format(seed)), fsize)
+        result['added'] += 1
+        result['bytes'] += fsize
+        result['packages'] += 1
+    return result
+
+
+def index(root: str, **kwargs):
+    """Индексация репозитория (параметры - см. `tests.eiisrepo.eiisrepo.Manager`)"""
+    RepoIndexer(root, **kwargs).index()
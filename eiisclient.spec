@@ -10,7 +10,7 @@ a = Analysis(['eiisclient\\main.py'],
              hiddenimports=[],
              hookspath=[],
              runtime_hooks=[],
-             excludes=['multiprocessing'],
+             excludes=[],
              win_no_prefer_redirects=False,
              win_private_assemblies=False,
              cipher=block_cipher,
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+
+"""
+Запуск без графического интерфейса
+
+    python -m eiisclient.cli check [--wait МИНУТ]
+    python -m eiisclient.cli update [--wait МИНУТ] [--full] [-p ПАКЕТ ..] [-r ПАКЕТ ..]
+    python -m eiisclient.cli verify [--repair] [-p ПАКЕТ ..]
+    python -m eiisclient.cli clean-buffer
+    python -m eiisclient.cli history [--days 30] [--trend | --packages]
+
+Общие параметры: `--progress` - выводить процент выполнения, `--json ФАЙЛ` - записать результат в формате json
+(`-` - в стандартный вывод, сообщения при этом выводятся в поток ошибок). Команды доступны и в собранной программе:
+`eiisclient.exe update --json result.json`.
+
+Коды завершения:
+    0 - выполнено (обновлений нет, расхождений нет или все восстановлены);
+    1 - есть обновления (check) или расхождения (verify);
+    2 - ошибка;
+    3 - репозиторий заблокирован для обновления;
+    4 - обновление выполнено частично.
+"""
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+from eiisclient.exceptions import NoUpdates, PartialUpdateError, RepoIsBusy
+from eiisclient.structures import State
+
+EXIT_OK, EXIT_DIFF, EXIT_ERROR, EXIT_BUSY, EXIT_PARTIAL = 0, 1, 2, 3, 4
+STATUS = {EXIT_OK: 'ok', EXIT_DIFF: 'diff', EXIT_ERROR: 'error', EXIT_BUSY: 'busy', EXIT_PARTIAL: 'partial'}
+BUSY_POLL = 60  # сек. между проверками заблокированного репозитория
+ACTIONS = {'upd': 'обновление', 'new': 'установка', 'del': 'удаление'}
+
+
+class ConsoleProgress:
+    """
+    Индикатор выполнения для Manager без графического интерфейса
+
+    Вместо шкалы - вызов `callback(процент)` при изменении процента выполнения не менее чем на `step`,
+    по достижении 100% и при начале нового этапа (уменьшении значения).
+    """
+
+    def __init__(self, callback=None, step=10):
+        self._range = 100
+        self._value = 0
+        self._percent = None
+        self.callback = callback
+        self.step = step
+
+    def SetRange(self, value):
+        self._range = value
+
+    def GetRange(self):
+        return self._range
+
+    def SetValue(self, value):
+        self._value = value
+        if self.callback is None or not self._range:
+            return
+        percent = min(int(value * 100 / self._range), 100)
+        last = self._percent
+        if last is None or percent < last or percent >= last + self.step or (percent == 100 and last < 100):
+            self._percent = percent
+            self.callback(percent)
+
+    def GetValue(self):
+        return self._value
+
+
+def get_logger(debug=False, stream=None) -> logging.Logger:
+    logger = logging.getLogger('eiisclient.cli')
+    logger.setLevel(logging.DEBUG if debug else logging.INFO)
+    if not logger.handlers:
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+    return logger
+
+
+def get_args(argv=None):
+    parser = ArgumentParser(prog='eiisclient.exe')
+    parser.add_argument("-d", "--debug", dest='debug', action="store_true", default=False,
+                        help="включить режим отладки")
+    parser.add_argument("--progress", dest='progress', action="store_true", default=False,
+                        help="выводить процент выполнения")
+    parser.add_argument("--json", dest='json', default=None, metavar='ФАЙЛ',
+                        help="записать результат в формате json, `-` - в стандартный вывод")
+    commands = parser.add_subparsers(dest='command')
+    check = commands.add_parser('check', help='проверка наличия обновлений')
+    update = commands.add_parser('update', help='проверка наличия обновлений и обновление пакетов')
+    for command in (check, update):
+        command.add_argument("--wait", dest='wait', type=int, default=0, metavar='МИНУТ',
+                             help="ожидать снятия блокировки репозитория")
+    update.add_argument("-p", "--package", dest='packages', action='append', default=[],
+                        help="установить пакет, дополнительно к установленным")
+    update.add_argument("-r", "--remove", dest='remove', action='append', default=[],
+                        help="удалить установленный пакет")
+    update.add_argument("--full", dest='full', action='store_true', default=False,
+                        help="полное обновление установленных пакетов")
+    verify = commands.add_parser('verify', help='проверка установленных пакетов')
+    verify.add_argument("-p", "--package", dest='packages', action='append', default=None,
+                        help="проверить только указанный пакет (папку пакета)")
+    verify.add_argument("--repair", dest='repair', action='store_true', default=False,
+                        help="загрузить отсутствующие и измененные файлы")
+    commands.add_parser('clean-buffer', help='очистка буфера загруженных файлов')
+    history = commands.add_parser('history', help='история запусков проверки обновлений и обновления')
+    history.add_argument("--days", dest='days', type=int, default=30, help="за последние дни (0 - за все время)")
+    history.add_argument("--limit", dest='limit', type=int, default=20, help="количество строк")
+    view = history.add_mutually_exclusive_group()
+    view.add_argument("--trend", dest='trend', action='store_true', default=False,
+                      help="медиана длительности обновления по репозиториям")
+    view.add_argument("--packages", dest='top_packages', action='store_true', default=False,
+                      help="пакеты с наибольшим временем загрузки")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.error('не указана команда')
+    return args
+
+
+def get_progress(args, logger) -> ConsoleProgress:
+    if not args.progress:
+        return ConsoleProgress()
+    return ConsoleProgress(lambda percent: logger.info('Выполнено {}%'.format(percent)))
+
+
+def _call(manager, output, method, *args):
+    """Вызов запуска менеджера с добавлением его отчета в результат"""
+    try:
+        return method(*args)
+    finally:
+        if output is not None and manager.last_run is not None:
+            output.setdefault('runs', []).append(manager.last_run.as_dict())
+
+
+def _check(manager, args, logger, progress, output) -> int:
+    """
+    Проверка обновлений с ожиданием снятия блокировки репозитория
+
+    :return: EXIT_DIFF - есть обновления, EXIT_OK - обновлений нет, EXIT_BUSY - репозиторий заблокирован
+    """
+    deadline = time.time() + args.wait * 60
+    while True:
+        try:
+            _call(manager, output, manager.check_updates, progress)
+        except NoUpdates as err:
+            logger.info(err)
+            return EXIT_OK
+        except RepoIsBusy as err:
+            if time.time() + BUSY_POLL > deadline:
+                logger.error(err)
+                return EXIT_BUSY
+            logger.info('{} Повтор через {} сек.'.format(err, BUSY_POLL))
+            time.sleep(BUSY_POLL)
+        else:
+            return EXIT_DIFF
+
+
+def _actions(manager) -> OrderedDict:
+    """Действия с пакетами при обновлении: {пакет: 'upd' | 'new' | 'del'}"""
+    pack_list = manager.pack_list
+    actions = OrderedDict()
+    for pack in sorted(pack_list):
+        action = pack_list.get_action(pack)
+        if not action == State.NON:
+            actions[pack] = action.name.lower()
+    return actions
+
+
+def _select(manager, packages: list, checked: bool):
+    """Отметка пакетов для установки или удаления (как в перечне пакетов графического интерфейса)"""
+    pack_list = manager.pack_list
+    for pack in packages:
+        pack_data = pack_list.get(pack) or pack_list.get_by_origin(pack)[1]
+        if pack_data is None:
+            raise ValueError('пакет `{}` не найден'.format(pack))
+        pack_data.checked = checked
+        if checked and not pack_data.installed:
+            pack_data.status = State.NEW
+        elif not checked and pack_data.installed:
+            pack_data.status = State.DEL
+
+
+def check(manager, args, logger, output=None) -> int:
+    code = _check(manager, args, logger, get_progress(args, logger), output)
+    if code == EXIT_DIFF:
+        actions = _actions(manager)
+        for pack, action in actions.items():
+            logger.info('{}: {}'.format(pack, ACTIONS[action]))
+        if output is not None:
+            output['packages'] = actions
+    return code
+
+
+def update(manager, args, logger, output=None) -> int:
+    progress = get_progress(args, logger)
+    code = _check(manager, args, logger, progress, output)
+    if code == EXIT_BUSY:
+        return code
+    _select(manager, args.packages, True)
+    _select(manager, args.remove, False)
+    manager.set_full(args.full)
+    actions = _actions(manager)
+    if output is not None:
+        output['packages'] = actions
+    if code == EXIT_OK and not actions and not args.full:
+        return EXIT_OK
+    for pack, action in actions.items():
+        logger.info('{}: {}'.format(pack, ACTIONS[action]))
+    try:
+        _call(manager, output, manager.start_update, progress)
+    except RepoIsBusy as err:
+        logger.error(err)
+        return EXIT_BUSY
+    except PartialUpdateError as err:
+        logger.error(err)
+        if output is not None:
+            output['failures'] = {pack: [fname for fname, _ in files] for pack, files in err.failures.items()}
+        return EXIT_PARTIAL
+    logger.info('Обновление завершено')
+    return EXIT_OK
+
+
+def verify(manager, args, logger, output=None) -> int:
+    report = manager.verify(args.packages)
+    damaged = _damaged(report)
+    for package, result in sorted(report.items()):
+        for kind, title in (('missing', 'отсутствует'), ('modified', 'изменен'), ('extra', 'лишний')):
+            for fname in result[kind]:
+                logger.info('{}: {} - {}'.format(package, fname, title))
+    if output is not None:
+        output['packages'] = report
+    if not damaged:
+        return EXIT_OK
+    if not args.repair:
+        return EXIT_DIFF
+    _call(manager, output, manager.repair, damaged, get_progress(args, logger))
+    return EXIT_DIFF if _damaged(manager.verify(list(damaged))) else EXIT_OK
+
+
+def clean_buffer(manager, args, logger, output=None) -> int:
+    count = manager.buffer_count()
+    if not manager.clean_buffer():
+        return EXIT_ERROR
+    logger.info('Буфер очищен')
+    if output is not None:
+        output['buffered'] = count
+    return EXIT_OK
+
+
+def history(manager, args, logger, output=None) -> int:
+    if manager.history is None:
+        logger.error('История запусков отключена в настройках')
+        return EXIT_ERROR
+    if args.trend:
+        rows = manager.history.trend(days=args.days)
+        for row in rows:
+            logger.info('{repo} ({dispatcher}): запусков {runs}, медиана {median:.1f} сек., наибольшее {max:.1f} сек., '
+                        'скорость {speed:.2f} МБ/с'.format(speed=row['throughput'] / 1024 ** 2, **row))
+    elif args.top_packages:
+        rows = manager.history.top_packages(days=args.days, limit=args.limit)
+        for row in rows:
+            logger.info('{package}: {transfer:.1f} сек. ({percent:.0f}%), {size:.1f} МБ, файлов {files}, '
+                        'запусков {runs}'.format(percent=row['share'] * 100, size=(row['bytes'] or 0) / 1024 ** 2,
+                                                 **row))
+    else:
+        rows = manager.history.runs(limit=args.limit, days=args.days)
+        for row in rows:
+            logger.info('{stamp} {kind}: {result}, {elapsed:.1f} сек., файлов {files}, {size:.1f} МБ, '
+                        'потоков {threads}, {repo}'.format(
+                            stamp=time.strftime('%d-%m-%Y %H:%M:%S', time.localtime(row['started'])),
+                            size=(row['bytes'] or 0) / 1024 ** 2, **row))
+    if output is not None:
+        output['rows'] = rows
+    return EXIT_OK
+
+
+def _damaged(report: dict) -> dict:
+    """Пакеты с отсутствующими или измененными файлами"""
+    return {package: result for package, result in report.items() if result['missing'] or result['modified']}
+
+
+COMMANDS = OrderedDict((
+    ('check', check),
+    ('update', update),
+    ('verify', verify),
+    ('clean-buffer', clean_buffer),
+    ('history', history),
+))
+
+
+def write_output(path: str, output: dict):
+    data = json.dumps(output, ensure_ascii=False, indent=2)
+    if path == '-':
+        sys.stdout.write(data + '\n')
+        return
+    with open(path, 'w', encoding='utf-8') as fp:
+        fp.write(data)
+
+
+def main(argv=None) -> int:  # pragma: no cover
+    args = get_args(argv)
+    logger = get_logger(args.debug, stream=sys.stderr if args.json == '-' else None)
+    from eiisclient.manager import Manager
+
+    output = OrderedDict((('command', args.command), ('started', time.time())))
+    manager = None
+    try:
+        manager = Manager(logger=logger)
+        code = COMMANDS[args.command](manager, args, logger, output)
+    except Exception as err:
+        logger.error('Ошибка: {}'.format(err))
+        if args.debug:
+            logger.exception(err)
+        output['error'] = '{}: {}'.format(type(err).__name__, err)
+        code = EXIT_ERROR
+    finally:
+        if manager is not None:
+            manager.close()  # фоновая загрузка после проверки обновлений не нужна, очистка корзины завершается
+    output['exit_code'] = code
+    output['status'] = STATUS[code]
+    output['elapsed'] = round(time.time() - output['started'], 3)
+    if args.json:
+        try:
+            write_output(args.json, output)
+        except OSError as err:
+            logger.error('Ошибка записи результата: {}'.format(err))
+            return EXIT_ERROR
+    return code
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
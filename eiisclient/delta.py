@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Блочные патчи и поблочная синхронизация файлов
+
+Патч описывает новую версию файла относительно прежней последовательностью операций:
+    C <смещение> <длина>  - копирование участка прежней версии;
+    D <длина> <данные>    - данные новой версии.
+
+Новая версия разбивается на блоки по BLOCK_SIZE байт, каждый блок ищется среди блоков прежней версии по
+контрольной сумме; соседние операции одного вида объединяются. Подходит для файлов, изменяемых на месте
+или дополняемых в конец (базы данных, шаблоны форм, исполняемые файлы с измененными ресурсами). Патч сжимается
+gzip. Результат применения патча проверяется клиентом по контрольной сумме из индекса.
+
+Поблочная синхронизация не зависит от версии, установленной у клиента: индекс содержит контрольные суммы блоков
+по SYNC_BLOCK_SIZE байт больших файлов, клиент находит совпадающие блоки в установленной копии и загружает из
+репозитория только недостающие участки (смещением в файле или командой FTP REST).
+"""
+import gzip
+import hashlib
+import os
+import struct
+
+BLOCK_SIZE = 16 * 1024
+DELTA_MIN_SIZE = 16 * 1024 * 1024  # файлы, для которых строятся патчи
+DELTA_MAX_RATIO = 0.5  # патч публикуется, если он меньше этой доли размера файла
+DELTA_DIR = '__deltas__'  # папка патчей в репозитории
+MAGIC = b'EIISDLT1'
+SYNC_BLOCK_SIZE = 256 * 1024
+SYNC_DIGEST_LEN = 16  # длина контрольной суммы блока в индексе, символов
+SYNC_MAX_MISSING = 0.5  # доля недостающих блоков, при превышении которой файл загружается целиком
+
+_HEADER = struct.Struct('>IQ')
+_COPY = struct.Struct('>QI')
+_DATA = struct.Struct('>I')
+_OP_COPY, _OP_DATA, _OP_END = b'C', b'D', b'E'
+
+
+class DeltaError(Exception):
+    pass
+
+
+def delta_key(old_hash: str, new_hash: str) -> str:
+    """Ключ патча в индексе: контрольные суммы прежней и новой версий"""
+    return '{}-{}'.format(old_hash, new_hash)
+
+
+def _blocks(fp, block_size):
+    offset = 0
+    for block in iter(lambda: fp.read(block_size), b''):
+        yield offset, block
+        offset += len(block)
+
+
+def make_delta(old: str, new: str, patch: str, block_size=BLOCK_SIZE) -> int:
+    """
+    Построение патча
+
+    :param old: прежняя версия файла
+    :param new: новая версия файла
+    :param patch: путь файла патча
+    :return: размер патча, байт
+    """
+    known = {}
+    with open(old, 'rb') as fp:
+        for offset, block in _blocks(fp, block_size):
+            known.setdefault(hashlib.sha1(block).digest(), (offset, len(block)))
+
+    os.makedirs(os.path.dirname(patch) or '.', exist_ok=True)
+    tmp = '{}.tmp'.format(patch)
+    copy, data = None, []  # накапливаемые операции
+
+    with open(new, 'rb') as src, gzip.open(tmp, 'wb') as out:
+        def flush():
+            nonlocal copy, data
+            if copy is not None:
+                out.write(_OP_COPY + _COPY.pack(*copy))
+                copy = None
+            if data:
+                chunk = b''.join(data)
+                out.write(_OP_DATA + _DATA.pack(len(chunk)) + chunk)
+                data = []
+
+        out.write(MAGIC + _HEADER.pack(block_size, os.path.getsize(new)))
+        for _, block in _blocks(src, block_size):
+            match = known.get(hashlib.sha1(block).digest())
+            if match is not None and match[1] == len(block):
+                if copy is not None and copy[0] + copy[1] == match[0]:
+                    copy = (copy[0], copy[1] + match[1])
+                    continue
+                flush()
+                copy = match
+            else:
+                if copy is not None:
+                    flush()
+                data.append(block)
+        flush()
+        out.write(_OP_END)
+
+    os.replace(tmp, patch)
+    return os.path.getsize(patch)
+
+
+def _read(fp, size: int) -> bytes:
+    data = fp.read(size)
+    if not len(data) == size:
+        raise DeltaError('Патч поврежден: неожиданный конец файла')
+    return data
+
+
+def apply_delta(old: str, patch: str, new: str):
+    """
+    Применение патча к прежней версии файла
+
+    :param old: прежняя (установленная) версия файла
+    :param patch: файл патча
+    :param new: путь файла новой версии
+    """
+    os.makedirs(os.path.dirname(new) or '.', exist_ok=True)
+    try:
+        with gzip.open(patch, 'rb') as fp, open(old, 'rb') as base, open(new, 'wb') as out:
+            if not _read(fp, len(MAGIC)) == MAGIC:
+                raise DeltaError('Неизвестный формат патча')
+            _, size = _HEADER.unpack(_read(fp, _HEADER.size))
+            while True:
+                op = _read(fp, 1)
+                if op == _OP_END:
+                    break
+                if op == _OP_COPY:
+                    offset, length = _COPY.unpack(_read(fp, _COPY.size))
+                    base.seek(offset)
+                    out.write(_read(base, length))
+                elif op == _OP_DATA:
+                    length, = _DATA.unpack(_read(fp, _DATA.size))
+                    out.write(_read(fp, length))
+                else:
+                    raise DeltaError('Патч поврежден: неизвестная операция')
+            if not out.tell() == size:
+                raise DeltaError('Размер файла после применения патча не совпадает')
+    except (OSError, EOFError, struct.error) as err:
+        raise DeltaError('Ошибка применения патча: {}'.format(err)) from err
+
+
+def block_digest(block: bytes) -> str:
+    return hashlib.sha1(block).hexdigest()[:SYNC_DIGEST_LEN]
+
+
+def block_digests(path: str, block_size=SYNC_BLOCK_SIZE) -> list:
+    """Контрольные суммы блоков файла для индекса"""
+    with open(path, 'rb') as fp:
+        return [block_digest(block) for _, block in _blocks(fp, block_size)]
+
+
+def plan_blocks(installed: str, digests: list, block_size: int, max_missing=SYNC_MAX_MISSING) -> list:
+    """
+    Поиск блоков новой версии в установленной копии файла
+
+    :param installed: установленная копия файла
+    :param digests: контрольные суммы блоков новой версии
+    :param block_size: размер блока
+    :param max_missing: доля недостающих блоков, при превышении которой сборка не выполняется
+    :return: смещение каждого блока в установленной копии, None - блок загружается из репозитория
+    """
+    local = {}
+    with open(installed, 'rb') as fp:
+        for offset, block in _blocks(fp, block_size):
+            local.setdefault(block_digest(block), offset)
+
+    plan = [local.get(digest) for digest in digests]
+    missing = sum(1 for offset in plan if offset is None)
+    if digests and missing > len(digests) * max_missing:
+        raise DeltaError('Недостаточно совпадающих блоков: {} из {}'.format(len(digests) - missing, len(digests)))
+    return plan
+
+
+def missing_ranges(plan: list, block_size: int, size: int):
+    """Недостающие участки файла: (смещение, длина); соседние недостающие блоки объединяются в один участок"""
+    i = 0
+    while i < len(plan):
+        if plan[i] is not None:
+            i += 1
+            continue
+        end = i
+        while end < len(plan) and plan[end] is None:
+            end += 1
+        yield i * block_size, min(end * block_size, size) - i * block_size
+        i = end
+
+
+def fetch_missing(dst: str, size: int, block_size: int, plan: list, fetch_range) -> int:
+    """
+    Загрузка недостающих участков в файл `dst` по их смещениям; совпадающие блоки записывает `fill_blocks`
+
+    :param fetch_range: функция загрузки участка: (смещение, длина) -> bytes
+    :return: загружено байт
+    """
+    if not len(plan) == (size + block_size - 1) // block_size:
+        raise DeltaError('Количество блоков не соответствует размеру файла')
+    fetched = 0
+    os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+    with open(dst, 'wb') as out:
+        for offset, length in missing_ranges(plan, block_size, size):
+            data = fetch_range(offset, length)
+            if not len(data) == length:
+                raise DeltaError('Получено {} байт вместо {}'.format(len(data), length))
+            out.seek(offset)
+            out.write(data)
+            fetched += length
+        out.truncate(size)
+    return fetched
+
+
+def fill_blocks(installed: str, dst: str, size: int, block_size: int, plan: list):
+    """Запись совпадающих блоков установленной копии в файл `dst`, подготовленный `fetch_missing`"""
+    with open(installed, 'rb') as base, open(dst, 'r+b') as out:
+        if not os.fstat(out.fileno()).st_size == size:
+            raise DeltaError('Размер собранного файла не совпадает')
+        for i, offset in enumerate(plan):
+            if offset is None:
+                continue
+            base.seek(offset)
+            out.seek(i * block_size)
+            out.write(_read(base, min(block_size, size - i * block_size)))
+
+
+def sync_blocks(installed: str, dst: str, size: int, block_size: int, digests: list, fetch_range,
+                max_missing=SYNC_MAX_MISSING) -> int:
+    """
+    Сборка файла из совпадающих блоков установленной копии и загруженных недостающих участков
+
+    Исполнитель задач выполняет шаги сборки в разных полосах: `plan_blocks` и `fill_blocks` читают локальные
+    файлы, `fetch_missing` - загрузка по сети.
+
+    :param installed: установленная копия файла
+    :param dst: путь собираемого файла
+    :param size: размер файла новой версии
+    :param block_size: размер блока
+    :param digests: контрольные суммы блоков новой версии
+    :param fetch_range: функция загрузки участка: (смещение, длина) -> bytes
+    :param max_missing: доля недостающих блоков, при превышении которой сборка не выполняется
+    :return: загружено байт
+    """
+    plan = plan_blocks(installed, digests, block_size, max_missing)
+    fetched = fetch_missing(dst, size, block_size, plan, fetch_range)
+    fill_blocks(installed, dst, size, block_size, plan)
+    return fetched
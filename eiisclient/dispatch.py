@@ -4,13 +4,14 @@ import logging
 import os
 import re
 import shutil
-from ftplib import error_temp
+from ftplib import error_reply, error_temp
 from time import sleep
 
 from eiisclient import DEFAULT_ENCODING
 from eiisclient.exceptions import DispatcherActivationError
 
 BUSYMESSAGE = '__REGLAMENT__'
+FTP_BLOCK_SIZE = 64 * 1024
 
 
 class BaseDispatcher(object):
@@ -50,6 +51,16 @@ class BaseDispatcher(object):
         """
         raise NotImplementedError
 
+    def get_range(self, src: str, offset: int, length: int) -> bytes:
+        """
+        Чтение участка файла репозитория
+        :param src: полный путь к файлу-источнику
+        :param offset: смещение от начала файла
+        :param length: длина участка
+        :return: данные участка (короче `length`, если файл закончился)
+        """
+        raise NotImplementedError
+
     def repo_is_busy(self):
         """"""
         raise NotImplementedError
@@ -81,6 +92,11 @@ class FileDispatcher(BaseDispatcher):
         shutil.copyfile(src, dst)
         return dst
 
+    def get_range(self, src: str, offset: int, length: int) -> bytes:
+        with open(os.path.normpath(os.path.join(self._repo, src)), 'rb') as fp:
+            fp.seek(offset)
+            return fp.read(length)
+
     def up(self):
         self.check()
 
@@ -110,6 +126,7 @@ class FTPDispatcher(BaseDispatcher):
 
         self.ftpencode = kwargs.get('ftpencode', self.encode)
         self.hostname = None
+        self.port = 0  # 0 - порт FTP по умолчанию
         self.username = None
         self.password = None
         self._repo = None
@@ -138,6 +155,7 @@ class FTPDispatcher(BaseDispatcher):
         from urllib.parse import urlparse
         data = urlparse(repo_string)
         self.hostname = data.hostname
+        self.port = data.port or 0
         self.username = data.username
         self.password = data.password
         self._repo = data.path or '/'
@@ -147,7 +165,7 @@ class FTPDispatcher(BaseDispatcher):
         ftp = FTP()
         ftp.encoding = self.ftpencode
         try:
-            ftp.connect(self.hostname)
+            ftp.connect(self.hostname, self.port)
             ftp.login(self.username, self.password)
         except Exception as err:
             raise DispatcherActivationError from err
@@ -176,6 +194,33 @@ class FTPDispatcher(BaseDispatcher):
                     raise IOError(err)
         return dst
 
+    def get_range(self, src: str, offset: int, length: int) -> bytes:
+        src_path = self._sanitize_path(os.path.join(self.repopath, src))
+        try:
+            return self._retr_range(src_path, offset, length)
+        except Exception:
+            try:
+                self.up()
+                return self._retr_range(src_path, offset, length)
+            except Exception as err:
+                raise IOError(err)
+
+    def _retr_range(self, src_path, offset, length) -> bytes:
+        """Загрузка участка файла с позиции `offset` (команда REST) с закрытием соединения после `length` байт"""
+        self._ftp.voidcmd('TYPE I')
+        data = bytearray()
+        with self._ftp.transfercmd('RETR {}'.format(src_path), rest=offset) as conn:
+            while len(data) < length:
+                chunk = conn.recv(min(FTP_BLOCK_SIZE, length - len(data)))
+                if not chunk:
+                    break
+                data += chunk
+        try:
+            self._ftp.voidresp()  # 226 или 426 при досрочном закрытии соединения данных
+        except (error_temp, error_reply):
+            pass
+        return bytes(data)
+
     def repo_is_busy(self):
         try:
             listdir = list(self._ftp.mlsd(self.repopath))
@@ -196,9 +241,22 @@ class Dispatcher(object):
             return FileDispatcher(*args, **kwargs)
         elif re.match(r'\\\\[\w.-]+\\\w+((\\)?(\w+)(\\)?)+', value):
             return SMBDispatcher(*args, **kwargs)
+        elif os.name == 'posix' and os.path.isabs(value):  # локальный репозиторий вне Windows (тесты, замеры)
+            return FileDispatcher(*args, **kwargs)
         else:
             return None
 
 
 def get_dispatcher(repo, *args, **kwargs):
-    return Dispatcher(repo, *args, **kwargs)
+    """
+    Диспетчер для репозитория `repo`
+
+    :param profile: профиль имитации канала связи (см. `eiisclient.netsim`) - диспетчер оборачивается
+        в `SimulatedDispatcher`
+    """
+    profile = kwargs.pop('profile', None)
+    dispatcher = Dispatcher(repo, *args, **kwargs)
+    if profile is None or dispatcher is None:
+        return dispatcher
+    from eiisclient.netsim import SimulatedDispatcher
+    return SimulatedDispatcher(dispatcher, profile, *args, **kwargs)
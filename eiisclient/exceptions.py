@@ -77,3 +77,12 @@ class LinkDisabled(Exception):
 
 class IndexFixError(BaseManagerError):
     pass
+
+
+class PartialUpdateError(BaseManagerError):
+    def __init__(self, failures=None):
+        self.failures = failures or {}  # {пакет: [(файл, ошибка), ..]}
+
+    def __str__(self):
+        packs = ', '.join('`{}` ({})'.format(pack, len(files)) for pack, files in sorted(self.failures.items()))
+        return 'Обновление выполнено частично, не обработаны файлы пакетов: {}'.format(packs)
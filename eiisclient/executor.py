@@ -0,0 +1,675 @@
+# -*- coding: utf-8 -*-
+"""
+Исполнитель задач обработки файлов пакетов
+
+Обработка файла разнесена по полосам (lanes), у каждой своя очередь, свои потоки и свои счетчики:
+    net  - загрузка файлов из репозитория, по одному соединению (диспетчеру) на поток;
+    hash - локальная обработка: поиск готового файла в буфере, сборка файла по патчу или блокам, проверка
+           загруженного; большие файлы считаются в пуле процессов, чтобы не упираться в GIL.
+
+Удаление файлов выполняется не здесь: удаляемые файлы исключаются из пакета при его сборке (`eiisclient.install`).
+
+Задача переходит из полосы в полосу: hash (поиск в буфере) -> net (загрузка) -> hash (проверка).
+Поток сетевой полосы не занимается подсчетом хэша, и соединение не простаивает.
+Если для файла опубликован патч (`Task.patch`), сетевая полоса загружает только патч, применяет его к установленной
+версии полоса hash (этап сборки); если в индексе есть контрольные суммы блоков (`Task.blocks`), файл собирается из
+блоков установленной версии: полоса hash находит совпадающие блоки (этап плана), сетевая полоса загружает недостающие
+участки, полоса hash дописывает совпадающие блоки. При ошибке или несовпадении контрольной суммы результата файл
+загружается целиком. Счетчики сетевой полосы учитывают переданные по сети байты.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Empty, Queue
+
+from eiisclient.delta import apply_delta, fetch_missing, fill_blocks, plan_blocks
+from eiisclient.dispatch import BaseDispatcher
+from eiisclient.exceptions import HashMismatchError, RepoIsBusy
+from eiisclient.filecache import FileStateCache
+from eiisclient.functions import background_thread, file_hash_calc, remove
+from eiisclient.journal import UpdateJournal
+from eiisclient.timeline import NULL_TIMELINE, Timeline
+from eiisclient.trace import Tracer
+
+QUEUEMAXSIZE = 1000  # максимальное количество задач в обработке
+QUEUE_BUDGET = 256 * 1024 * 1024  # объем данных задач в обработке, байт
+LARGE_FILE_SIZE = 16 * 1024 * 1024  # файлы от этого размера считаются большими
+MAX_LARGE_TASKS = 3  # количество больших файлов в обработке
+MAX_REPEAT = 3  # количество попыток загрузки файла при несовпадении хэша
+RETRIES = 2  # количество повторных проходов по отложенным задачам
+RETRY_BACKOFF = 2.0  # пауза перед первым повторным проходом, сек.; удваивается с каждым проходом
+HASH_PROCESS_MIN_SIZE = 8 * 1024 * 1024  # файлы от этого размера считаются в пуле процессов
+POLL_TIMEOUT = 0.1
+PATCH_SUFFIX = '.patch'
+
+# этапы обработки задачи
+LOOKUP, PLAN, FETCH, ASSEMBLE, VERIFY = 'lookup', 'plan', 'fetch', 'assemble', 'verify'
+
+
+def get_stdout_logger() -> logging.Logger:
+    return logging.Logger(__name__)
+
+
+def cpu_count() -> int:
+    return os.cpu_count() or 1
+
+
+def _default(value, default):
+    return default if value is None else value
+
+
+class ByteBudget:
+    """
+    Допуск задач в обработку по объему данных
+
+    Размер задачи берется из индекса. Большие файлы (от `large_size`) допускаются не более `max_large` одновременно
+    и не занимают резерв бюджета (четверть), оставленный для мелких файлов: поток мелких файлов не останавливается,
+    пока загружаются большие. Задача, превышающая бюджет, допускается, если в своей группе нет задач в обработке.
+    """
+
+    def __init__(self, budget=QUEUE_BUDGET, large_size=LARGE_FILE_SIZE, max_large=MAX_LARGE_TASKS):
+        self.budget = budget
+        self.large_size = large_size
+        self.max_large = max(max_large, 1)
+        self.reserve = budget // 4  # резерв для мелких файлов
+        self.small_bytes = self.small_count = 0
+        self.large_bytes = self.large_count = 0
+
+    def __repr__(self):
+        return '<ByteBudget: small {}/{}, large {}/{}>'.format(self.small_count, self.small_bytes,
+                                                               self.large_count, self.large_bytes)
+
+    def is_large(self, size) -> bool:
+        return size >= self.large_size
+
+    def fits(self, size) -> bool:
+        if self.is_large(size):
+            if self.large_count >= self.max_large:
+                return False
+            return self.large_count == 0 or self.large_bytes + size <= self.budget - self.reserve
+        return self.small_count == 0 or \
+            self.small_bytes + size <= max(self.reserve, self.budget - self.large_bytes)
+
+    def take(self, size):
+        if self.is_large(size):
+            self.large_count += 1
+            self.large_bytes += size
+        else:
+            self.small_count += 1
+            self.small_bytes += size
+
+    def give(self, size):
+        if self.is_large(size):
+            self.large_count -= 1
+            self.large_bytes -= size
+        else:
+            self.small_count -= 1
+            self.small_bytes -= size
+
+
+class Job:
+    """Задача в обработке исполнителем"""
+    __slots__ = ('task', 'stage', 'size', 'attempts', 'delta', 'blocks', 'patch_file', 'plan', 'event')
+
+    def __init__(self, task, stage, size=0):
+        self.task = task
+        self.stage = stage
+        self.size = size  # размер, учтенный в бюджете очереди
+        self.attempts = 0  # количество неудачных проверок загруженного файла
+        self.delta = task.patch is not None  # файл получается применением патча к установленной версии
+        self.blocks = task.blocks is not None  # файл собирается из блоков установленной версии
+        self.patch_file = None  # загруженный патч, ожидающий применения
+        self.plan = None  # план поблочной сборки (`plan_blocks`)
+        self.event = None  # интервал задачи на временной шкале
+
+    def __repr__(self):
+        return '<Job {} {}>'.format(id(self.task), self.stage)
+
+
+class LaneStats:
+    """Счетчики полосы обработки"""
+
+    def __init__(self, name):
+        self.name = name
+        self.done = 0  # обработано задач
+        self.errors = 0
+        self.bytes = 0  # обработано байт
+        self.busy = 0.0  # суммарное время работы потоков, сек.
+        self.wait = 0.0  # суммарное время ожидания задач в очереди, сек.
+        self.max_depth = 0  # максимальная длина очереди
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<LaneStats {}: {}>'.format(self.name, self.as_dict())
+
+    def enqueued(self, depth):
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def add(self, busy, wait, size=0, error=False):
+        with self._lock:
+            self.done += 1
+            self.busy += busy
+            self.wait += wait
+            self.bytes += size
+            if error:
+                self.errors += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'done': self.done,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'busy': round(self.busy, 3),
+            'wait': round(self.wait, 3),
+            'max_depth': self.max_depth,
+        }
+
+
+class ConnectionStats:
+    """Счетчики соединения (потока загрузки)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.files = 0  # загружено файлов
+        self.bytes = 0
+        self.transfer = 0.0  # время загрузки, сек.
+        self.latency = []  # время проверки блокировки репозитория - запроса без передачи данных, сек.
+        self.packages = {}  # по пакетам: {пакет: [файлов, байт, время загрузки]}
+
+    def __repr__(self):
+        return '<ConnectionStats {}: {}>'.format(self.name, self.as_dict())
+
+    def add(self, package: str, size: int, elapsed: float):
+        """Учет загруженного файла"""
+        self.files += 1
+        self.bytes += size
+        self.transfer += elapsed
+        data = self.packages.setdefault(package, [0, 0, 0.0])
+        data[0] += 1
+        data[1] += size
+        data[2] += elapsed
+
+    @property
+    def throughput(self) -> float:
+        """Скорость загрузки, байт/сек."""
+        return self.bytes / self.transfer if self.transfer else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'files': self.files,
+            'bytes': self.bytes,
+            'transfer': round(self.transfer, 3),
+            'throughput': round(self.throughput),
+            'latency_avg': round(sum(self.latency) / len(self.latency), 4) if self.latency else None,
+            'latency_max': round(max(self.latency), 4) if self.latency else None,
+        }
+
+
+class Lane:
+    """Полоса обработки: очередь и счетчики"""
+
+    def __init__(self, name):
+        self.name = name
+        self.queue = Queue()
+        self.stats = LaneStats(name)
+        self.workers = []
+
+    def __repr__(self):
+        return '<Lane {}>'.format(self.name)
+
+    def put(self, job):
+        self.queue.put((time.perf_counter(), job))
+        self.stats.enqueued(self.queue.qsize())
+
+
+class LaneWorker(threading.Thread):
+    """Базовый поток полосы обработки"""
+
+    def __init__(self, lane: Lane, executor, logger=None, *args, **kwargs):
+        self.lane = lane
+        self.executor = executor  # type: TaskExecutor
+        self.logger = logger or get_stdout_logger()
+        super(LaneWorker, self).__init__(*args, **kwargs)
+        self.name = '{}'.format(self)
+        self.daemon = True
+
+    def __repr__(self):
+        return '{}{}'.format(self.lane.name.upper(), id(self))
+
+    def run(self):
+        if self.executor.background:
+            background_thread()
+        timeline = self.executor.timeline
+        idle = time.perf_counter()  # начало ожидания задачи
+        try:
+            while not self.executor.stopper.is_set():
+                try:
+                    queued, job = self.lane.queue.get(timeout=POLL_TIMEOUT)
+                except Empty:
+                    if self.executor.closed:
+                        return
+                    continue
+
+                start = time.perf_counter()
+                stage = job.stage
+                size, error = 0, False
+                try:
+                    size = self.handle(job) or 0
+                except Exception as err:
+                    error = True
+                    self.executor.fail(job, err)
+                finally:
+                    end = time.perf_counter()
+                    self.lane.stats.add(end - start, start - queued, size, error)
+                    self.lane.queue.task_done()
+                    if timeline.enabled:
+                        timeline.complete(self.name, 'wait', idle, start, 'idle')
+                        timeline.complete(self.name, stage, start, end, self.lane.name,
+                                          {'file': job.task.src, 'size': size, 'error': error})
+                    idle = end
+        finally:
+            self.stop()
+            self.logger.debug('worker {}: работу завершил'.format(self))
+
+    def handle(self, job: Job) -> int:
+        """
+        Обработка задачи
+
+        :return: количество обработанных байт
+        """
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class NetWorker(LaneWorker):
+    """Загрузка файлов из репозитория"""
+
+    def __init__(self, lane, executor, dispatcher: BaseDispatcher, *args, **kwargs):
+        super(NetWorker, self).__init__(lane, executor, *args, **kwargs)
+        self.dispatcher = dispatcher
+        self.connection = ConnectionStats(self.name)  # изменяется только потоком соединения
+        with self.executor.timeline.span(self.name, 'connect', 'net'):
+            self.dispatcher.up()
+
+    def handle(self, job):
+        task = job.task
+        timeline = self.executor.timeline
+        start = time.perf_counter()
+        with timeline.span(self.name, 'busy_check', 'net'):
+            busy = self.dispatcher.repo_is_busy()
+        self.connection.latency.append(time.perf_counter() - start)
+        if busy:
+            raise RepoIsBusy
+
+        start = time.perf_counter()
+
+        fetched = False
+        if job.delta:
+            try:
+                with timeline.span(self.name, 'patch', 'net'):
+                    size = self.fetch_patch(job)
+                fetched = True
+            except Exception as err:
+                self.executor.trace('worker {}: <{}> патч не загружен: {}', self, id(task), err)
+                job.delta = False
+                if job.blocks:
+                    self.executor.route(job, PLAN)
+                    return 0
+        if not fetched and job.plan is not None:
+            try:
+                with timeline.span(self.name, 'blocks', 'net'):
+                    size = self.fetch_blocks(job)
+                fetched = True
+            except Exception as err:
+                self.executor.trace('worker {}: <{}> поблочная загрузка не выполнена: {}', self, id(task), err)
+                job.blocks, job.plan = False, None
+        if not fetched:
+            with timeline.span(self.name, 'transfer', 'net'):
+                self.dispatcher.get_file(task.src, task.dst)
+            size = os.path.getsize(task.dst)
+        self.executor.trace('worker {}: <{}> файл {} загружен в буфер', self, id(task), task.dst)
+        self.connection.add(task.packetname, size, time.perf_counter() - start)
+        # после передачи в другую полосу задача не изменяется
+        self.executor.route(job, ASSEMBLE if job.patch_file or job.plan is not None else VERIFY)
+        return size
+
+    def fetch_patch(self, job) -> int:
+        """
+        Загрузка патча файла; патч применяется полосой hash
+
+        :return: размер патча, байт
+        """
+        fd, patch = tempfile.mkstemp(suffix=PATCH_SUFFIX)  # не в буфере: в папку пакета попадают только его файлы
+        os.close(fd)
+        try:
+            self.dispatcher.get_file(job.task.patch[0], patch)
+        except Exception:
+            remove(patch)
+            raise
+        job.patch_file = patch
+        return os.path.getsize(patch)
+
+    def fetch_blocks(self, job) -> int:
+        """
+        Загрузка участков файла, недостающих в установленной версии; совпадающие блоки дописывает полоса hash
+
+        :return: загружено байт
+        """
+        task = job.task
+        try:
+            fetched = fetch_missing(task.dst, task.size, task.blocks[1], job.plan,
+                                    lambda offset, length: self.dispatcher.get_range(task.src, offset, length))
+        except Exception:
+            remove(task.dst)
+            raise
+        self.executor.trace('worker {}: <{}> загружено {} из {} байт', self, id(task), fetched, task.size)
+        return fetched
+
+    def stop(self):
+        self.dispatcher.down()
+
+
+class HashWorker(LaneWorker):
+    """Проверка контрольных сумм файлов в буфере"""
+
+    def handle(self, job):
+        task = job.task
+        if job.stage == LOOKUP:
+            journal = self.executor.journal
+            if journal is not None and journal.file_completed(task):
+                self.executor.trace('worker {}: <{}> файл {} обработан по журналу, пропуск',
+                                    self, id(task), task.dst)
+                size = os.path.getsize(task.dst)
+                self.executor.report(task, size)
+                self.executor.count('skipped')
+                self.executor.done(job)
+                return size
+            if os.path.isfile(task.dst) and self.executor.cached_hash(task.dst) == task.hash:
+                self.executor.trace('worker {}: <{}> обнаружен загруженный файл в буфере {}, пропуск',
+                                    self, id(task), task.dst)
+                size = os.path.getsize(task.dst)
+                self.executor.report(task, size)
+                self.executor.count('skipped')
+                self.executor.complete(job)
+                return size
+            self.executor.route(job, PLAN if job.blocks and not job.delta else FETCH)
+            return 0
+
+        if job.stage == PLAN:
+            return self.plan(job)
+        if job.stage == ASSEMBLE:
+            return self.assemble(job)
+
+        # проверка загруженного файла
+        size = os.path.getsize(task.dst)
+        hash_sum = self.executor.cached_hash(task.dst)
+        self.executor.report(task, size)
+
+        if not hash_sum == task.hash and (job.delta or job.blocks):
+            # установленная версия отличается от базовой версии патча - полная загрузка
+            self.executor.trace('worker {}: <{}> собранный файл не прошел проверку', self, id(task))
+            job.delta = job.blocks = False
+            job.plan = None
+            remove(task.dst, raise_=True)
+            self.executor.route(job, FETCH)
+            return size
+
+        if not hash_sum == task.hash:
+            job.attempts += 1
+            self.executor.count('mismatched')
+            self.executor.trace('worker {}: <{}> HASH MISMATCH {} != {} [{}]',
+                                self, id(task), hash_sum, task.hash, job.attempts)
+            if job.attempts >= self.executor.max_repeat:
+                self.executor.trace('worker {}: <{}> исчерпан лимит загрузок файла', self, id(task))
+                raise HashMismatchError('Неверная контрольная сумма файла `{}` из пакета `{}`'.format(
+                    os.path.basename(task.src), task.packetname))
+            remove(task.dst, raise_=True)
+            self.executor.trace('worker {}: {} удален', self, task.dst)
+            self.executor.count('refetched')
+            self.executor.route(job, FETCH)
+            return size
+
+        self.executor.complete(job)
+        self.executor.trace('worker {}: задача <{}> выполнена', self, id(task))
+        return size
+
+    def plan(self, job) -> int:
+        """Поиск совпадающих блоков в установленной версии файла"""
+        task = job.task
+        installed, block_size, digests = task.blocks
+        try:
+            job.plan = plan_blocks(installed, digests, block_size)
+        except Exception as err:
+            self.executor.trace('worker {}: <{}> поблочная загрузка не выполняется: {}', self, id(task), err)
+            job.blocks = False
+        self.executor.route(job, FETCH)
+        return 0 if job.plan is None else os.path.getsize(installed)
+
+    def assemble(self, job) -> int:
+        """Применение загруженного патча или запись совпадающих блоков; при ошибке - загрузка без них"""
+        task = job.task
+        patch, job.patch_file = job.patch_file, None
+        try:
+            if patch:
+                apply_delta(task.patch[1], patch, task.dst)
+            else:
+                fill_blocks(task.blocks[0], task.dst, task.size, task.blocks[1], job.plan)
+        except Exception as err:
+            self.executor.trace('worker {}: <{}> файл не собран: {}', self, id(task), err)
+            remove(task.dst)
+            if patch:
+                job.delta = False
+                self.executor.route(job, PLAN if job.blocks else FETCH)
+            else:
+                job.blocks, job.plan = False, None
+                self.executor.route(job, FETCH)
+            return 0
+        finally:
+            if patch:
+                remove(patch)
+        self.executor.route(job, VERIFY)
+        return os.path.getsize(task.dst)
+
+
+class TaskExecutor:
+    """
+    Исполнитель задач обработки файлов пакетов
+
+    Задача считается в обработке с момента `submit` до завершения на последней полосе.
+    Допуск задач ограничен объемом данных в обработке (`ByteBudget`) и количеством задач `maxsize`.
+
+    Ошибка обработки файла не останавливает остальные задачи: задача откладывается в очередь повтора
+    (`deferred`), повтор выполняется после окончания основного плана. Работа останавливается только
+    при блокировке репозитория.
+    """
+    max_repeat = MAX_REPEAT
+
+    def __init__(self, dispatchers, logger=None, **kwargs):
+        self.logger = logger or get_stdout_logger()
+        self.stopper = kwargs.get('stopper') or threading.Event()
+        self.exc_queue = kwargs.get('exc_queue') or Queue()  # type: Queue
+        self.size_queue = kwargs.get('size_queue') or Queue()  # type: Queue
+        self.maxsize = kwargs.get('maxsize') or QUEUEMAXSIZE
+        self.budget = ByteBudget(kwargs.get('budget') or QUEUE_BUDGET,
+                                 kwargs.get('large_size') or LARGE_FILE_SIZE,
+                                 kwargs.get('max_large') or MAX_LARGE_TASKS)
+        # None - значение по умолчанию (параметр отсутствует в настройках)
+        self.hash_process_min_size = _default(kwargs.get('hash_process_min_size'), HASH_PROCESS_MIN_SIZE)
+        self.retries = _default(kwargs.get('retries'), RETRIES)
+        self.backoff = _default(kwargs.get('backoff'), RETRY_BACKOFF)
+        self.journal = kwargs.get('journal')  # type: UpdateJournal
+        self.file_cache = kwargs.get('file_cache')  # type: FileStateCache
+        self.background = kwargs.get('background', False)  # потоки с пониженным приоритетом
+        self.timeline = kwargs.get('timeline')  # type: Timeline # временная шкала работы потоков
+        if self.timeline is None:
+            self.timeline = NULL_TIMELINE
+        self.trace = kwargs.get('trace') or Tracer(self.logger)  # type: Tracer # события обработки файлов
+        self.closed = False
+        self.deferred = []  # отложенные задачи с ошибками: [(task, err), ..]
+        # файлы без загрузки (в буфере); повторные загрузки; несовпадения контрольной суммы загруженного файла
+        self.counters = {'skipped': 0, 'refetched': 0, 'mismatched': 0}
+        self._reported = set()  # задачи, размер которых учтен в прогрессе
+        self.lanes = {name: Lane(name) for name in ('net', 'hash')}
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._pool = None  # type: ProcessPoolExecutor
+        self._pool_lock = threading.Lock()
+
+        hash_threads = kwargs.get('hash_threads') or cpu_count()
+        for dispatcher in dispatchers:
+            self._add_worker(NetWorker, 'net', dispatcher)
+        for _ in range(hash_threads):
+            self._add_worker(HashWorker, 'hash')
+
+    def __repr__(self):
+        return '<TaskExecutor: {}>'.format(id(self))
+
+    def _add_worker(self, cls, lane_name, *args):
+        lane = self.lanes[lane_name]
+        worker = cls(lane, self, *args, logger=self.logger)
+        lane.workers.append(worker)
+        self.logger.debug('executor: worker {} готов'.format(worker))
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self):
+        for lane in self.lanes.values():
+            for worker in lane.workers:
+                worker.start()
+
+    def submit(self, task, timeout=None) -> bool:
+        """
+        Постановка задачи в обработку
+
+        :param task: задача `Task` загрузки файла в буфер; удаляемые файлы (`State.DEL`) исключаются из пакета при
+        его сборке (см. `Manager._execute_update`) и исполнителю не передаются
+        :param timeout: время ожидания свободного места, сек.
+        :return: True - задача принята, False - нет места в очереди
+        """
+        size = task.size or 0
+        with self._cond:
+            if not self._admissible(size):
+                self._cond.wait(timeout)
+                if not self._admissible(size):
+                    return False
+            self._pending += 1
+            self.budget.take(size)
+
+        job = Job(task, LOOKUP, size)
+        if self.timeline.enabled:
+            job.event = self.timeline.begin(os.path.basename(task.src), args={'package': task.packetname,
+                                                                              'size': size})
+        self.route(job, job.stage)
+        return True
+
+    def _admissible(self, size) -> bool:
+        return self._pending < self.maxsize and self.budget.fits(size)
+
+    def route(self, job: Job, stage):
+        job.stage = stage
+        if stage == FETCH:
+            self.lanes['net'].put(job)
+        else:
+            self.lanes['hash'].put(job)
+
+    def report(self, task, size):
+        """Учет размера файла в прогрессе, однократно для задачи"""
+        with self._cond:
+            if id(task) in self._reported:
+                return
+            self._reported.add(id(task))
+        self.size_queue.put(size)
+
+    def count(self, name, value=1):
+        with self._cond:
+            self.counters[name] += value
+
+    def complete(self, job: Job):
+        """Успешное завершение задачи с записью в журнал обновления"""
+        if self.journal is not None:
+            self.journal.file_done(job.task)
+        self.done(job)
+
+    def done(self, job: Job):
+        if job.event is not None:
+            self.timeline.end(job.event, os.path.basename(job.task.src))
+        with self._cond:
+            self._pending -= 1
+            self.budget.give(job.size)
+            self._cond.notify_all()
+
+    def fail(self, job: Job, err: Exception):
+        self.trace('executor: <{}> {}', id(job.task), err)
+        if self.logger.level == logging.DEBUG:
+            self.logger.exception(err)
+        if isinstance(err, RepoIsBusy):
+            self.stopper.set()
+            self.exc_queue.put(err)
+        else:
+            with self._cond:
+                self.deferred.append((job.task, err))
+        self.done(job)
+
+    def take_deferred(self) -> list:
+        """Выгрузка отложенных задач"""
+        with self._cond:
+            deferred, self.deferred = self.deferred, []
+        return deferred
+
+    def join(self, timeout=None) -> bool:
+        """
+        Ожидание окончания обработки задач
+
+        :return: True - все задачи обработаны
+        """
+        with self._cond:
+            if self._pending:
+                self._cond.wait(timeout)
+            return self._pending == 0
+
+    def shutdown(self):
+        self.closed = True
+        for lane in self.lanes.values():
+            for worker in lane.workers:
+                if worker.is_alive():
+                    worker.join()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def file_hash(self, fpath) -> str:
+        """Контрольная сумма файла; большие файлы считаются в пуле процессов"""
+        try:
+            size = os.path.getsize(fpath)
+        except FileNotFoundError:
+            return None
+        if size < self.hash_process_min_size:
+            return file_hash_calc(fpath)
+        return self._get_pool().submit(file_hash_calc, fpath).result()
+
+    def cached_hash(self, fpath) -> str:
+        """Контрольная сумма файла с использованием кэша состояния файлов"""
+        if self.file_cache is None:
+            return self.file_hash(fpath)
+        return self.file_cache.digest(fpath, self.file_hash)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=cpu_count())
+            return self._pool
+
+    def stats(self) -> dict:
+        return {name: lane.stats.as_dict() for name, lane in self.lanes.items()}
+
+    def connections(self) -> list:
+        """Счетчики соединений потоков загрузки"""
+        return [worker.connection for worker in self.lanes['net'].workers]
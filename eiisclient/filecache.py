@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш состояния локальных файлов
+
+Для проверенного файла запоминается контрольная сумма вместе с размером, временем изменения и номером файла
+(inode, на NTFS - индекс файла). Пока эти данные не изменились, контрольная сумма берется из кэша без чтения файла.
+Кэш общий для проверки файлов в буфере, полного обновления и проверки установленных пакетов, хранится в рабочей
+директории.
+"""
+import json
+import os
+import threading
+
+from eiisclient import DEFAULT_ENCODING
+from eiisclient.functions import file_hash_calc, read_file
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _state(st: os.stat_result) -> list:
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+class FileStateCache:
+    """Кэш контрольных сумм локальных файлов"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = self.misses = 0
+        self._data = None  # type: dict # {путь: [размер, время изменения, номер файла, контрольная сумма]}
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '<FileStateCache: {}>'.format(self.path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def _entries(self) -> dict:
+        """Записи кэша; файл кэша читается при первом обращении"""
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    self.load()
+        return self._data
+
+    def load(self):
+        data = read_file(self.path, encoding=DEFAULT_ENCODING)
+        try:
+            self._data = json.loads(data) if data else {}
+        except ValueError:
+            self._data = {}
+        self._dirty = False
+
+    def save(self):
+        """Запись кэша, если он изменялся"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self._entries, ensure_ascii=False)
+            self._dirty = False
+        tmp = '{}.tmp'.format(self.path)
+        with open(tmp, mode='w', encoding=DEFAULT_ENCODING) as fp:
+            fp.write(data)
+        os.replace(tmp, self.path)
+
+    def get(self, path: str):
+        """Контрольная сумма файла из кэша или None, если файл изменился или не проверялся"""
+        entry = self._entries.get(_key(path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return None
+        if not entry[:3] == _state(st):
+            self.discard(path)
+            return None
+        return entry[3]
+
+    def put(self, path: str, digest: str, st=None):
+        """Запись контрольной суммы проверенного файла"""
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return
+        with self._lock:
+            self._entries[_key(path)] = _state(st) + [digest]
+            self._dirty = True
+
+    def discard(self, path: str):
+        with self._lock:
+            if self._entries.pop(_key(path), None) is not None:
+                self._dirty = True
+
+    def transfer(self, src: str, dst: str):
+        """Перенос записи на файл `dst`, полученный из `src` переименованием или жесткой ссылкой"""
+        with self._lock:
+            entry = self._entries.pop(_key(src), None)
+            self._dirty = self._dirty or entry is not None
+        if entry is None:
+            return
+        try:
+            st = os.stat(dst)
+        except OSError:
+            return
+        if entry[:3] == _state(st):
+            self.put(dst, entry[3], st)
+
+    def digest(self, path: str, hasher=file_hash_calc):
+        """Контрольная сумма файла: из кэша или вычисленная с записью в кэш (None - файла нет)"""
+        digest = self.get(path)
+        if digest is not None:
+            self.hits += 1
+            return digest
+        self.misses += 1
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        digest = hasher(path)
+        try:
+            unchanged = _state(os.stat(path)) == _state(st)
+        except OSError:
+            unchanged = False
+        if digest is not None and unchanged:  # файл не изменялся во время подсчета
+            self.put(path, digest, st)
+        return digest
@@ -9,7 +9,8 @@ import time
 
 from eiisclient import DEFAULT_ENCODING
 
-SLEEP = 0.1
+SLEEP = 0  # пауза после смены прав файла, сек.; защита снимается пакетно (см. prepare_tree)
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000  # фоновый режим потока Windows: низкий приоритет процессора и диска
 
 
 def jsonify(data):
@@ -66,7 +67,21 @@ def change_write_mod(fp, sleep=SLEEP):
     """Установка прав записи на файл владельцу"""
     if not os.access(fp, os.W_OK):
         os.chmod(fp, stat.S_IWUSR)
-        time.sleep(sleep)
+        if sleep:
+            time.sleep(sleep)
+
+
+def background_thread() -> bool:
+    """
+    Перевод текущего потока в фоновый режим (только Windows)
+
+    :return: True - приоритет потока понижен
+    """
+    if not os.name == 'nt':
+        return False
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    return bool(kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN))
 
 
 def read_file(file_path: str, encoding=DEFAULT_ENCODING):
@@ -117,6 +132,9 @@ def copytree(src: str, dst: str):
     :param dst: полный путь директории-назначения
     :return:
     """
+    target = os.path.join(os.path.dirname(dst), os.path.basename(src))
+    if os.path.isdir(target):
+        prepare_tree(target)  # перезаписываемые файлы
     for top, _, files in os.walk(src, topdown=False):
         for file in files:
             s = os.path.join(top, file)
@@ -136,7 +154,65 @@ def copytree(src: str, dst: str):
                 raise
 
 
+def scan_files(top: str):
+    """
+    Обход файлов директории через os.scandir
+
+    :param top: полный путь директории
+    :return: генератор относительных путей файлов
+    """
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            entries = list(os.scandir(os.path.join(top, rel)))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            path = os.path.join(rel, entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(path)
+            else:
+                yield path
+
+
+def prepare_tree(top: str) -> int:
+    """
+    Снятие защиты от записи со всех файлов и папок дерева за один проход
+
+    Атрибуты берутся из данных обхода директории (на Windows - без отдельного запроса для каждого файла).
+
+    :param top: полный путь директории
+    :return: количество файлов и папок, с которых снята защита
+    """
+    changed = 0
+    stack = [top]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                mode = entry.stat(follow_symlinks=False).st_mode
+                if not mode & stat.S_IWRITE:
+                    os.chmod(entry.path, mode | stat.S_IWRITE)
+                    changed += 1
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+            except FileNotFoundError:
+                pass
+    return changed
+
+
 def rmtree(path, ignore_errors=False):
+    """Удаление директории; защита от записи снимается со всего дерева за один проход"""
+    try:
+        prepare_tree(path)
+    except OSError:
+        if not ignore_errors:
+            raise
     shutil.rmtree(path, ignore_errors=ignore_errors, onerror=onerror)
 
 
@@ -168,7 +244,5 @@ def onerror(func, path, _):
     :param path: полный путь к файлу
     :return:
     """
-    os.chmod(path, stat.S_IWUSR)
-    os.chmod(path, stat.S_IWRITE)
-    time.sleep(0.3)
+    os.chmod(path, stat.S_IWUSR | stat.S_IWRITE)
     func(path)
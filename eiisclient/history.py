@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+История запусков проверки обновлений и обновления
+
+Каждый завершенный запуск (см. `eiisclient.timing.RunReport`) записывается в базу SQLite в рабочей директории:
+время этапов, объем загрузки, репозиторий, тип диспетчера, количество потоков, результат и загрузка по пакетам.
+Хранится не более `limit` последних запусков. По истории строятся тенденции: медиана длительности обновления
+по репозиториям (зеркалам) и пакеты, на загрузку которых уходит больше всего времени.
+"""
+import json
+import sqlite3
+import statistics
+import time
+from contextlib import contextmanager
+
+HISTORY_LIMIT = 1000  # хранимых запусков
+DAY = 24 * 60 * 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started REAL NOT NULL,
+    kind TEXT NOT NULL,
+    result TEXT,
+    repo TEXT,
+    dispatcher TEXT,
+    threads INTEGER,
+    elapsed REAL,
+    files INTEGER,
+    bytes INTEGER,
+    skipped INTEGER,
+    retries INTEGER,
+    failed INTEGER,
+    throughput REAL,
+    phases TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE TABLE IF NOT EXISTS run_packages (
+    run_id INTEGER NOT NULL REFERENCES runs (id) ON DELETE CASCADE,
+    package TEXT NOT NULL,
+    files INTEGER,
+    bytes INTEGER,
+    transfer REAL
+);
+CREATE INDEX IF NOT EXISTS run_packages_run ON run_packages (run_id);
+'''
+
+
+class RunHistory:
+    """История запусков в базе SQLite"""
+
+    def __init__(self, path: str, limit=HISTORY_LIMIT):
+        self.path = path
+        self.limit = limit
+        self._ready = False  # схема создана
+
+    def __repr__(self):
+        return '<RunHistory: {}>'.format(self.path)
+
+    @contextmanager
+    def _connect(self):
+        """Соединение на одну операцию: запись и чтение возможны из разных потоков"""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys = ON')
+            if not self._ready:
+                conn.executescript(SCHEMA)
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, report, repo='', dispatcher='', threads=None) -> int:
+        """
+        Запись запуска
+
+        :param report: отчет о запуске `RunReport`
+        :return: номер записи
+        """
+        counters = report.counters
+        with self._connect() as conn:
+            cursor = conn.execute(
+                'INSERT INTO runs (started, kind, result, repo, dispatcher, threads, elapsed, files, bytes, skipped, '
+                'retries, failed, throughput, phases) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (report.started, report.kind, report.result, repo, dispatcher, threads, report.elapsed,
+                 counters.get('files', 0), counters.get('bytes', 0), counters.get('skipped', 0),
+                 counters.get('retries', 0), counters.get('failed', 0), report.throughput,
+                 json.dumps(report.phases)))
+            run_id = cursor.lastrowid
+            conn.executemany('INSERT INTO run_packages (run_id, package, files, bytes, transfer) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             [(run_id, package, data['files'], data['bytes'], data['transfer'])
+                              for package, data in sorted(report.packages.items())])
+            conn.execute('DELETE FROM runs WHERE id <= ?', (run_id - self.limit,))
+        return run_id
+
+    def runs(self, limit=20, kind=None, days=None) -> list:
+        """Последние запуски, от новых к старым"""
+        query, params = 'SELECT * FROM runs WHERE started >= ?', [self._since(days)]
+        if kind:
+            query += ' AND kind = ?'
+            params.append(kind)
+        query += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        result = []
+        for row in rows:
+            run = dict(row)
+            run['phases'] = json.loads(run['phases'] or '{}')
+            result.append(run)
+        return result
+
+    def trend(self, kind='update', days=30) -> list:
+        """
+        Длительность успешных запусков по репозиториям
+
+        :return: [{'repo', 'dispatcher', 'runs', 'median', 'max', 'bytes', 'throughput'}, ..] - по убыванию медианы
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT repo, dispatcher, elapsed, bytes, throughput FROM runs '
+                                'WHERE kind = ? AND result = ? AND started >= ?',
+                                (kind, 'ok', self._since(days))).fetchall()
+        groups = {}
+        for row in rows:
+            groups.setdefault((row['repo'], row['dispatcher']), []).append(row)
+        result = []
+        for (repo, dispatcher), group in groups.items():
+            result.append({
+                'repo': repo,
+                'dispatcher': dispatcher,
+                'runs': len(group),
+                'median': statistics.median(row['elapsed'] for row in group),
+                'max': max(row['elapsed'] for row in group),
+                'bytes': sum(row['bytes'] or 0 for row in group),
+                'throughput': statistics.median(row['throughput'] or 0 for row in group),
+            })
+        return sorted(result, key=lambda item: item['median'], reverse=True)
+
+    def top_packages(self, days=30, limit=10) -> list:
+        """
+        Пакеты с наибольшим временем загрузки
+
+        :return: [{'package', 'runs', 'files', 'bytes', 'transfer', 'share'}, ..]; share - доля времени загрузки
+            всех пакетов за период
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT package, COUNT(DISTINCT run_id) AS runs, SUM(p.files) AS files, SUM(p.bytes) AS bytes, '
+                'SUM(p.transfer) AS transfer FROM run_packages p JOIN runs r ON r.id = p.run_id '
+                'WHERE r.started >= ? GROUP BY package ORDER BY transfer DESC', (self._since(days),)).fetchall()
+        total = sum(row['transfer'] or 0 for row in rows)
+        return [dict(row, share=(row['transfer'] or 0) / total if total else 0.0) for row in rows[:limit]]
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM runs')
+
+    @staticmethod
+    def _since(days) -> float:
+        return time.time() - days * DAY if days else 0.0
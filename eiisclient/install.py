@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Установка пакетов из буфера
+
+Новый пакет переносится из буфера переименованием папки, если буфер и папка установки на одном томе.
+Иначе пакет собирается рядом с папкой установки в папке `<пакет>.staging`: неизмененные файлы установленной
+версии переносятся жесткими ссылками, новые и измененные - из буфера (жесткими ссылками на одном томе, иначе
+потоковым копированием), удаленные по индексу файлы не переносятся. Затем собранная папка подменяет
+установленную двумя переименованиями; при ошибке установленная версия возвращается на место, а файлы в буфере
+остаются для повторной установки. Пакет никогда не остается частично обновленным.
+"""
+import logging
+import os
+import shutil
+import threading
+import time
+
+from eiisclient.functions import rmtree
+
+STAGING_SUFFIX = '.staging'
+REMOVED_SUFFIX = '.removed'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def get_stdout_logger() -> logging.Logger:
+    return logging.Logger(__name__)
+
+
+def is_service_dir(name: str) -> bool:
+    """Служебная папка установки: сборка или удаленная версия пакета"""
+    return name.endswith(STAGING_SUFFIX) or name.endswith(REMOVED_SUFFIX)
+
+
+def _existing(path: str) -> str:
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def same_volume(src: str, dst: str) -> bool:
+    """Пути находятся на одном томе (для несуществующего пути проверяется ближайшая существующая папка)"""
+    return os.stat(_existing(src)).st_dev == os.stat(_existing(dst)).st_dev
+
+
+def stream_copy(src: str, dst: str):
+    """Потоковое копирование файла"""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFFER_SIZE)
+
+
+def link_or_copy(src: str, dst: str):
+    """Жесткая ссылка на файл, при невозможности - копия"""
+    try:
+        os.link(src, dst)
+    except OSError:
+        stream_copy(src, dst)
+
+
+def walk_files(top: str):
+    """Относительные пути файлов папки"""
+    for root, _, files in os.walk(top):
+        for fname in files:
+            yield os.path.relpath(os.path.join(root, fname), top)
+
+
+class Installer:
+    """Установка и перемещение пакетов через сборку и подмену папки"""
+
+    def __init__(self, logger=None, lock=None):
+        self.logger = logger or get_stdout_logger()
+        self.lock = lock or threading.RLock()  # общая с очисткой корзины: прежняя версия может вернуться на место
+
+    def __repr__(self):
+        return '<Installer: {}>'.format(id(self))
+
+    def install(self, src: str, dst: str, deleted=()) -> str:
+        """
+        Установка пакета из буфера
+
+        :param src: папка пакета в буфере (может отсутствовать, если есть только удаления)
+        :param dst: папка установки пакета
+        :param deleted: относительные пути файлов, удаляемых из установленной версии
+        :return: путь к папке прежней версии, подлежащей удалению, или None
+        """
+        has_src = os.path.isdir(src)
+        if not os.path.exists(dst) and has_src and same_volume(src, dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.rename(src, dst)
+            self.logger.debug('install: {} -> {} переименованием'.format(src, dst))
+            return None
+
+        staging = self.stage(src if has_src else None, dst, deleted)
+        old = self.swap(staging, dst)
+        if has_src:
+            rmtree(src, ignore_errors=True)
+        return old
+
+    def stage(self, src, live: str, deleted=()) -> str:
+        """Сборка пакета в папке `<live>.staging`"""
+        staging = live + STAGING_SUFFIX
+        if os.path.exists(staging):
+            rmtree(staging)
+        os.makedirs(staging)
+        try:
+            changed = set()
+            if src is not None:
+                for rel in walk_files(src):
+                    target = os.path.join(staging, rel)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    link_or_copy(os.path.join(src, rel), target)
+                    changed.add(os.path.normcase(rel))
+
+            if os.path.isdir(live):
+                skip = changed | {os.path.normcase(os.path.normpath(rel)) for rel in deleted}
+                for rel in walk_files(live):
+                    if os.path.normcase(rel) in skip:
+                        continue
+                    target = os.path.join(staging, rel)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    link_or_copy(os.path.join(live, rel), target)
+        except Exception:
+            rmtree(staging, ignore_errors=True)
+            raise
+        self.logger.debug('install: пакет собран в {}'.format(staging))
+        return staging
+
+    def swap(self, staging: str, live: str) -> str:
+        """
+        Подмена установленной папки собранной; при ошибке установленная версия восстанавливается
+
+        :return: путь к папке прежней версии или None
+        """
+        old = None
+        with self.lock:
+            if os.path.exists(live):
+                old = '{}.{}{}'.format(live, int(time.time() * 1000), REMOVED_SUFFIX)
+                os.rename(live, old)
+            try:
+                os.rename(staging, live)
+            except Exception:
+                if old is not None:
+                    os.rename(old, live)
+                rmtree(staging, ignore_errors=True)
+                raise
+        self.logger.debug('install: {} подменен, прежняя версия: {}'.format(live, old))
+        return old
+
+    def move(self, src: str, dst: str):
+        """Перемещение пакета в другую папку установки"""
+        if same_volume(src, dst) and not os.path.exists(dst):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.rename(src, dst)
+            return
+        staging = dst + STAGING_SUFFIX
+        if os.path.exists(staging):
+            rmtree(staging)
+        try:
+            for rel in walk_files(src):
+                target = os.path.join(staging, rel)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                stream_copy(os.path.join(src, rel), target)
+        except Exception:
+            rmtree(staging, ignore_errors=True)
+            raise
+        old = self.swap(staging, dst)
+        if old is not None:
+            rmtree(old)
+        rmtree(src)
@@ -60,9 +60,12 @@ class MainFrame(fmMain):
 
         #
         self.manager = Manager(logger=self.logger)
+        self.manager.subscribe(self.on_manager_changed)
+        self.Bind(wx.EVT_CLOSE, self.on_close)
         self.processBar.SetValue(0)
+        self.show_cached_summary()
         self.Show()
-        self.refresh_gui()
+        wx.CallAfter(self.refresh_gui)  # индексы читаются после отображения окна
 
     def on_check(self, event):
         self.do_updates_check()
@@ -103,10 +106,13 @@ class MainFrame(fmMain):
     def on_exit(self, event):
         self.Close(True)
 
+    def on_close(self, event):
+        self.manager.close()
+        event.Skip()
+
     def on_reset(self, event):
         self.manager.reset()
         self.processBar.SetValue(0)
-        self.refresh_gui()
 
     def on_btFull(self, event):
         if self.btFull.IsChecked():
@@ -139,7 +145,6 @@ class MainFrame(fmMain):
         if res:
             self.logger.info('Буфер очищен')
             self.logger.info('--\n')
-            self.refresh_gui()
 
     def on_links_update(self, event):
         self.manager.update_links()
@@ -235,6 +240,14 @@ class MainFrame(fmMain):
             if self.debug:
                 self.logger.exception(err)
 
+    def show_cached_summary(self):
+        """Перечень пакетов и информация с прошлого запуска - до чтения индексов"""
+        pack_list, info = self.manager.cached_summary()
+        if pack_list is None:
+            return
+        self.update_packet_list_view(pack_list)
+        self.update_info_view(info)
+
     def do_updates_check(self):
         """Процесс проверки наличия обновлений"""
         try:
@@ -252,7 +265,6 @@ class MainFrame(fmMain):
         else:
             pass
         finally:
-            self.refresh_gui()
             self.activate_interface()
             self.logger.info('--\n')
 
@@ -274,7 +286,6 @@ class MainFrame(fmMain):
         else:
             self.logger.info('Обновление завершено')
         finally:
-            self.refresh_gui()
             self.activate_interface()
             self.logger.info('--\n')
 
@@ -291,31 +302,74 @@ class MainFrame(fmMain):
         self.wxLogView.SetDefaultStyle(wx.TextAttr(color))
         self.wxLogView.AppendText(message)
 
-    def update_packet_list_view(self):
+    def on_manager_changed(self, packages, info):
+        """Изменения перечня пакетов и информации (вызывается из потоков менеджера)"""
+        wx.CallAfter(self.apply_changes, packages, info)
+
+    def apply_changes(self, packages, info):
+        """Перерисовка измененных записей; при изменении состава записей - всего перечня"""
+        try:
+            if packages:
+                self.update_packet_list_items(packages)
+            if info:
+                self.update_info_items(info)
+        except Exception as err:
+            self.logger.error('Ошибка: {}'.format(err))
+            if self.debug:
+                self.logger.exception(err)
+
+    def update_packet_list_view(self, pack_list=None):
+        pack_list = self.manager.pack_list if pack_list is None else pack_list
         try:
             self.wxPackList.Freeze()
             self.wxPackList.Clear()
 
-            for pack_name in sorted(self.manager.pack_list.keys()):
-                pack_data = self.manager.pack_list[pack_name]
+            for pack_name in sorted(pack_list.keys()):
                 idx = self.wxPackList.Count
                 self.wxPackList.Append([pack_name])
-                self.wxPackList.Check(idx, pack_data.checked)
-                func, flag = self.pack_action_list[pack_data.status]
-                func(idx, flag)
-                if pack_data.status == State.DEL and not pack_data.checked:
-                    self.wxPackList.SetItemForegroundColour(idx, PCK_DEL)
+                self._draw_pack_item(idx, pack_list[pack_name])
+        finally:
+            self.wxPackList.Thaw()
+
+    def update_packet_list_items(self, packages):
+        names = [self.wxPackList.GetString(i) for i in range(self.wxPackList.Count)]
+        if not names == sorted(self.manager.pack_list.keys()):
+            return self.update_packet_list_view()
+        try:
+            self.wxPackList.Freeze()
+            for pack_name in packages:
+                idx = names.index(pack_name)
+                self.wxPackList.SetItemBackgroundColour(idx, self.wxPackList.GetBackgroundColour())
+                self.wxPackList.SetItemForegroundColour(idx, wx.BLACK)
+                self._draw_pack_item(idx, self.manager.pack_list[pack_name])
         finally:
             self.wxPackList.Thaw()
 
-    def update_info_view(self):
+    def _draw_pack_item(self, idx, pack_data):
+        self.wxPackList.Check(idx, pack_data.checked)
+        func, flag = self.pack_action_list[pack_data.status]
+        func(idx, flag)
+        if pack_data.status == State.DEL and not pack_data.checked:
+            self.wxPackList.SetItemForegroundColour(idx, PCK_DEL)
+
+    def update_info_view(self, info=None):
         """"""
+        info = self.manager.info_list if info is None else info
         self.wxInfo.Freeze()
         self.wxInfo.DeleteAllItems()
-        for k, v in self.manager.info_list.items():
+        for k, v in info.items():
             self.wxInfo.AppendItem([k, '-' if v is None else str(v)])
         self.wxInfo.Thaw()
 
+    def update_info_items(self, keys):
+        info = self.manager.info_list
+        rows = [self.wxInfo.GetTextValue(row, 0) for row in range(self.wxInfo.GetItemCount())]
+        if not rows == list(info.keys()):
+            return self.update_info_view()
+        for key in keys:
+            value = info[key]
+            self.wxInfo.SetTextValue('-' if value is None else str(value), rows.index(key), 1)
+
 
 class ConfigFrame(fmConfig):
     """"""
@@ -361,7 +415,7 @@ class ConfigFrame(fmConfig):
                           'Настройки', wx.ICON_EXCLAMATION, None)
             return
 
-        self.config.clear()
+        # изменяются только параметры окна настроек, прочие параметры (см. `get_config`) сохраняются
         self.config.repopath = self.wxRepoPath.GetValue()
         self.config.install_to_profile = self.wxInstallToUserProfile.GetValue()
         self.config.threads = int(self.wxThreadsCount.Selection) + 1
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал обновления
+
+Журнал - файл в рабочей директории, в который построчно (JSON) дописываются записи о ходе обновления:
+    plan    - план обновления: хэш индекса репозитория, пакеты на установку, задачи по файлам;
+    file    - файл обработан: загружен и проверен (с контрольной суммой, размером и временем изменения) или удален;
+    package - пакет установлен из буфера;
+    commit  - индекс зафиксирован, обновление завершено.
+
+Рядом с журналом сохраняется копия индекса репозитория плана. Если программа завершилась во время обновления,
+при следующем запуске обновление продолжается по журналу без построения плана и повторного подсчета
+контрольных сумм уже обработанных файлов. После фиксации индекса журнал удаляется.
+"""
+import json
+import os
+import threading
+
+from eiisclient import DEFAULT_ENCODING
+from eiisclient.functions import jsonify, read_file, unjsonify, write_data
+from eiisclient.structures import State, Task
+
+PLAN, FILE, PACKAGE, COMMIT = 'plan', 'file', 'package', 'commit'
+
+
+def task_to_list(task: Task) -> list:
+    return [task.packetname, task.action.value, task.src, task.dst, task.hash, task.size,
+            list(task.patch) if task.patch else None, list(task.blocks) if task.blocks else None]
+
+
+def task_from_list(data: list) -> Task:
+    packetname, action, src, dst, hash, size, patch, blocks = (data + [None, None])[:8]
+    return Task(packetname, State(action), src, dst, hash, size, tuple(patch) if patch else None,
+                tuple(blocks) if blocks else None)
+
+
+class UpdateJournal:
+    """Журнал обновления"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.index_path = '{}.index'.format(path)
+        self.plan = None  # type: dict
+        self.files = {}  # {путь: запись file}
+        self.packages = set()  # установленные пакеты
+        self.committed = False
+        self._fp = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def __repr__(self):
+        return '<UpdateJournal: {}>'.format(self.path)
+
+    @property
+    def pending(self) -> bool:
+        """Есть незавершенное обновление"""
+        return self.plan is not None and not self.committed
+
+    @property
+    def index_hash(self) -> str:
+        return self.plan['index_hash'] if self.plan else None
+
+    def load(self):
+        """
+        Чтение журнала
+
+        Неполная последняя строка (обрыв записи) отрезается от файла: иначе первая запись следующего запуска
+        дописывается к обрывку и теряется вместе с ним. Нечитаемые строки пропускаются.
+        """
+        self.plan, self.files, self.packages, self.committed = None, {}, set(), False
+        complete = 0  # байт до конца последней полной строки
+        try:
+            with open(self.path, mode='rb') as fp:
+                for line in fp:
+                    if not line.endswith(b'\n'):
+                        break
+                    complete += len(line)
+                    try:
+                        record = json.loads(line.decode(DEFAULT_ENCODING))
+                    except ValueError:
+                        continue
+                    self._apply(record)
+                size = fp.seek(0, os.SEEK_END)
+        except FileNotFoundError:
+            return
+        if size > complete:
+            with open(self.path, mode='r+b') as fp:
+                fp.truncate(complete)
+
+    def _apply(self, record: dict):
+        op = record.get('op')
+        if op == PLAN:
+            self.plan = record
+            self.files, self.packages, self.committed = {}, set(), False
+        elif op == FILE:
+            self.files[record['path']] = record
+        elif op == PACKAGE:
+            self.packages.add(record['name'])
+        elif op == COMMIT:
+            self.committed = True
+
+    def _write(self, record: dict, sync=False):
+        with self._lock:
+            if self._fp is None:
+                self._fp = open(self.path, mode='a', encoding=DEFAULT_ENCODING)
+            self._fp.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._fp.flush()
+            if sync:
+                os.fsync(self._fp.fileno())
+        self._apply(record)
+
+    def start(self, index_hash: str, index: dict, packages: list, tasks: list):
+        """
+        Начало нового журнала с планом обновления
+
+        :param index_hash: хэш индекса репозитория
+        :param index: данные индекса репозитория
+        :param packages: пакеты на установку: [(название, origin), ..]
+        :param tasks: задачи обработки файлов
+        """
+        self.clear()
+        tmp = '{}.tmp'.format(self.index_path)
+        write_data(tmp, jsonify(index))
+        os.replace(tmp, self.index_path)
+        self._write({
+            'op': PLAN,
+            'index_hash': index_hash,
+            'packages': [list(pack) for pack in packages],
+            'tasks': [task_to_list(task) for task in tasks],
+        }, sync=True)
+
+    def tasks(self) -> list:
+        return [task_from_list(data) for data in self.plan['tasks']] if self.plan else []
+
+    def index(self) -> dict:
+        data = read_file(self.index_path)
+        return unjsonify(data) if data else {}
+
+    def file_done(self, task: Task):
+        """Запись об обработанном файле: для загруженного - с данными проверенного файла в буфере"""
+        if task.action == State.DEL:
+            self._write({'op': FILE, 'path': task.src, 'hash': None})
+            return
+        st = os.stat(task.dst)
+        self._write({'op': FILE, 'path': task.dst, 'hash': task.hash, 'size': st.st_size,
+                     'mtime': st.st_mtime_ns})
+
+    def file_completed(self, task: Task) -> bool:
+        """Файл задачи уже обработан: файл в буфере не изменялся после проверки"""
+        if task.action == State.DEL:
+            return task.src in self.files
+        record = self.files.get(task.dst)
+        if record is None or not record['hash'] == task.hash:
+            return False
+        try:
+            st = os.stat(task.dst)
+        except FileNotFoundError:
+            return False
+        return st.st_size == record['size'] and st.st_mtime_ns == record['mtime']
+
+    def package_done(self, name: str):
+        self._write({'op': PACKAGE, 'name': name}, sync=True)
+
+    def commit(self):
+        """Обновление завершено - журнал больше не нужен"""
+        self._write({'op': COMMIT}, sync=True)
+        self.clear()
+
+    def close(self):
+        with self._lock:
+            if self._fp is not None:
+                self._fp.close()
+                self._fp = None
+
+    def clear(self):
+        self.close()
+        for path in (self.path, self.index_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.plan, self.files, self.packages, self.committed = None, {}, set(), False
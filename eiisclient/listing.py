@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Перечни папок пакетов в памяти
+
+Папка установки и буфер читаются один раз, при первом обращении. Дальше перечень изменяется точечно
+операциями менеджера: установка и удаление пакета, загрузка файлов в буфер, очистка буфера.
+"""
+import os
+import threading
+
+from eiisclient.install import is_service_dir
+
+
+class DirListing:
+    """Перечень папок пакетов в папке (служебные папки сборки и удаления пакетов не учитываются)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._names = None  # type: set # None - папка еще не прочитана
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<DirListing: {}>'.format(self.path)
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def __len__(self):
+        return len(self.names())
+
+    def names(self) -> set:
+        with self._lock:
+            if self._names is None:
+                self._names = set(self._scan())
+            return set(self._names)
+
+    def _scan(self):
+        try:
+            entries = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return []
+        return [entry.name for entry in entries if entry.is_dir() and not is_service_dir(entry.name)]
+
+    def add(self, name: str) -> bool:
+        """:return: True - перечень изменился"""
+        with self._lock:
+            if self._names is None or name in self._names:
+                return False
+            self._names.add(name)
+            return True
+
+    def discard(self, name: str) -> bool:
+        """:return: True - перечень изменился"""
+        with self._lock:
+            if self._names is None or name not in self._names:
+                return False
+            self._names.discard(name)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._names = set()
+
+    def invalidate(self):
+        """Перечитать папку при следующем обращении"""
+        with self._lock:
+            self._names = None
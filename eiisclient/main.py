@@ -1,13 +1,10 @@
 # -*- coding: utf-8 -*-
 
 """Main module."""
+import multiprocessing
 import sys
 from argparse import ArgumentParser
 
-import wx
-
-from eiisclient.interface import MainFrame
-
 
 def get_args():
     """
@@ -31,15 +28,23 @@ def get_args():
 
 def main():  # pragma: no cover
     """"""
+    from eiisclient import cli
+    if set(sys.argv[1:]) & set(cli.COMMANDS):  # команда - запуск без графического интерфейса
+        return cli.main()
+
     try:
         args = get_args()
     except SystemExit as err:
         return err
 
+    import wx  # графический интерфейс загружается после разбора командной строки
+    from eiisclient.interface import MainFrame
+
     app = wx.App()
     MainFrame(args)
     app.MainLoop()
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # пул процессов проверки хэшей в собранном exe
     sys.exit(main())
@@ -1,35 +1,63 @@
 # -*- coding: utf-8 -*-
 from __future__ import print_function
 
+import functools
 import logging
 import os
+import sqlite3
 import threading
 import weakref
 from collections import OrderedDict, namedtuple
 from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from queue import Empty, Queue
 from tempfile import TemporaryDirectory
 
-import pythoncom
-import winshell
-
 from eiisclient import (DEFAULT_ENCODING, DEFAULT_FTP_ENCODING, WORK_DIR, PROFILE_INSTALL_PATH, DEFAULT_INSTALL_PATH,
                         CONFIGFILE)
+from eiisclient.delta import delta_key
 from eiisclient.dispatch import BaseDispatcher, get_dispatcher
 from eiisclient.exceptions import (LinkUpdateError, NoUpdates, RepoIsBusy, PacketInstallError, LinkDisabled, LinkNoData,
-                                   IndexFixError, NoIndexFileOnServerError, HashMismatchError, DispatcherNotActivated)
-from eiisclient.functions import (file_hash_calc, unjsonify, jsonify, read_file, gzread, write_data, remove, rmtree,
-                                  copytree)
+                                   IndexFixError, NoIndexFileOnServerError, DispatcherNotActivated,
+                                   PartialUpdateError)
+from eiisclient.filecache import FileStateCache
+from eiisclient.history import HISTORY_LIMIT, RunHistory
+from eiisclient.executor import LARGE_FILE_SIZE, POLL_TIMEOUT, QUEUE_BUDGET, RETRIES, TaskExecutor, cpu_count
+from eiisclient.install import Installer
+from eiisclient.journal import UpdateJournal
+from eiisclient.listing import DirListing
+from eiisclient.metrics import Metrics, dispatcher_label, repo_label
+from eiisclient.netsim import NetProfile
+from eiisclient.snapshot import index_key, load_snapshot, save_snapshot
+from eiisclient.trash import Trash
+from eiisclient.store import GENERATIONS, ObjectStore, StoreError
+from eiisclient.functions import (unjsonify, jsonify, read_file, gzread, write_data, remove, rmtree, hash_calc,
+                                  scan_files)
 from eiisclient.structures import (PackList, ConfigDict, State, PackData, Task)
+from eiisclient.timeline import PRODUCER, Timeline
+from eiisclient.trace import RING_SIZE, Tracer
+from eiisclient.timing import NULL_PHASE, RunReport
 
 THREADS = 3
-QUEUEMAXSIZE = 50
+INSTALL_THREADS = 4  # пакетов, устанавливаемых одновременно
+PREFETCH_THREADS = 1  # потоков фоновой загрузки в буфер
 LOCAL_INDEX_FILE = os.path.normpath(os.path.join(WORK_DIR, 'index.json'))
 LOCAL_INDEX_FILE_HASH = '{}.sha1'.format(LOCAL_INDEX_FILE)
 INDEX_FILE_NAME = 'Index.gz'
 INDEX_HASH_FILE_NAME = 'Index.gz.sha1'
 LINKSDIRNAME = 'ЕИИС Соцстрах'
+JOURNAL_FILE = os.path.normpath(os.path.join(WORK_DIR, 'update.journal'))
+STORE_DIR = os.path.normpath(os.path.join(WORK_DIR, 'store'))
+FILE_STATE_CACHE = os.path.normpath(os.path.join(WORK_DIR, 'filestate.json'))
+INDEX_SNAPSHOT_FILE = os.path.normpath(os.path.join(WORK_DIR, 'index.snapshot'))  # разобранный локальный индекс
+SUMMARY_FILE = os.path.normpath(os.path.join(WORK_DIR, 'summary.json'))  # перечень пакетов и информация для запуска
+RUN_REPORT_FILE = os.path.normpath(os.path.join(WORK_DIR, 'lastrun.json'))  # отчет о последнем запуске
+RUN_INFO_KEY = 'Последний запуск'
+TIMELINE_FILE = os.path.normpath(os.path.join(WORK_DIR, 'timeline.json'))  # временная шкала обработки файлов
+HISTORY_FILE = os.path.normpath(os.path.join(WORK_DIR, 'history.sqlite'))  # история запусков
+METRICS_FILE = os.path.normpath(os.path.join(WORK_DIR, 'eiisclient.prom'))  # метрики для сборщика мониторинга
+TRACE_FILE = os.path.normpath(os.path.join(WORK_DIR, 'trace.log'))  # последние события при ошибке запуска
 
 
 def get_stdout_logger() -> logging.Logger:
@@ -41,13 +69,36 @@ def get_config() -> ConfigDict:
         repopath='',
         repopathlist=[],
         threads=THREADS,
+        hash_threads=None,  # потоков проверки контрольных сумм, по умолчанию - по числу ядер
+        queue_budget=QUEUE_BUDGET,  # объем данных файлов в обработке, байт
+        large_file_size=LARGE_FILE_SIZE,  # размер файла, с которого он считается большим, байт
+        max_large_tasks=None,  # больших файлов в обработке, по умолчанию - по числу потоков загрузки
+        retries=RETRIES,  # повторных проходов по файлам с ошибками
+        install_threads=INSTALL_THREADS,
+        prefetch=False,  # фоновая загрузка файлов в буфер после проверки обновлений
+        prefetch_threads=PREFETCH_THREADS,
+        store=False,  # установка пакетов из локального хранилища файлов с сохранением прежних версий
+        store_generations=GENERATIONS,  # хранимых версий пакета
         encode=DEFAULT_ENCODING,
         ftpencode=DEFAULT_FTP_ENCODING,
         install_to_profile=False,
         links_in_dir=False,
+        history=True,  # история запусков (см. `eiisclient.history`)
+        history_limit=HISTORY_LIMIT,  # хранимых запусков
+        metrics=True,  # метрики обновления для мониторинга (см. `eiisclient.metrics`)
+        metrics_file=None,  # файл метрик, по умолчанию - METRICS_FILE
+        timeline=False,  # запись временной шкалы обработки файлов в TIMELINE_FILE (см. `eiisclient.timeline`)
+        trace_buffer=RING_SIZE,  # последних событий обработки файлов для выгрузки при ошибке, 0 - без буфера
+        trace_sample=1,  # в отладочный журнал выводится каждое `trace_sample`-е событие обработки файлов
+        net_profile=None,  # имитация канала связи для замеров и тестов, см. `eiisclient.netsim.PROFILES`
     )
 
 
+def install_path(config: ConfigDict) -> str:
+    """Папка установки пакетов по настройкам"""
+    return PROFILE_INSTALL_PATH if config.install_to_profile else DEFAULT_INSTALL_PATH
+
+
 def read_config() -> dict:
     """
     Возвращает данные конфигурационного файла или пустой словарь
@@ -61,6 +112,88 @@ def read_config() -> dict:
         return {}
 
 
+def reported(kind):
+    """
+    Отчет о запуске метода менеджера (см. `eiisclient.timing.RunReport`)
+
+    Отчет записывается в `RUN_REPORT_FILE` и попадает в информацию менеджера. Вызов внутри другого запуска
+    учитывается в отчете внешнего запуска.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._run is not None:
+                return method(self, *args, **kwargs)
+            self._run = RunReport(kind)
+            result = 'ok'
+            try:
+                return method(self, *args, **kwargs)
+            except NoUpdates:
+                result = 'no_updates'
+                raise
+            except BaseException as err:
+                result = '{}: {}'.format(type(err).__name__, err)
+                self._dump_trace()
+                raise
+            finally:
+                report, self._run = self._run, None
+                report.finish(result)
+                self._save_run(report)
+
+        return wrapper
+
+    return decorator
+
+
+class Prefetch(threading.Thread):
+    """
+    Фоновая загрузка файлов пакетов в буфер
+
+    Выступает и индикатором выполнения для `Manager.handle_tasks`: объем загруженного - GetValue() из GetRange().
+    """
+
+    def __init__(self, manager, packs: list, logger=None):
+        super(Prefetch, self).__init__(name='prefetch', daemon=True)
+        self.manager = manager  # type: Manager
+        self.packs = packs
+        self.logger = logger or get_stdout_logger()
+        self.stopper = threading.Event()
+        self.failures = None  # необработанные файлы по пакетам, см. `Manager.handle_tasks`
+        self.error = None  # type: Exception
+        self._range = 0
+        self._value = 0
+
+    def SetRange(self, value):
+        self._range = value
+
+    def GetRange(self):
+        return self._range
+
+    def SetValue(self, value):
+        self._value = value
+
+    def GetValue(self):
+        return self._value
+
+    def run(self):
+        try:
+            tasks = [task for task in self.manager.get_task(self.packs) if not task.action == State.DEL]
+            self.SetRange(sum(task.size or 0 for task in tasks))
+            self.failures = self.manager.handle_tasks(iter(tasks), self, background=True, stopper=self.stopper)
+        except InterruptedError:
+            self.logger.debug('prefetch: загрузка прервана')
+        except Exception as err:
+            self.error = err
+            self.logger.debug('prefetch: ошибка фоновой загрузки: {}'.format(err))
+        else:
+            self.logger.debug('prefetch: загрузка завершена')
+
+    def stop(self, timeout=None):
+        self.stopper.set()
+        self.join(timeout)
+
+
 class Manager:
     """
     Основной обработчик пакетов на клиенте.
@@ -77,15 +210,40 @@ class Manager:
             os.makedirs(WORK_DIR, exist_ok=True)
         # обновление параметров из файла настроек
         self.config.update(read_config())
+        self.trace = Tracer(self.logger, capacity=self._setting('trace_buffer'),
+                            sample=self._setting('trace_sample'))  # события обработки файлов (см. `eiisclient.trace`)
         #
         self._local_index = None  # type: dict
+        self._local_entries = None  # type: list # пакеты локального индекса: [(псевдоним, пакет), ..]
         self._remote_index = None  # type: dict
         self._tempdir = self._get_temp_dir()
         self._buffer = os.path.join(WORK_DIR, 'buffer')
         self._task_queue_k = kwargs.get('kqueue', 2)  # коэффициент размера основной очереди загрузки
-        self._desktop = winshell.desktop()
-        self._finalize = weakref.finalize(self, self._clean)
+        self._desktop_path = None  # type: str # рабочий стол, определяется при первом обращении
         self._full = False
+        self._lane_stats = {}  # статистика полос обработки последнего запуска
+        self._prefetch = None  # type: Prefetch # фоновая загрузка файлов в буфер
+        self._run = None  # type: RunReport # отчет текущего запуска проверки или обновления
+        self.history = RunHistory(HISTORY_FILE, limit=self._setting('history_limit')) \
+            if self.config.history else None  # type: RunHistory
+        self.metrics = Metrics(self.config.metrics_file or METRICS_FILE) if self.config.metrics else None
+        self.last_run = None  # type: RunReport # отчет последнего завершенного запуска
+        self._installed = DirListing(self.eiispath)  # установленные пакеты
+        self._buffered = DirListing(self._buffer)  # пакеты в буфере
+        self._listeners = []  # подписчики на изменения перечня пакетов и информации, см. `subscribe`
+        self._remote_view = False  # перечни построены с учетом индекса репозитория
+        self._loaded = False  # перечни построены (индексы читаются при первом обращении к перечням)
+        self._state_lock = threading.RLock()
+        self.journal = UpdateJournal(JOURNAL_FILE)  # журнал незавершенного обновления
+        # удаляемые папки пакетов, очистка в фоне; путь установки читается при каждой очистке по настройкам,
+        # без ссылки на менеджер; поток очистки запускается при первом обращении (`Trash.wake`)
+        self.trash = Trash(lambda config=self.config: [install_path(config)], logger=self.logger)
+        self._finalize = weakref.finalize(self, self.trash.stop)
+        self._net_profile = NetProfile.get(self.config.net_profile)  # общий для всех диспетчеров менеджера
+        self._installer = Installer(logger=self.logger, lock=self.trash.lock)
+        self.file_cache = FileStateCache(FILE_STATE_CACHE)  # контрольные суммы проверенных локальных файлов
+        self.store = ObjectStore(STORE_DIR, generations=self._setting('store_generations'), logger=self.logger,
+                                 cache=self.file_cache) if self.config.store else None  # type: ObjectStore
         self.init_dispatcher()
 
         if self.logger.level == logging.DEBUG:
@@ -97,44 +255,167 @@ class Manager:
             self.logger.debug('{}: tempdir: {}'.format(self, self._tempdir.name))
             self.logger.debug('{}: task_k: {}'.format(self, self._task_queue_k))
 
-        self._pack_list = self._get_pack_list(remote=False)  # type: PackList # - перечень пакетов со статусами
-        self._info_list = self._get_info_list(remote=False)  # type: dict # - информация о репозитории, пакетах,..
+        self._pack_list = PackList()  # type: PackList # - перечень пакетов со статусами
+        self._info_list = OrderedDict()  # type: dict # - информация о репозитории, пакетах,..
 
         self._progressBarStep = 10
 
     def __repr__(self):
         return '<Manager: {}>'.format(id(self))
 
+    def _setting(self, name: str):
+        """Параметр настроек; отсутствующий (None) - значение по умолчанию из `get_config`"""
+        value = self.config.get(name)
+        return get_config().get(name) if value is None else value
+
     @property
     def eiispath(self) -> str:
-        return PROFILE_INSTALL_PATH if self.config.install_to_profile else DEFAULT_INSTALL_PATH
+        return install_path(self.config)
 
     @property
     def pack_list(self):
+        self._ensure_loaded()
         return self._pack_list
 
     @property
     def info_list(self):
+        self._ensure_loaded()
         return self._info_list
 
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._refresh(remote=False)
+
+    @property
+    def _desktop(self) -> str:
+        if self._desktop_path is None:
+            import winshell
+            self._desktop_path = winshell.desktop()
+        return self._desktop_path
+
+    def cached_summary(self) -> (PackList, dict):
+        """
+        Перечень пакетов и информация, сохраненные при последнем построении перечней
+
+        Позволяет показать данные сразу при запуске, до чтения индексов.
+
+        :return: (перечень пакетов, информация) или (None, None), если данных нет
+        """
+        try:
+            data = unjsonify(read_file(SUMMARY_FILE) or '')
+            pack_list = PackList()
+            for alias, origin, installed, checked, status in data['packages']:
+                pack_list[alias] = PackData(origin=origin, installed=installed, checked=checked, status=State(status))
+            return pack_list, OrderedDict(data['info'])
+        except Exception:
+            return None, None
+
+    def _save_summary(self):
+        data = {
+            'packages': [[alias, data.origin, data.installed, data.checked, data.status.value]
+                         for alias, data in sorted(self._pack_list.items())],
+            'info': [[key, value] for key, value in self._info_list.items()],
+        }
+        try:
+            write_data(SUMMARY_FILE, jsonify(data))
+        except OSError as err:
+            self.logger.debug('save_summary: {}'.format(err))
+
+    def _phase(self, name):
+        """Замер этапа текущего запуска"""
+        return self._run.phase(name) if self._run is not None else NULL_PHASE
+
+    def _dump_trace(self):
+        """Выгрузка последних событий обработки файлов в TRACE_FILE"""
+        try:
+            count = self.trace.dump(TRACE_FILE)
+        except OSError as err:
+            self.logger.debug('trace: события не выгружены: {}'.format(err))
+        else:
+            if count:
+                self.logger.debug('trace: последние события ({}) выгружены в {}'.format(count, TRACE_FILE))
+
+    def _metric_labels(self) -> dict:
+        return {'repo': repo_label(self.config.repopath), 'dispatcher': dispatcher_label(self.disp)}
+
+    def _record_transfer(self, executor: TaskExecutor, files: int, retried: int, failures: dict):
+        """Метрики обработки файлов"""
+        labels = self._metric_labels()
+        metrics = self.metrics
+        metrics.inc('eiisclient_files_total', labels, files)
+        metrics.inc('eiisclient_buffer_hits_total', labels, executor.counters['skipped'])
+        metrics.inc('eiisclient_retries_total', labels, retried + executor.counters['refetched'])
+        metrics.inc('eiisclient_hash_mismatches_total', labels, executor.counters['mismatched'])
+        metrics.inc('eiisclient_failed_files_total', labels, sum(len(failed) for failed in failures.values()))
+        for connection in executor.connections():
+            metrics.inc('eiisclient_transferred_bytes_total', labels, connection.bytes)
+            if connection.files:
+                metrics.observe('eiisclient_connection_throughput_bytes_per_second', labels, connection.throughput)
+            for latency in connection.latency:
+                metrics.observe('eiisclient_request_latency_seconds', labels, latency)
+
+    def _save_metrics(self):
+        try:
+            self.metrics.save()
+        except OSError as err:
+            self.logger.debug('metrics: метрики не записаны: {}'.format(err))
+
+    def _save_run(self, report: RunReport):
+        """Запись отчета о запуске и добавление его в информацию"""
+        self.last_run = report
+        if self.metrics is not None:
+            labels = self._metric_labels()
+            self.metrics.inc('eiisclient_runs_total', dict(labels, kind=report.kind,
+                                                           result=report.result.split(':', 1)[0]))
+            self.metrics.observe('eiisclient_run_duration_seconds', dict(labels, kind=report.kind), report.elapsed)
+            self.metrics.set('eiisclient_last_run_timestamp_seconds', dict(labels, kind=report.kind),
+                             round(report.started + report.elapsed, 3))
+            self._save_metrics()
+        if self.history is not None:
+            try:
+                self.history.add(report, repo=repo_label(self.config.repopath), dispatcher=dispatcher_label(self.disp),
+                                 threads=self._setting('threads'))
+            except (OSError, sqlite3.Error) as err:
+                self.logger.debug('history: запуск не записан: {}'.format(err))
+        summary = report.summary()
+        self.logger.debug('run: {}'.format(summary))
+        try:
+            report.save(RUN_REPORT_FILE)
+        except OSError as err:
+            self.logger.debug('run: отчет не записан: {}'.format(err))
+        with self._state_lock:
+            if not self._loaded or self._info_list.get(RUN_INFO_KEY) == summary:
+                return
+            self._info_list[RUN_INFO_KEY] = summary
+            self._save_summary()
+        self._notify(set(), {RUN_INFO_KEY})
+
+    @reported('check')
     def check_updates(self, processBar):
+        self.stop_prefetch()
+        self.trash.wake()  # папки, оставшиеся в корзине после прошлых запусков
         processBar.SetRange(100)
         processBar.SetValue(0)
 
         self._local_index = None
-        self._pack_list = self._get_pack_list(remote=False)
+        with self._phase('pack_list'):
+            self._refresh(remote=False, info=False)
 
         self._check_disp()
 
         with self.disp:
-            self.disp.up()
-            if self.disp.repo_is_busy():
+            with self._phase('activate'):
+                self.disp.up()
+                busy = self.disp.repo_is_busy()
+            if busy:
                 processBar.SetValue(100)
                 raise RepoIsBusy
 
             remove(os.path.join(self._tempdir.name, INDEX_HASH_FILE_NAME))  # чистим хэш
-            if not self.repo_updated:
-                self._info_list = self._get_info_list(remote=True)
+            with self._phase('index_hash'):
+                updated = self.repo_updated
+            if not updated:
+                self._refresh(remote=True, packages=False)
                 processBar.SetValue(100)
                 self.checked = True
                 raise NoUpdates
@@ -146,9 +427,10 @@ class Manager:
                 self.logger.debug('check_updates: активация диспетчера')
                 self._remote_index = None
                 self._local_index = None
-                self._pack_list = self._get_pack_list(remote=True)
-                processBar.SetValue(30)
-                self._info_list = self._get_info_list(remote=True)
+                with self._phase('pack_list'):
+                    self._refresh(remote=True, info=False)
+                    processBar.SetValue(30)
+                    self._refresh(remote=True, packages=False)
                 processBar.SetValue(70)
             finally:
                 self.logger.debug('check_updates: деактивация диспетчера')
@@ -156,6 +438,10 @@ class Manager:
                     processBar.SetValue(processBar.GetRange())
             self.checked = True
 
+        if self.config.prefetch:
+            self.start_prefetch()
+
+    @reported('update')
     def start_update(self, processBar):
         """
         Процедура обновления пакетов
@@ -163,44 +449,42 @@ class Manager:
         :return:
         """
         self._check_disp()
+        self.stop_prefetch()
 
         processBar.SetValue(0)
         with self.disp:
-            self.disp.up()
+            with self._phase('activate'):
+                self.disp.up()
+            if self.journal.pending:
+                if self.journal.index_hash == self.remote_index_hash:
+                    return self._resume_update(processBar)
+                self.logger.info('Незавершенное обновление устарело - журнал сброшен')
+                self.journal.clear()
+
             self.logger.info('Формирование списка пакетов')
-            action_list = {}
-            for pack, data in self._pack_list.items():
-                action = self._pack_list.get_action(pack)
-                if (self._full and data.checked) or action == State.UPD or action == State.NEW:
-                    action_list.setdefault('update', []).append((pack, data))
-                elif action == State.DEL:
-                    action_list.setdefault('delete', []).append((pack, data))
+            with self._phase('planning'):
+                action_list = self._action_list()
             if self.debug:
                 self.logger.debug(action_list)
 
             packs_handle = action_list.get('update', [])
             packs_delete = action_list.get('delete', [])
 
-            packets_size = self._calc_packets_size(packs_handle)
-            packs_handle_count = len(packs_handle) or 1
-            packs_handle_delete = len(packs_delete)
-            self._progressBarStep = (packets_size / packs_handle_count) / 10 if packets_size else 10
-            progress_bar_range = self._progressBarStep + \
-                                 packets_size + \
-                                 packs_handle_count * self._progressBarStep + \
-                                 packs_handle_delete * self._progressBarStep
-            processBar.SetRange(int(progress_bar_range))
+            self._set_progress_range(processBar, self._calc_packets_size(packs_handle), len(packs_handle),
+                                     len(packs_delete))
 
             # 2 удаление пакетов
             if packs_delete:
-                self.delete_packages(packs_delete, processBar)
+                with self._phase('delete'):
+                    self.delete_packages(packs_delete, processBar)
 
-            if self.disp.repo_is_busy():
+            with self._phase('activate'):
+                busy = self.disp.repo_is_busy()
+            if busy:
                 raise RepoIsBusy
 
             if not self.checked:
-                self._pack_list = self._get_pack_list(remote=True)
-                self._info_list = self._get_info_list(remote=True)
+                self._refresh(remote=True)
                 self.logger.error('Требуется проверка наличия обновлений')
                 self.logger.info('--\n')
                 return
@@ -209,38 +493,244 @@ class Manager:
             if packs_handle:
                 self.logger.debug('start_update: активация диспетчера')
                 # Step 1: формирование задач для обработки файлов пакетов из репозитория
-                tasks = self.get_task(packs_handle)
-                # Step 2: обработка файлов пакета (загрузка или удаление)
-                self.handle_tasks(tasks, processBar)
-
-                # Step 3: перемещение скачанных пакетов из буфера в папку установки
-                if not self.buffer_is_empty():
-                    # перенос файлов пакетов из буфера в папку назначения
-                    self.flush_buffer(packs_handle, processBar)
+                with self._phase('planning'):
+                    tasks = list(self.get_task(packs_handle))
+                    self.journal.start(self.remote_index_hash, self.remote_index,
+                                       [(pack, data.origin) for pack, data in packs_handle], tasks)
             else:
                 self.logger.info('Нет пакетов для установки или обновления')
+                tasks = []
+
+            self._execute_update(packs_handle, tasks, processBar)
+
+    def _action_list(self) -> dict:
+        """Пакеты для обработки: {'update': [(пакет, данные), ..], 'delete': [..]}"""
+        action_list = {}
+        pack_list = self.pack_list
+        for pack, data in pack_list.items():
+            action = pack_list.get_action(pack)
+            if (self._full and data.checked) or action == State.UPD or action == State.NEW:
+                action_list.setdefault('update', []).append((pack, data))
+            elif action == State.DEL:
+                action_list.setdefault('delete', []).append((pack, data))
+        return action_list
+
+    def start_prefetch(self) -> bool:
+        """
+        Запуск фоновой загрузки файлов отмеченных пакетов в буфер
 
-            # 3 фиксация данных индекса репозитория
-            try:
-                write_data(LOCAL_INDEX_FILE, jsonify(self.remote_index))
-                write_data(LOCAL_INDEX_FILE_HASH, self.remote_index_hash)
-                self.logger.debug('start_update: индекс зафиксирован локально')
-            except Exception as err:
-                raise IndexFixError('Ошибка фиксации данных индекса репозитория') from err
-            else:
-                processBar.SetValue(processBar.GetValue() + self._progressBarStep)
-                if not processBar.GetValue() == processBar.GetRange():
-                    processBar.SetValue(processBar.GetRange())
+        Загрузка идет после проверки обновлений, в потоках с пониженным приоритетом и без журнала обновления:
+        индекс не фиксируется, установленные пакеты не изменяются. Обновление (`start_update`) останавливает
+        загрузку и берет из буфера уже проверенные файлы, загружая только недостающие.
 
-                self._pack_list = self._get_pack_list(remote=True)
-                self._info_list = self._get_info_list(remote=True)
+        :return: True - загрузка запущена
+        """
+        self.stop_prefetch()
+        if not self.checked or self.journal.pending:
+            return False
+        packs = self._action_list().get('update', [])
+        if not packs:
+            return False
+        self._check_disp()
+        self.remote_index, self.local_index  # индексы читаются до запуска потока
+        self._prefetch = Prefetch(self, packs, logger=self.logger)
+        self._prefetch.start()
+        self.logger.debug('start_prefetch: фоновая загрузка {} пакетов'.format(len(packs)))
+        return True
+
+    def stop_prefetch(self):
+        """Остановка фоновой загрузки с ожиданием завершения обработки текущих файлов"""
+        if self._prefetch is None:
+            return
+        if self._prefetch.is_alive():
+            self.logger.debug('stop_prefetch: остановка фоновой загрузки')
+            self._prefetch.stop()
+        self.logger.debug('stop_prefetch: загружено в буфер {} из {} байт'.format(
+            self._prefetch.GetValue(), self._prefetch.GetRange()))
+        self._prefetch = None
+
+    @property
+    def prefetching(self) -> bool:
+        return self._prefetch is not None and self._prefetch.is_alive()
+
+    def _resume_update(self, processBar):
+        """Продолжение прерванного обновления по журналу, без построения плана"""
+        self.logger.info('Продолжение прерванного обновления')
+        self._remote_index = self.journal.index()
+        packs_handle = [(pack, PackData(origin=origin, installed=True, checked=True, status=State.UPD))
+                        for pack, origin in self.journal.plan['packages'] if origin not in self.journal.packages]
+        tasks = [task for task in self.journal.tasks() if task.packetname not in self.journal.packages]
+        self._set_progress_range(processBar, sum(task.size or 0 for task in tasks), len(packs_handle), 0)
+        self.checked = True
+        self._execute_update(packs_handle, tasks, processBar)
+
+    def verify(self, packages=None) -> dict:
+        """
+        Проверка установленных пакетов по локальному индексу
+
+        Файлы пакетов обходятся через os.scandir, контрольные суммы считаются параллельно с использованием кэша
+        состояния файлов: неизмененные с прошлой проверки файлы не читаются.
+
+        :param packages: названия папок пакетов, по умолчанию - все установленные пакеты из индекса
+        :return: пакеты с расхождениями: {пакет: {'missing': [..], 'modified': [..], 'extra': [..]}}
+        """
+        self.logger.info('Проверка установленных пакетов')
+        l_packages = self.local_index_packages
+        report = {}
+        checks = []  # (пакет, файл, контрольная сумма по индексу)
+        for package in sorted(packages or self.installed_packages()):
+            if package not in l_packages:
+                continue
+            files = l_packages[package].get('files', {})
+            found = {os.path.normcase(rel): rel for rel in scan_files(os.path.join(self.eiispath, package))}
+            indexed = {os.path.normcase(os.path.normpath(rel)): rel for rel in files}
+            result = report.setdefault(package, {'missing': [], 'modified': [], 'extra': []})
+            result['extra'] = sorted(rel for key, rel in found.items() if key not in indexed)
+            for key, rel in sorted(indexed.items()):
+                if key in found:
+                    checks.append((package, rel, files[rel]))
+                else:
+                    result['missing'].append(rel)
+
+        with ThreadPoolExecutor(max_workers=self.config.hash_threads or cpu_count()) as pool:
+            digests = pool.map(lambda check: self._installed_hash(check[0], check[1]), checks)
+            for (package, rel, expected), digest in zip(checks, digests):
+                if not digest == expected:
+                    report[package]['modified'].append(rel)
+        self.file_cache.save()
+
+        report = {package: result for package, result in report.items() if any(result.values())}
+        for package, result in sorted(report.items()):
+            self.logger.info('\t`{}`: отсутствует {}, изменено {}, лишних {}'.format(
+                package, len(result['missing']), len(result['modified']), len(result['extra'])))
+        self.logger.info('Проверено файлов: {}, пакетов с расхождениями: {}'.format(len(checks), len(report)))
+        return report
+
+    @reported('repair')
+    def repair(self, report: dict, processBar):
+        """
+        Восстановление отсутствующих и измененных файлов пакетов по результату `verify`
+
+        Загружаются только эти файлы, пакеты собираются и подменяются как при обновлении. Лишние файлы
+        (созданные подсистемами или пользователем) не удаляются.
+        """
+        self.stop_prefetch()
+        l_packages = self.local_index_packages
+        tasks, packs_handle = [], []
+        for package, result in sorted(report.items()):
+            files = l_packages[package].get('files', {})
+            sizes = l_packages[package].get('sizes', {})
+            for rel in result['missing'] + result['modified']:
+                tasks.append(self._build_task(package, rel, State.UPD, files[rel], sizes.get(rel, 0))[0])
+            if result['missing'] or result['modified']:
+                packs_handle.append((l_packages[package].get('alias') or package,
+                                     PackData(origin=package, installed=True, checked=True, status=State.UPD)))
+        if not tasks:
+            self.logger.info('Нет файлов для восстановления')
+            return
+
+        self._check_disp()
+        with self.disp:
+            self.disp.up()
+            if self.repo_updated:
+                raise PacketInstallError('В репозитории есть обновления: выполните обновление пакетов')
+            if self.disp.repo_is_busy():
+                raise RepoIsBusy
+            self.logger.info('Восстановление файлов пакетов: {}'.format(len(tasks)))
+            self._set_progress_range(processBar, sum(task.size for task in tasks), len(packs_handle), 0)
+            self.journal.start(self.remote_index_hash, self.remote_index,
+                               [(pack, data.origin) for pack, data in packs_handle], tasks)
+            self._execute_update(packs_handle, tasks, processBar)
+
+    def _set_progress_range(self, processBar, packets_size, packs_handle_count, packs_handle_delete):
+        packs_handle_count = packs_handle_count or 1
+        self._progressBarStep = (packets_size / packs_handle_count) / 10 if packets_size else 10
+        progress_bar_range = self._progressBarStep + \
+                             packets_size + \
+                             packs_handle_count * self._progressBarStep + \
+                             packs_handle_delete * self._progressBarStep
+        processBar.SetRange(int(progress_bar_range))
+
+    def _execute_update(self, packs_handle: list, tasks: list, processBar):
+        """Обработка файлов, установка пакетов и фиксация индекса"""
+        failures = {}
+        # удаление файлов устанавливаемых пакетов выполняется при сборке пакета, а не в папке установки
+        deleted = {}
+        for task in tasks:
+            if task.action == State.DEL:
+                rel = os.path.relpath(task.src, os.path.join(self.eiispath, task.packetname))
+                deleted.setdefault(task.packetname, set()).add(rel)
+        tasks = [task for task in tasks if not task.action == State.DEL]
+        if tasks:
+            # Step 2: обработка файлов пакета (загрузка)
+            with self._phase('transfer'):
+                failures = self.handle_tasks(iter(tasks), processBar)
+        # пакеты с необработанными файлами не устанавливаются, их файлы остаются в буфере
+        packs_handle = [(pack, data) for pack, data in packs_handle if data.origin not in failures]
+
+        # Step 3: сборка пакетов из буфера и установленных версий, подмена папок установки
+        if packs_handle:
+            with self._phase('install'):
+                failures.update(self.flush_buffer(packs_handle, processBar, deleted, failed=failures))
+        if self._run is not None:
+            self._run.count('failed', sum(len(files) for files in failures.values()))
+
+        # 3 фиксация данных индекса репозитория
+        try:
+            with self._phase('commit'):
+                self._commit_index(failures)
+                self.journal.commit()
+            self.logger.debug('start_update: индекс зафиксирован локально')
+        except Exception as err:
+            raise IndexFixError('Ошибка фиксации данных индекса репозитория') from err
+        else:
+            processBar.SetValue(processBar.GetValue() + self._progressBarStep)
+            if not processBar.GetValue() == processBar.GetRange():
+                processBar.SetValue(processBar.GetRange())
+
+            self._local_index = None
+            with self._phase('pack_list'):
+                self._refresh(remote=True)
+
+        self.file_cache.save()
+        if failures:
+            raise PartialUpdateError(failures)
+
+    def _commit_index(self, failures: dict):
+        """
+        Фиксация данных индекса репозитория
+
+        Для пакетов с необработанными файлами сохраняются данные прежнего локального индекса, а вместо хэша
+        индекса репозитория записывается хэш итогового индекса: при следующей проверке пакеты будут обновлены.
+        """
+        if not failures:
+            write_data(LOCAL_INDEX_FILE, jsonify(self.remote_index))
+            write_data(LOCAL_INDEX_FILE_HASH, self.remote_index_hash)
+            self._local_index = self.remote_index
+            self._save_snapshot(index_key(LOCAL_INDEX_FILE, LOCAL_INDEX_FILE_HASH))
+            return
+
+        index = dict(self.remote_index)
+        packages = dict(self.remote_index_packages)
+        for package in failures:
+            if package in self.local_index_packages:
+                packages[package] = self.local_index_packages[package]
+            else:
+                packages.pop(package, None)
+        index['packages'] = packages
+        write_data(LOCAL_INDEX_FILE, jsonify(index))
+        write_data(LOCAL_INDEX_FILE_HASH, hash_calc(index))
+        self._local_index = index
+        self._save_snapshot(index_key(LOCAL_INDEX_FILE, LOCAL_INDEX_FILE_HASH))
 
     def reset(self, remote=False):
+        self.stop_prefetch()
         self.checked = False
         self._tempdir = self._get_temp_dir()
         self._local_index = None
-        self._pack_list = self._get_pack_list(remote)
-        self._info_list = self._get_info_list(remote)
+        self._installed.invalidate()
+        self._buffered.invalidate()
+        self._refresh(remote)
 
     @property
     def repo_updated(self) -> bool:
@@ -250,9 +740,7 @@ class Manager:
         return not local_index_hash == remote_index_hash
 
     def buffer_content(self) -> list:
-        if os.path.exists(self._buffer):
-            return [pack for pack in os.listdir(self._buffer) if os.path.isdir(os.path.join(self._buffer, pack))]
-        return []
+        return sorted(self._buffered.names())
 
     def buffer_count(self) -> int:
         return len(self.buffer_content())
@@ -262,7 +750,8 @@ class Manager:
 
     def init_dispatcher(self):
         self.disp = get_dispatcher(self.config.repopath, logger=self.logger, encode=self.config.encode,
-                                   ftpencode=self.config.ftpencode, tempdir=self._tempdir)
+                                   ftpencode=self.config.ftpencode, tempdir=self._tempdir,
+                                   profile=self._net_profile)
 
     def _check_disp(self):
         if self.disp is None:
@@ -292,7 +781,7 @@ class Manager:
         info.setdefault('Наличие обновлений',
                         {True: 'имеются обновления', False: 'нет обновлений', None: '-'}[repo_updated])
         info.setdefault('Пакетов в репозитории', packets_in_repo)
-        info.setdefault('Установлено подсистем', len(list(self.installed_packages())))
+        info.setdefault('Установлено подсистем', len(self._installed_listing()))
 
         buf_content = self.buffer_content()
         buf_count = len(buf_content)
@@ -301,10 +790,14 @@ class Manager:
         else:
             text = ('Пакеты в буфере', '{}'.format(buf_count))
         info.setdefault(*text)
+        if self.journal.pending:
+            info.setdefault('Незавершенное обновление', 'будет продолжено при обновлении')
         info.setdefault('Путь - подсистемы', self.eiispath)
         info.setdefault('Путь - репозиторий', self.config.repopath)
         if self.debug:
             info.setdefault('Temporary dir', self._tempdir.name)
+        if self.last_run is not None:  # последним: добавляется в информацию по завершении запуска
+            info.setdefault(RUN_INFO_KEY, self.last_run.summary())
 
         return info
 
@@ -314,23 +807,80 @@ class Manager:
 
         Возвращает кортеж с подсистемами, найденными в папке установки на локальной машине.
         Пакеты с подсистемами, названия которых заканчиваются на .removed - считаются удаленными и не
-        попадают в список.
+        попадают в список, как и папки сборки пакетов при установке (.staging).
+        Папка установки читается однократно, дальше перечень изменяется при установке и удалении пакетов.
         """
-        if os.path.exists(self.eiispath):
-            return (d for d in os.listdir(self.eiispath) if os.path.isdir(os.path.join(self.eiispath, d)))
-        else:
-            return iter([])
+        return iter(sorted(self._installed_listing().names()))
+
+    def _installed_listing(self) -> DirListing:
+        if not self._installed.path == self.eiispath:  # изменен путь установки в настройках
+            self._installed = DirListing(self.eiispath)
+        return self._installed
+
+    def subscribe(self, callback):
+        """
+        Подписка на изменения перечня пакетов и информации
+
+        :param callback: callback(packages: set, info: set) - псевдонимы измененных, добавленных и удаленных
+            пакетов и ключи измененной информации; может вызываться из рабочих потоков
+        """
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _refresh(self, remote=None, packages=True, info=True):
+        """
+        Обновление перечня пакетов и информации с оповещением подписчиков об измененных записях
+
+        Перечни строятся по индексам в памяти и перечням папок установки и буфера (см. `DirListing`),
+        без чтения папок с диска.
+
+        :param remote: с учетом индекса репозитория; None - как при последнем обновлении
+        """
+        with self._state_lock:
+            if not self._loaded:  # первое построение - оба перечня
+                packages = info = True
+            remote = self._remote_view if remote is None else remote
+            self._remote_view = remote
+            changed_packages, changed_info = set(), set()
+            if packages:
+                pack_list = self._get_pack_list(remote)
+                changed_packages = self._pack_list.diff(pack_list)
+                self._pack_list = pack_list
+            if info:
+                info_list = self._get_info_list(remote)
+                changed_info = {key for key in set(info_list) | set(self._info_list)
+                                if not info_list.get(key) == self._info_list.get(key)}
+                self._info_list = info_list
+            self._loaded = True
+            if changed_packages or changed_info:
+                self._save_summary()
+        if changed_packages or changed_info:
+            self._notify(changed_packages, changed_info)
+
+    def _notify(self, packages: set, info: set):
+        for callback in list(self._listeners):
+            try:
+                callback(packages, info)
+            except Exception as err:
+                self.logger.debug('notify: ошибка подписчика {}: {}'.format(callback, err))
 
     def delete_packages(self, packages: list, processBar):
         self.logger.info('Удаление пакетов:')
         for pack, pack_data in packages:
             fp = os.path.join(self.eiispath, pack_data.origin)
             try:
-                rmtree(fp)
+                self.trash.move(fp)  # содержимое удаляется в фоне
             except Exception as err:
                 self.logger.error('Ошибка удаления пакета {}: {}'.format(pack, err))
             else:
                 self.logger.info('\t`{}`'.format(pack))
+                self._installed_listing().discard(pack_data.origin)
+                if self.store is not None:
+                    self.store.drop(pack_data.origin)
 
             # удаление ярлыка подсистемы
             try:
@@ -350,13 +900,18 @@ class Manager:
             fp = os.path.join(self._tempdir.name, INDEX_FILE_NAME)
             if not os.path.exists(fp):
                 try:
-                    self.disp.get_file(INDEX_FILE_NAME, fp)
+                    with self._phase('index_download'):
+                        self.disp.get_file(INDEX_FILE_NAME, fp)
                 except FileNotFoundError:
                     raise NoIndexFileOnServerError
                 except (RepoIsBusy, AttributeError):
                     self._remote_index = {}
+                except Exception:  # обрыв загрузки - неполный файл не должен остаться в кеше
+                    remove(fp)
+                    raise
                 else:
-                    self._remote_index = unjsonify(gzread(fp, encode=DEFAULT_ENCODING))
+                    with self._phase('index_parse'):
+                        self._remote_index = unjsonify(gzread(fp, encode=DEFAULT_ENCODING))
         return self._remote_index
 
     @property
@@ -377,6 +932,9 @@ class Manager:
                 raise DispatcherNotActivated('диспетчер не активирован')
             except FileNotFoundError:
                 raise NoIndexFileOnServerError('Не найден файл хэш-суммы индекса')
+            except Exception:
+                remove(fp)
+                raise
         return read_file(fp)
 
     @property
@@ -387,10 +945,23 @@ class Manager:
     @property
     def local_index(self) -> dict:
         if not self._local_index:
-            data = read_file(LOCAL_INDEX_FILE)
-            self._local_index = unjsonify(data) if data else {}
+            key = index_key(LOCAL_INDEX_FILE, LOCAL_INDEX_FILE_HASH)
+            snapshot = load_snapshot(INDEX_SNAPSHOT_FILE, key)
+            if snapshot is not None:
+                self._local_index, self._local_entries = snapshot['index'], snapshot['entries']
+            else:
+                data = read_file(LOCAL_INDEX_FILE)
+                self._local_index = unjsonify(data) if data else {}
+                self._save_snapshot(key)
         return self._local_index
 
+    def _save_snapshot(self, key):
+        """Снимок локального индекса в памяти с построенным по нему перечнем пакетов"""
+        self._local_entries = [(data.get('alias') or origin, origin)
+                               for origin, data in self._local_index.get('packages', {}).items()]
+        if save_snapshot(INDEX_SNAPSHOT_FILE, key, self._local_index, entries=self._local_entries):
+            self.logger.debug('local_index: снимок индекса сохранен')
+
     @property
     def local_index_packages(self) -> dict:
         return self.local_index.get('packages', {})
@@ -405,45 +976,42 @@ class Manager:
 
     def _get_pack_list(self, remote) -> PackList:
         pack_list = PackList()
-        remote_index_packages = None
         local_index_packages = self.local_index_packages
-        if remote:
-            remote_index_packages = self.remote_index_packages
-
-        # заполняем данными из локального индекс-кэша
-        for origin_pack_name in local_index_packages:
-            alias_pack_name = local_index_packages[origin_pack_name].get('alias') or origin_pack_name
-            status = State.NON
 
-            if remote:
-                if origin_pack_name in remote_index_packages:
+        if not remote:
+            # перечень пакетов локального индекса построен при чтении индекса или взят из его снимка
+            for alias_pack_name, origin_pack_name in self._local_entries:
+                pack_list[alias_pack_name] = PackData(
+                    origin=origin_pack_name,
+                    installed=False,
+                    checked=False,
+                    status=State.NON,
+                )
+        else:
+            remote_index_packages = self.remote_index_packages
+            # сверка пакетов локального индекс-кэша с индексом с сервера
+            for origin_pack_name, local_pack in local_index_packages.items():
+                alias_pack_name = local_pack.get('alias') or origin_pack_name
+                remote_pack = remote_index_packages.get(origin_pack_name)
+                if remote_pack is None:
+                    status = State.DEL  # пакета нет в репозитории, но есть в локальном кэше
+                else:
                     # делаем сверку контрольных сумм пакетов
-                    local_pack_hash = local_index_packages[origin_pack_name]['phash']
-                    remote_pack_hash = remote_index_packages[origin_pack_name]['phash']
-                    if not local_pack_hash == remote_pack_hash:
+                    status = State.NON if local_pack['phash'] == remote_pack['phash'] else State.UPD
+                    if not local_pack['alias'] == remote_pack['alias']:
+                        alias_pack_name = remote_pack['alias'] or origin_pack_name
                         status = State.UPD
+                pack_list[alias_pack_name] = PackData(
+                    origin=origin_pack_name,
+                    installed=False,
+                    checked=False,
+                    status=status,
+                )
 
-                    local_pack_alias = local_index_packages[origin_pack_name]['alias']
-                    remote_pack_alias = remote_index_packages[origin_pack_name]['alias']
-                    if not local_pack_alias == remote_pack_alias:
-                        alias_pack_name = remote_pack_alias or origin_pack_name
-                        status = State.UPD
-                else:
-                    # пакета нет в репозитории, но есть в локальном кэше
-                    status = State.DEL
-
-            pack_list[alias_pack_name] = PackData(
-                origin=origin_pack_name,
-                installed=False,
-                checked=False,
-                status=status,
-            )
-
-        if remote:  #
-            # заполняем данными из индекса с сервера
-            for origin_pack_name in remote_index_packages:
+            # новые пакеты из индекса с сервера
+            for origin_pack_name, remote_pack in remote_index_packages.items():
                 if origin_pack_name not in local_index_packages:
-                    alias_pack_name = remote_index_packages[origin_pack_name].get('alias') or origin_pack_name
+                    alias_pack_name = remote_pack.get('alias') or origin_pack_name
                     pack_list[alias_pack_name] = PackData(
                         origin=origin_pack_name,
                         installed=False,
@@ -479,12 +1047,20 @@ class Manager:
         self.logger.debug('get_task: подготовка словарей с данными о пакетах')
         r_packages = self.remote_index_packages  # get remote packages map
         l_packages = self.local_index_packages  # get local packages map
+        deltas = self.remote_index.get('deltas', {})  # патчи файлов: {ключ прежняя-новая версия: данные}
+        # при полном обновлении установленные файлы проверяются заранее, параллельно
+        installed = self._installed_hashes(pack_list, l_packages, r_packages) if self._full else {}
         self.logger.info('Загрузка файлов:')
 
         for pack_alias, pack_data in pack_list:
             self.logger.info('\t`{}`'.format(pack_alias))
             local_list_map = l_packages.get(pack_data.origin, {}).get('files', {})
             remote_list_map = r_packages.get(pack_data.origin, {}).get('files', {})
+            # размеры файлов для допуска задач в очередь; при отсутствии в индексе - средний по пакету
+            remote_sizes = r_packages.get(pack_data.origin, {}).get('sizes', {})
+            default_size = r_packages.get(pack_data.origin, {}).get('size', 0) // (len(remote_list_map) or 1)
+            # контрольные суммы блоков больших файлов: {файл: {'size': размер блока, 'digests': [..]}}
+            remote_blocks = r_packages.get(pack_data.origin, {}).get('blocks', {})
             self.logger.debug('get_task: получены словари с данными файлов пакета')
 
             local_list = sorted(local_list_map.keys())  # sorted local package's files list
@@ -499,29 +1075,28 @@ class Manager:
             # обход по спискам файлов, сравнение имен и хэш=значений
             while True:
                 if l_index > l_max_index and r_index > r_max_index:
-                    self.logger.debug('get_task: прошли до конца обоих списков')
+                    self.trace('get_task: прошли до конца обоих списков')
                     break
 
                 if l_index > l_max_index:
-                    self.logger.debug('get_task: прошли local список, но есть файл в remote - загружаем')
+                    self.trace('get_task: прошли local список, но есть файл в remote - загружаем')
                     rfile = remote_list[r_index]
                     hash = remote_list_map[rfile]
-                    task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash)
+                    task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash,
+                                                     remote_sizes.get(rfile, default_size))
                     yield task
-                    self.logger.debug('get_task: сформирована задача на загрузку: <{}> {}'.format(task_id, task))
+                    self.trace('get_task: сформирована задача на загрузку: <{}> {}', task_id, task)
                     r_index += 1  # увеличиваем счетчик (индекс)
-                    self.logger.debug('get_task: remote индекс: {}'.format(r_index))
                     continue
 
                 # прошли remote список, оставшиеся в local - удаляем
                 if r_index > r_max_index:
-                    self.logger.debug('get_task: прошли remote список, оставшиеся в local - удаляем')
+                    self.trace('get_task: прошли remote список, оставшиеся в local - удаляем')
                     lfile = local_list[l_index]
                     task, task_id = self._build_task(pack_data.origin, lfile, State.DEL)
                     yield task
-                    self.logger.debug('get_task: сформирована задача на удаление: <{}> {}'.format(task_id, task))
+                    self.trace('get_task: сформирована задача на удаление: <{}> {}', task_id, task)
                     l_index += 1
-                    self.logger.debug('get_task: local индекс: {}'.format(l_index))
                     continue
 
                 # проход по спискам
@@ -530,109 +1105,197 @@ class Manager:
                 hash = remote_list_map[rfile]
                 if lfile == rfile:  # сравниваем имена файлов
                     # сравниваем хэши файлов
-                    self.logger.debug('get_task: обработка файлов r`{}` - l`{}`'.format(rfile, lfile))
+                    self.trace('get_task: обработка файлов r`{}` - l`{}`', rfile, lfile)
                     if pack_data.status == State.NEW:
-                        task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash)
+                        task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash,
+                                                         remote_sizes.get(rfile, default_size))
                         yield task
-                        self.logger.debug('get_task: сформирована задача на загрузку: <{}> {}'.format(task_id, task))
-                    elif self._full or not local_list_map[lfile] == remote_list_map[
-                        rfile]:  # загружаем при несоответствии хэшей
+                        self.trace('get_task: сформирована задача на загрузку: <{}> {}', task_id, task)
+                    elif not local_list_map[lfile] == remote_list_map[rfile] or (
+                            self._full and not installed.get((pack_data.origin, rfile)) == hash):
+                        # загружаем при несоответствии хэшей; при полном обновлении - и установленного файла
                         # self.logger.debug('get_task: хэши не равны')
-                        task, task_id = self._build_task(pack_data.origin, rfile, State.UPD, hash)
+                        task, task_id = self._build_task(pack_data.origin, rfile, State.UPD, hash,
+                                                         remote_sizes.get(rfile, default_size),
+                                                         deltas.get(delta_key(local_list_map[lfile], hash)),
+                                                         remote_blocks.get(rfile) if rfile in remote_sizes else None)
                         yield task
-                        self.logger.debug('get_task: сформирована задача на загрузку: <{}> {}'.format(task_id, task))
+                        self.trace('get_task: сформирована задача на загрузку: <{}> {}', task_id, task)
                     else:
-                        self.logger.debug('get_task: нет изменений')
+                        self.trace('get_task: нет изменений')
                     r_index += 1  # увеличиваем счетчик (индекс)
                     l_index += 1
-                    self.logger.debug('get_task: local индекс: {} | remote индекс: {}'.format(l_index, r_index))
 
                 elif rfile < lfile:  # есть в remote, нет в local - загружаем
-                    self.logger.debug('есть в remote, нет в local - загружаем')
-                    task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash)
+                    self.trace('есть в remote, нет в local - загружаем')
+                    task, task_id = self._build_task(pack_data.origin, rfile, State.NEW, hash,
+                                                     remote_sizes.get(rfile, default_size))
                     yield task
-                    self.logger.debug('get_task: сформирована задача на загрузку: <{}> {}'.format(task_id, task))
+                    self.trace('get_task: сформирована задача на загрузку: <{}> {}', task_id, task)
                     r_index += 1
-                    self.logger.debug('get_task: remote индекс: {}'.format(r_index))
                 elif rfile > lfile:  # есть в local, нет в remote - удаляем
-                    self.logger.debug('есть в local, нет в remote - удаляем')
+                    self.trace('есть в local, нет в remote - удаляем')
                     task, task_id = self._build_task(pack_data.origin, lfile, State.DEL)
                     yield task
-                    self.logger.debug('get_task: сформирована задача на удаление: <{}> {}'.format(task_id, task))
+                    self.trace('get_task: сформирована задача на удаление: <{}> {}', task_id, task)
                     l_index += 1
-                    self.logger.debug('get_task: local индекс: {}'.format(l_index))
                 else:
                     raise IndexError('Что-то пошло не так с индексами, при проходе списков файлов на обработку')
 
-    def _build_task(self, package, file, action, hash=None) -> (namedtuple, int):
+    def _installed_hashes(self, pack_list, l_packages: dict, r_packages: dict) -> dict:
+        """
+        Контрольные суммы установленных файлов, не измененных по индексам, для полного обновления
+
+        Файлы читаются параллельно, как при `verify`, а не по одному при обходе списков в `get_task`.
+
+        :return: {(пакет, файл): контрольная сумма}
+        """
+        checks = []  # (пакет, файл)
+        for _, pack_data in pack_list:
+            if pack_data.status == State.NEW:
+                continue
+            local_files = l_packages.get(pack_data.origin, {}).get('files', {})
+            remote_files = r_packages.get(pack_data.origin, {}).get('files', {})
+            checks.extend((pack_data.origin, rel) for rel, digest in sorted(remote_files.items())
+                          if local_files.get(rel) == digest)
+        if not checks:
+            return {}
+
+        self.logger.debug('get_task: проверка установленных файлов: {}'.format(len(checks)))
+        with ThreadPoolExecutor(max_workers=self.config.hash_threads or cpu_count()) as pool:
+            digests = dict(zip(checks, pool.map(lambda check: self._installed_hash(*check), checks)))
+        self.file_cache.save()
+        return digests
+
+    def _installed_hash(self, package: str, file: str) -> str:
+        """Контрольная сумма установленного файла (из кэша состояния файлов, если файл не изменялся)"""
+        return self.file_cache.digest(os.path.join(self.eiispath, package, file))
+
+    def _build_task(self, package, file, action, hash=None, size=None, delta=None, blocks=None) -> (namedtuple, int):
+        patch = None
         if action == State.DEL:
             src = os.path.join(self.eiispath, package, file)  # путь файла для удаления
             dst = None
         else:
             src = os.path.join(self.disp.repopath, package, file)  # путь файла-источника для получения
             dst = os.path.realpath(os.path.join(self._buffer, package, file))
-        task = Task(package, action, src, dst, hash)
+            installed = os.path.join(self.eiispath, package, file)
+            if delta:  # патч к установленной версии
+                patch = (os.path.join(self.disp.repopath, delta['path']), installed)
+            if blocks and os.path.isfile(installed):  # блоки установленной версии
+                blocks = (installed, blocks['size'], blocks['digests'])
+            else:
+                blocks = None
+        task = Task(package, action, src, dst, hash, size, patch, blocks)
         return task, id(task)
 
-    def handle_tasks(self, tasks, processBar):
-        """Получить новые файлы из репозитория или удалить локально старые"""
-        main_queue = Queue(maxsize=QUEUEMAXSIZE)
+    def handle_tasks(self, tasks, processBar, background=False, stopper=None) -> dict:
+        """
+        Загрузка новых файлов из репозитория в буфер
+
+        Удаляемые файлы (`State.DEL`) сюда не передаются: они исключаются из пакета при его сборке.
+        Задачи с ошибками откладываются и повторяются после обработки остальных, с нарастающей паузой.
+
+        :param background: фоновая загрузка в буфер - потоки с пониженным приоритетом, без журнала обновления
+        :param stopper: событие остановки обработки
+        :return: необработанные файлы по пакетам: {пакет: [(файл, ошибка), ..]}
+        """
         exc_queue = Queue()
         size_queue = Queue()
-        stopper = threading.Event()
-        workers = []
+        stopper = stopper or threading.Event()
+        threads = self._setting('prefetch_threads' if background else 'threads')
         self.logger.debug('handle_tasks: подготовка `пчелок`')
-        for i in range(self.config.threads):
+        dispatchers = []
+        for i in range(threads):
             dispatcher = get_dispatcher(self.config.repopath,
                                         encode=self.config.encode,
                                         ftpencode=self.config.ftpencode,
                                         logger=self.logger,
-                                        tempdir=self._tempdir)
+                                        tempdir=self._tempdir,
+                                        profile=self._net_profile)
             self.logger.debug('handle_tasks: диспетчер `{}` готов'.format(dispatcher))
-            worker = Worker(main_queue, stopper, dispatcher, logger=self.logger, exc_queue=exc_queue,
-                            size_queue=size_queue)
-            worker.setName('{}'.format(worker))
-            worker.setDaemon(True)
-            workers.append(worker)
-
+            dispatchers.append(dispatcher)
+
+        timeline = Timeline() if self.config.timeline and not background else None
+        executor = TaskExecutor(dispatchers, logger=self.logger, stopper=stopper, exc_queue=exc_queue,
+                                size_queue=size_queue, hash_threads=1 if background else self.config.hash_threads,
+                                budget=self._setting('queue_budget'), large_size=self._setting('large_file_size'),
+                                max_large=self.config.max_large_tasks or threads, retries=self._setting('retries'),
+                                journal=None if background else self.journal, file_cache=self.file_cache,
+                                background=background, timeline=timeline, trace=self.trace)
         self.logger.debug('handle_tasks: стартуем `пчелок`')
-        for worker in workers:  # стартуем пчелок
-            worker.start()
-            self.logger.debug('handle_tasks: worker {} запущен'.format(worker))
+        executor.start()
 
         self.logger.debug('handle_tasks: обработка очереди задач:')
 
-        try:
-            while True:
-                if stopper.is_set():  # worker дернул стоп-кран
-                    raise InterruptedError
+        failures = {}
+        buffered = set()  # пакеты, файлы которых загружаются в буфер
+        buffered_tasks = []  # задачи загрузки файлов в буфер
+        retried = 0  # повторно обработанных файлов с ошибками
 
-                if size_queue.qsize() > 0:
-                    size = size_queue.get_nowait()
-                    processBar.SetValue(processBar.GetValue() + size)
+        def track(tasks_):
+            for task in tasks_:
+                buffered.add(task.packetname)
+                buffered_tasks.append(task)
+                yield task
 
-                if not main_queue.full():
-                    task = next(tasks)
-                    task_id = id(task)
-                    self.logger.debug('handle_tasks: получена задача <{}>'.format(task_id))
-                    main_queue.put(task)
-                    self.logger.debug('handle_tasks: задача <{}> помещена в очередь'.format(task_id))
+        try:
+            self._run_tasks(executor, track(tasks), processBar)
 
-        except StopIteration:
-            self.logger.debug('все задачи помещены в очередь, ожидание окончания очереди')
-            main_queue.join()  # ожидаем окончания обработки очереди
-            self.logger.debug('проверка активности пчелок и ожидание завершения работы')
-            for worker in workers:
-                if worker.isAlive():
-                    worker.join()
-            try:
-                for i in range(size_queue.qsize()):
-                    size = size_queue.get_nowait()
-                    processBar.SetValue(processBar.GetValue() + size)
-            except Empty:
-                pass
+            for attempt in range(1, executor.retries + 1):
+                deferred = executor.take_deferred()
+                if not deferred:
+                    break
+                retried += len(deferred)
+                delay = executor.backoff * 2 ** (attempt - 1)
+                self.logger.info('Повторная обработка файлов с ошибками ({}), попытка {}'.format(
+                    len(deferred), attempt))
+                if stopper.wait(delay):
+                    raise InterruptedError
+                self._run_tasks(executor, (task for task, _ in deferred), processBar)
+
+            for task, err in executor.take_deferred():
+                failures.setdefault(task.packetname, []).append((task.src, err))
+            for package, files in sorted(failures.items()):
+                self.logger.error('Не обработаны файлы пакета `{}`:'.format(package))
+                for fname, err in files:
+                    self.logger.error('\t{}: {}'.format(fname, err))
 
         finally:
+            self.logger.debug('проверка активности пчелок и ожидание завершения работы')
+            executor.shutdown()
+            self.file_cache.save()
+            self._update_progress(size_queue, processBar)
+            self._lane_stats = executor.stats()
+            self.logger.debug('handle_tasks: статистика полос: {}'.format(self._lane_stats))
+            if timeline is not None:
+                try:
+                    timeline.export(TIMELINE_FILE)
+                    self.logger.debug('handle_tasks: временная шкала записана: {}'.format(TIMELINE_FILE))
+                except OSError as err:
+                    self.logger.debug('handle_tasks: временная шкала не записана: {}'.format(err))
+            if self._run is not None and not background:
+                self._run.lanes = self._lane_stats
+                self._run.count('files', len(buffered_tasks))
+                self._run.count('bytes', self._lane_stats['net']['bytes'])
+                self._run.count('skipped', executor.counters['skipped'])
+                self._run.count('retries', retried + executor.counters['refetched'])
+                self._run.count('mismatches', executor.counters['mismatched'])
+                self._run.connections = [connection.as_dict() for connection in executor.connections()]
+                for connection in executor.connections():
+                    for package, (files, size, elapsed) in connection.packages.items():
+                        data = self._run.packages.setdefault(package, {'files': 0, 'bytes': 0, 'transfer': 0.0})
+                        data['files'] += files
+                        data['bytes'] += size
+                        data['transfer'] += elapsed
+            if self.metrics is not None:
+                self._record_transfer(executor, len(buffered_tasks), retried, failures)
+                if background:  # вне запуска - метрики записываются сразу
+                    self._save_metrics()
+            added = [package for package in sorted(buffered)
+                     if os.path.isdir(os.path.join(self._buffer, package)) and self._buffered.add(package)]
+            if added:
+                self._refresh(packages=False)
             if exc_queue.qsize():
                 self.logger.debug('выгрузка исключений из очереди')
                 exc = None
@@ -643,43 +1306,201 @@ class Manager:
                     raise exc
 
         self.logger.debug('handle_tasks: очередь обработана')
-        # end up
+        return failures
+
+    def _run_tasks(self, executor: TaskExecutor, tasks, processBar):
+        """Постановка задач в обработку и ожидание их выполнения"""
+        timeline = executor.timeline
+        for task in tasks:
+            task_id = id(task)
+            self.trace('handle_tasks: получена задача <{}>', task_id)
+            with timeline.span(PRODUCER, 'submit', 'producer'):  # долгий интервал - нет места в очереди
+                while not executor.submit(task, timeout=POLL_TIMEOUT):
+                    if executor.stopper.is_set():  # worker дернул стоп-кран
+                        raise InterruptedError
+                    self._update_progress(executor.size_queue, processBar)
+            self.trace('handle_tasks: задача <{}> помещена в очередь', task_id)
+            self._update_progress(executor.size_queue, processBar)
+
+        self.logger.debug('все задачи помещены в очередь, ожидание окончания очереди')
+        with timeline.span(PRODUCER, 'join', 'producer'):
+            while not executor.join(timeout=POLL_TIMEOUT):
+                if executor.stopper.is_set():
+                    raise InterruptedError
+                self._update_progress(executor.size_queue, processBar)
 
-    def flush_buffer(self, packs: Iterable, processBar):
+    @staticmethod
+    def _update_progress(size_queue: Queue, processBar):
+        try:
+            for _ in range(size_queue.qsize()):
+                size = size_queue.get_nowait()
+                processBar.SetValue(processBar.GetValue() + size)
+        except Empty:
+            pass
+
+    def flush_buffer(self, packs: Iterable, processBar, deleted=None, failed=()) -> dict:
         """
-        Перемещение пакетов из буфера в папку установки
+        Установка пакетов из буфера в папку установки
+
+        Пакет собирается рядом с папкой установки и подменяет ее целиком (см. `eiisclient.install`).
+        Пакеты устанавливаются параллельно (не более `install_threads` одновременно), ошибка установки пакета
+        не прерывает установку остальных. Ярлыки создаются по мере установки пакетов в вызывающем потоке.
+
         :param packs: Список пакетов на обработку
-        :return:
+        :param deleted: удаляемые файлы пакетов: {пакет: {относительный путь, ..}}
+        :param failed: пакеты с необработанными файлами: не устанавливаются, их файлы остаются в буфере
+        :return: пакеты с ошибкой установки: {пакет: [(папка пакета, ошибка)]}
         """
         self.logger.info('Установка пакетов')
+        deleted = deleted or {}
         remote_packages = self.remote_index_packages
+        origins = [data.origin for _, data in packs]
         for package in self.buffer_content():
-            if package not in (data.origin for _, data in packs):  # пакет остался с прошлой неудачной установки
+            if package in failed:
+                self.logger.debug('flush_buffer: `{}` не установлен, файлы оставлены в буфере'.format(package))
+            elif package not in origins:  # пакет остался с прошлой неудачной установки
                 self.logger.warning('- `{}` есть в буфере, но нет в списке '
                                     'устанавливаемых пакетов - пропуск'.format(package))
-                continue
 
-            src = os.path.join(self._buffer, package)
-            dst = os.path.join(self.eiispath, package)
+        packages = [package for package in origins
+                    if os.path.isdir(os.path.join(self._buffer, package)) or deleted.get(package)]
+        failures = {}
+        with ThreadPoolExecutor(max_workers=self._setting('install_threads') or 1) as pool:
+            futures = {pool.submit(self._flush_package, package, deleted.get(package, ())): package
+                       for package in packages}
+            for future in as_completed(futures):
+                package = futures[future]
+                title = remote_packages[package]['alias'] or package
+                try:
+                    future.result()
+                except PermissionError as err:
+                    failures[package] = [(package, PacketInstallError(
+                        'Недостаточно прав на установку пакета {} в {}'.format(package, self.eiispath)))]
+                    self.logger.error('Недостаточно прав на установку пакета `{}`: {}'.format(title, err))
+                except Exception as err:
+                    failures[package] = [(package, err)]
+                    self.logger.error('Ошибка при установке пакета `{}`: {}'.format(title, err))
+                    if self.debug:
+                        self.logger.exception(err)
+                else:
+                    try:
+                        with self._phase('shortcuts'):
+                            _, execf = self._get_link_data(package)  # пакет без исполняемого файла - без ярлыка
+                            if execf:
+                                self._create_shortcut(title, execf, in_dir=self.config.links_in_dir)
+                    except LinkUpdateError as err:
+                        self.logger.error('Не удалось создать ярлык для `{}`'.format(title))
+                        if self.debug:
+                            self.logger.exception(err)
 
-            title = remote_packages[package]['alias'] or package
-            try:
-                self.move_package(src, dst)
-                execf = os.path.join(self.eiispath, package, remote_packages[package]['execf'])
-                self._create_shortcut(title, execf, in_dir=self.config.links_in_dir)
-            except PermissionError as err:
-                raise PacketInstallError('Недостаточно прав на установку пакета '
-                                         '{} в {}'.format(package, self.eiispath)) from err
-            except LinkUpdateError as err:
-                self.logger.error('Не удалось создать ярлык для `{}`'.format(title))
-                if self.debug:
-                    self.logger.exception(err)
-            except Exception as err:
-                raise PacketInstallError('Ошибка при установке пакета `{}`'.format(package)) from err
+                processBar.SetValue(processBar.GetValue() + self._progressBarStep)
+
+        if self.store is not None:
+            self.store.gc()
+        return failures
+
+    def _flush_package(self, package: str, deleted):
+        """Установка пакета из буфера (выполняется в пуле установки)"""
+        src = os.path.join(self._buffer, package)
+        dst = os.path.join(self.eiispath, package)
+        old = self._install_package(package, src, dst, deleted)
+        self.journal.package_done(package)
+        self._installed_listing().add(package)
+        if not os.path.isdir(src):
+            self._buffered.discard(package)
+        for rel in self.remote_index_packages[package]['files']:  # проверенные файлы буфера стали файлами пакета
+            self.file_cache.transfer(os.path.realpath(os.path.join(src, rel)), os.path.join(dst, rel))
+        if old is not None:
+            self.trash.wake()  # прежняя версия удаляется в фоне
+        self.logger.debug('install_packets: `{}` перемещен из буфера в {}'.format(package, dst))
+
+    def _install_package(self, package: str, src: str, dst: str, deleted) -> str:
+        """
+        Установка пакета: из хранилища, если оно используется, иначе сборкой из буфера и установленной версии
+
+        :return: путь к папке прежней версии, подлежащей удалению, или None
+        """
+        if self.store is None:
+            return self._installer.install(src, dst, deleted)
+
+        entry = self.remote_index_packages[package]
+        known = self.local_index_packages.get(package, {}).get('files', {})
+        # неизмененные в индексе файлы переносятся из папки установки: изменения на месте (настройки, базы) сохраняются
+        keep = [rel for rel, digest in entry['files'].items()
+                if known.get(rel) == digest and not os.path.isfile(os.path.join(src, rel))]
+        try:
+            self._store_ingest(entry['files'], src, dst, known)
+            staging = self.store.stage(entry['files'], dst, known, keep=keep)
+        except StoreError as err:
+            self.logger.warning('Пакет `{}` устанавливается без хранилища: {}'.format(package, err))
+            return self._installer.install(src, dst, deleted)
+
+        old = self._installer.swap(staging, dst)
+        self.store.save_manifest(package, entry, gc=False)  # неиспользуемые объекты - после установки всех пакетов
+        rmtree(src, ignore_errors=True)
+        return old
+
+    def _store_ingest(self, files: dict, src: str, dst: str, known: dict):
+        """
+        Добавление в хранилище недостающих файлов пакета: загруженных (проверены при загрузке) из буфера,
+        неизмененных - копией из папки установки с проверкой контрольной суммы. Поврежденные объекты (изменен
+        установленный файл - жесткая ссылка на объект) заменяются, поэтому восстановление пакета (`repair`)
+        размещает загруженный файл, а не прежний объект.
+        """
+        for rel, digest in files.items():
+            if self.store.check(digest):
+                continue
+            buffered = os.path.join(src, rel)
+            if os.path.isfile(buffered):
+                self.store.add(buffered, digest)
+            elif known.get(rel) == digest and self.file_cache.digest(os.path.join(dst, rel)) == digest:
+                self.store.add(os.path.join(dst, rel), digest, copy=True)
             else:
-                self.logger.debug('install_packets: `{}` перемещен из буфера в {}'.format(package, dst))
+                raise StoreError('нет проверенного файла {}'.format(rel))
 
-            processBar.SetValue(processBar.GetValue() + self._progressBarStep)
+    def rollback_package(self, package: str, generation=None) -> int:
+        """
+        Откат пакета на предыдущую (или указанную) версию из хранилища без загрузки файлов
+
+        Папка пакета собирается из объектов хранилища и подменяет установленную; в локальный индекс записываются
+        данные восстановленной версии, поэтому при следующей проверке пакет снова будет предложен к обновлению.
+
+        :param package: название папки пакета
+        :param generation: поколение пакета в хранилище, по умолчанию - предшествующее установленному
+        :return: восстановленное поколение
+        """
+        if self.store is None:
+            raise PacketInstallError('Хранилище пакетов не используется')
+        current = self.local_index_packages.get(package, {})
+        generations = self.store.generations_of(package)
+        if generation is None:
+            phashes = [self.store.manifest(package, gen).get('phash') for gen in generations]
+            pos = phashes.index(current.get('phash')) if current.get('phash') in phashes else len(generations)
+            if pos < 1:
+                raise PacketInstallError('Нет предыдущей версии пакета `{}` в хранилище'.format(package))
+            generation = generations[pos - 1]
+        elif generation not in generations:
+            raise PacketInstallError('Нет версии {} пакета `{}` в хранилище'.format(generation, package))
+
+        entry = self.store.manifest(package, generation)
+        dst = os.path.join(self.eiispath, package)
+        try:
+            staging = self.store.stage(entry['files'], dst, current.get('files', {}))
+            old = self._installer.swap(staging, dst)
+        except Exception as err:
+            raise PacketInstallError('Ошибка отката пакета `{}`'.format(package)) from err
+        if old is not None:
+            self.trash.wake()
+
+        index = dict(self.local_index)
+        packages = dict(self.local_index_packages)
+        packages[package] = entry
+        index['packages'] = packages
+        write_data(LOCAL_INDEX_FILE, jsonify(index))
+        write_data(LOCAL_INDEX_FILE_HASH, hash_calc(index))
+        self.logger.info('Пакет `{}` возвращен к версии {}'.format(entry.get('alias') or package, generation))
+        self.reset()
+        return generation
 
     def update_links(self):
         self.logger.info('Обновление ярлыков на рабочем столе')
@@ -718,6 +1539,8 @@ class Manager:
         lnpath = os.path.join(path, '{}.lnk'.format(title))
 
         try:
+            import pythoncom
+            import winshell
             pythoncom.CoInitialize()  # для работы в threads
             with winshell.shortcut(lnpath) as lp:
                 if lp.path == exe_file_path:
@@ -740,10 +1563,17 @@ class Manager:
         except FileNotFoundError:
             pass
 
+    def close(self):
+        """Завершение работы: остановка фоновой загрузки и очистки корзины, удаление временных файлов"""
+        self.stop_prefetch()
+        self._clean()
+
     def _clean(self):
+        self._finalize()  # остановка очистки корзины с ожиданием удаления текущей папки
         self._tempdir.cleanup()
 
     def clean_buffer(self) -> bool:
+        self.stop_prefetch()
         try:
             rmtree(self._buffer)
         except FileNotFoundError:
@@ -753,7 +1583,8 @@ class Manager:
             if self.debug:
                 self.logger.exception(err)
             return False
-        self._info_list = self._get_info_list(remote=False)
+        self._buffered.clear()
+        self._refresh(packages=False)
         return True
 
     def _get_link_data(self, packet) -> tuple:
@@ -772,8 +1603,8 @@ class Manager:
 
     def move_package(self, src, dst):
         self.logger.debug('move_package: перенос пакета {} -> {}'.format(src, dst))
-        copytree(src, dst)
-        rmtree(src)
+        self._installer.move(src, dst)
+        self._installed.invalidate()
 
     def _get_temp_dir(self):
         tmpdir = getattr(self, '_tempdir', None)
@@ -787,102 +1618,3 @@ class Manager:
         for _, data in packs_handle:
             size += r_packs[data.origin]['size']
         return size
-
-
-class Worker(threading.Thread):
-    max_repeat = 3
-
-    def __init__(self, queue: Queue, stopper: threading.Event, dispatcher: BaseDispatcher,
-                 logger=None, *args, **kwargs):
-        self.queue = queue
-        self.exc_queue = kwargs.pop('exc_queue')  # type: Queue
-        self.size_queue = kwargs.pop('size_queue')  # type: Queue
-        self.dispatcher = dispatcher
-        self.logger = logger or get_stdout_logger()
-        self.stopper = stopper
-        super(Worker, self).__init__(*args, **kwargs)
-        self.dispatcher.up()
-
-    def __repr__(self):
-        return 'WRK{}'.format(id(self))
-
-    def run(self):
-        try:
-            while True:
-                if self.stopper.is_set():
-                    self.logger.debug('worker {}: {}'.format(self, 'Обнаружен стоп-флаг'))
-                    return
-
-                if self.dispatcher.repo_is_busy():
-                    self.stopper.set()
-                    self.exc_queue.put(RepoIsBusy)
-                    return
-
-                task = self.queue.get(timeout=1)
-
-                # start real work
-                task_id = id(task)
-                self.logger.debug('worker {}: получена задача <{}>'.format(self, task_id))
-
-                # удаление
-                if task.action == State.DEL:
-                    remove(task.src, raise_=True)
-                    self.queue.task_done()
-                    continue
-
-                # загрузка
-                if os.path.exists(task.dst) and os.path.isfile(task.dst) and file_hash_calc(task.dst) == task.hash:
-                    self.logger.debug('worker {}: <{}> обнаружен загруженный файл в буфере {}, пропуск'.format(
-                        self, task_id, task.dst))
-                    self.size_queue.put(os.path.getsize(task.dst))
-                    self.queue.task_done()
-                    continue
-
-                fault_count = 0
-                while True:
-                    self.dispatcher.get_file(task.src, task.dst)
-                    self.logger.debug('worker {}: <{}> файл {} загружен в буфер'.format(self, task_id, task.dst))
-
-                    hash_sum = file_hash_calc(task.dst)
-                    if fault_count == 0:
-                        self.size_queue.put(os.path.getsize(task.dst))
-
-                    if not hash_sum == task.hash:
-                        fault_count += 1
-                        self.logger.debug('worker {}: <{}> HASH MISMATCH {} != {} [{}]'.format(
-                            self, task_id, hash_sum, task.hash, fault_count))
-                        if fault_count >= self.max_repeat:
-                            self.logger.debug('worker {}: <{}> исчерпан лимит загрузок файла'.format(self, task_id))
-                            raise HashMismatchError('Неверная контрольная сумма файла `{}` из пакета `{}`'.format(
-                                os.path.basename(task.src), task.packetname))
-                        else:
-                            remove(task.dst, raise_=True)
-                            self.logger.debug('worker {}: {} удален'.format(self, task.dst))
-                            continue
-                    break
-
-                self.queue.task_done()
-                self.logger.debug('worker {}: задача <{}> выполнена'.format(self, task_id))
-
-        except Empty:
-            self.logger.debug('worker {}: очередь пустая, выхожу'.format(self))
-            return
-        except HashMismatchError as err:
-            self.logger.error('Расхождение контрольных сумм файла данных индекса.'
-                              'Требуется индексация репозитория.')
-            if self.logger.level == logging.DEBUG:
-                self.logger.exception(err)
-            self.stopper.set()
-            self.exc_queue.put(err)
-            self.queue.task_done()
-        except Exception as err:
-            self.logger.debug('worker {}: {}'.format(self, err))
-            if self.logger.level == logging.DEBUG:
-                self.logger.exception(err)
-            self.stopper.set()
-            self.exc_queue.put(err)
-            self.queue.task_done()
-
-        finally:
-            self.logger.debug('worker {}: работу завершил'.format(self))
-            self.dispatcher.down()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Метрики обновления для мониторинга рабочих мест
+
+Счетчики и гистограммы записываются в текстовый файл в формате Prometheus (text exposition format), который
+читает локальный сборщик (например, textfile collector node_exporter). Значения накапливаются между
+запусками программы: состояние хранится рядом с файлом метрик (`<файл>.json`, сборщиком не читается).
+Файлы записываются атомарно - через временный файл и замену.
+
+Метрики помечаются репозиторием (`repo`, без учетных данных) и типом диспетчера (`dispatcher`: file, smb, ftp).
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlsplit, urlunsplit
+
+from eiisclient import DEFAULT_ENCODING
+
+DURATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+THROUGHPUT_BUCKETS = (64 * 1024, 256 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2,
+                      256 * 1024 ** 2)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+# название: (тип, описание, границы корзин гистограммы)
+FAMILIES = OrderedDict((
+    ('eiisclient_runs_total', ('counter', 'Запуски проверки обновлений, обновления и восстановления', None)),
+    ('eiisclient_run_duration_seconds', ('histogram', 'Длительность запуска', DURATION_BUCKETS)),
+    ('eiisclient_last_run_timestamp_seconds', ('gauge', 'Время окончания последнего запуска', None)),
+    ('eiisclient_transferred_bytes_total', ('counter', 'Загружено из репозитория, байт', None)),
+    ('eiisclient_files_total', ('counter', 'Файлов в обработке загрузки', None)),
+    ('eiisclient_buffer_hits_total', ('counter', 'Файлы, взятые из буфера без загрузки', None)),
+    ('eiisclient_retries_total', ('counter', 'Повторные обработки файлов', None)),
+    ('eiisclient_hash_mismatches_total', ('counter', 'Несовпадения контрольной суммы загруженного файла', None)),
+    ('eiisclient_failed_files_total', ('counter', 'Файлы, не обработанные после повторов', None)),
+    ('eiisclient_connection_throughput_bytes_per_second',
+     ('histogram', 'Скорость загрузки по соединениям', THROUGHPUT_BUCKETS)),
+    ('eiisclient_request_latency_seconds',
+     ('histogram', 'Время запроса к репозиторию без передачи данных', LATENCY_BUCKETS)),
+))
+
+
+def repo_label(repopath: str) -> str:
+    """Репозиторий для метки: адрес без учетных данных"""
+    parts = urlsplit(repopath or '')
+    if parts.scheme.lower() == 'ftp' and parts.hostname:
+        netloc = parts.hostname if parts.port is None else '{}:{}'.format(parts.hostname, parts.port)
+        return urlunsplit((parts.scheme, netloc, parts.path, '', ''))
+    return repopath or ''
+
+
+def dispatcher_label(dispatcher) -> str:
+    """Тип диспетчера для метки: file, smb, ftp"""
+    dispatcher = getattr(dispatcher, 'dispatcher', dispatcher)  # имитация канала связи - по исходному диспетчеру
+    if dispatcher is None:
+        return ''
+    return type(dispatcher).__name__.lower().replace('dispatcher', '')
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{{{}}}'.format(','.join('{}="{}"'.format(key, _escape(value)) for key, value in sorted(labels.items())))
+
+
+def _number(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value)
+
+
+class Metrics:
+    """
+    Счетчики, гистограммы и показатели с записью в файл
+
+    Состояние читается при первом изменении; значения: {метрика: {метки json: значение}}, для гистограммы -
+    [количество по корзинам.., сумма, количество].
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state_path = '{}.json'.format(path)
+        self._values = None  # type: dict
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '<Metrics: {}>'.format(self.path)
+
+    @property
+    def values(self) -> dict:
+        with self._lock:
+            if self._values is None:
+                try:
+                    with open(self.state_path, encoding=DEFAULT_ENCODING) as fp:
+                        data = json.load(fp)
+                except (OSError, ValueError):
+                    data = {}
+                self._values = {name: data.get(name, {}) if isinstance(data.get(name), dict) else {}
+                                for name in FAMILIES}
+            return self._values
+
+    @staticmethod
+    def _key(labels: dict) -> str:
+        return json.dumps(labels or {}, sort_keys=True, ensure_ascii=False)
+
+    def inc(self, name: str, labels=None, value=1):
+        if not value:
+            return
+        with self._lock:
+            series = self.values[name]
+            key = self._key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, labels=None, value=0):
+        with self._lock:
+            self.values[name][self._key(labels)] = value
+
+    def observe(self, name: str, labels=None, value=0.0):
+        buckets = FAMILIES[name][2]
+        with self._lock:
+            series = self.values[name]
+            key = self._key(labels)
+            data = series.setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    data[i] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    def render(self) -> str:
+        """Метрики в формате Prometheus"""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, buckets) in FAMILIES.items():
+                series = self.values[name]
+                if not series:
+                    continue
+                lines.append('# HELP {} {}'.format(name, help_text))
+                lines.append('# TYPE {} {}'.format(name, kind))
+                for key, value in sorted(series.items()):
+                    labels = json.loads(key)
+                    if not kind == 'histogram':
+                        lines.append('{}{} {}'.format(name, _labels(labels), _number(value)))
+                        continue
+                    for bound, count in zip(buckets + ('+Inf',), value[:len(buckets)] + [value[-1]]):
+                        lines.append('{}_bucket{} {}'.format(name, _labels(dict(labels, le=_number(bound))), count))
+                    lines.append('{}_sum{} {}'.format(name, _labels(labels), _number(round(value[-2], 6))))
+                    lines.append('{}_count{} {}'.format(name, _labels(labels), value[-1]))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _write(path: str, data: str):
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'w', encoding=DEFAULT_ENCODING, newline='\n') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+
+    def save(self):
+        """Атомарная запись состояния и файла метрик"""
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._write(self.state_path, json.dumps(self.values, ensure_ascii=False))
+            self._write(self.path, self.render())
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+Имитация канала связи с репозиторием
+
+`SimulatedDispatcher` оборачивает диспетчер и добавляет к его операциям задержку (с разбросом), ограничение
+пропускной способности общего канала, ошибки операций и разрывы соединения данных, а также появление флага
+регламентных работ через заданное время. Параметры задаются профилем `NetProfile`; случайные события
+воспроизводимы при заданном `seed`. Используется для замеров и тестов:
+
+    get_dispatcher(repo, logger=logger, profile='branch-2mbit')
+
+или параметр настроек `net_profile` (название профиля или словарь параметров).
+"""
+import os
+import random
+import threading
+import time
+
+from eiisclient.dispatch import BaseDispatcher
+
+PROFILES = {
+    'lan': dict(latency=0.001, bandwidth=100 * 1024 * 1024),
+    'dsl-8mbit': dict(latency=0.03, jitter=0.01, bandwidth=8 * 1000 * 1000 // 8, fail_rate=0.001, drop_rate=0.002),
+    'branch-2mbit': dict(latency=0.08, jitter=0.03, bandwidth=2 * 1000 * 1000 // 8, fail_rate=0.005,
+                         drop_rate=0.01),
+    'flaky': dict(latency=0.05, jitter=0.05, bandwidth=1024 * 1024, fail_rate=0.05, drop_rate=0.05),
+}
+
+
+class NetProfile:
+    """
+    Профиль канала связи
+
+    Состояние канала (занятость полосы, время начала работы, флаг регламента) общее для всех диспетчеров
+    с этим профилем: потоки загрузки делят одну полосу пропускания.
+    """
+
+    def __init__(self, name='custom', latency=0.0, jitter=0.0, bandwidth=0, fail_rate=0.0, drop_rate=0.0,
+                 busy_after=None, seed=None):
+        """
+        :param latency: задержка операции, сек.
+        :param jitter: разброс задержки, сек.
+        :param bandwidth: пропускная способность канала, байт/сек.; 0 - без ограничения
+        :param fail_rate: вероятность ошибки загрузки
+        :param drop_rate: вероятность разрыва соединения данных во время загрузки
+        :param busy_after: через сколько секунд после подключения появляется флаг регламентных работ
+        :param seed: начальное значение генератора случайных событий
+        """
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.drop_rate = drop_rate
+        self.busy_after = busy_after
+        self.busy = threading.Event()  # флаг регламентных работ; можно установить и вручную
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self._free_at = 0.0  # время освобождения полосы канала
+        self._started = None  # type: float
+
+    def __repr__(self):
+        return '<NetProfile: {}>'.format(self.name)
+
+    @classmethod
+    def get(cls, value):
+        """
+        Профиль по значению настройки
+
+        :param value: None, название профиля из `PROFILES`, словарь параметров или `NetProfile`
+        """
+        if value is None or isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls(**value)
+        try:
+            return cls(value, **PROFILES[value])
+        except KeyError:
+            raise ValueError('Неизвестный профиль канала связи: {}'.format(value))
+
+    def start(self):
+        with self._lock:
+            if self._started is None:
+                self._started = time.monotonic()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(self.latency + self._rnd.uniform(-self.jitter, self.jitter), 0.0)
+
+    def chance(self, rate: float) -> bool:
+        if not rate:
+            return False
+        with self._lock:
+            return self._rnd.random() < rate
+
+    def fraction(self) -> float:
+        with self._lock:
+            return self._rnd.random()
+
+    def transfer(self, size: int):
+        """Ожидание передачи `size` байт по общему каналу"""
+        if not self.bandwidth or size <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._free_at = max(now, self._free_at) + size / self.bandwidth
+            wait = self._free_at - now
+        time.sleep(wait)
+
+    def is_busy(self) -> bool:
+        if not self.busy.is_set() and self.busy_after is not None and self._started is not None:
+            if time.monotonic() - self._started >= self.busy_after:
+                self.busy.set()
+        return self.busy.is_set()
+
+
+class SimulatedDispatcher(BaseDispatcher):
+    """Диспетчер с имитацией канала связи"""
+
+    def __init__(self, dispatcher: BaseDispatcher, profile, *args, **kwargs):
+        super(SimulatedDispatcher, self).__init__(*args, **kwargs)
+        self.dispatcher = dispatcher
+        self.profile = NetProfile.get(profile)
+
+    def __repr__(self):
+        return '<Simulated {} over {}>'.format(self.dispatcher, self.profile)
+
+    @property
+    def repopath(self):
+        return self.dispatcher.repopath
+
+    def _wait(self):
+        time.sleep(self.profile.delay())
+
+    def _check_fail(self, src):
+        if self.profile.chance(self.profile.fail_rate):
+            raise IOError('Имитация: ошибка загрузки {}'.format(src))
+
+    def up(self):
+        self._wait()
+        self.dispatcher.up()
+        self.profile.start()
+
+    def down(self):
+        self.dispatcher.down()
+
+    def get_file(self, src: str, dst: str) -> str:
+        self._wait()
+        self._check_fail(src)
+        self.dispatcher.get_file(src, dst)
+        size = os.path.getsize(dst)
+        if self.profile.chance(self.profile.drop_rate):
+            received = int(size * self.profile.fraction())
+            self.profile.transfer(received)
+            with open(dst, 'r+b') as fp:
+                fp.truncate(received)
+            raise IOError('Имитация: разрыв соединения данных при загрузке {}'.format(src))
+        self.profile.transfer(size)
+        return dst
+
+    def get_range(self, src: str, offset: int, length: int) -> bytes:
+        self._wait()
+        self._check_fail(src)
+        data = self.dispatcher.get_range(src, offset, length)
+        if self.profile.chance(self.profile.drop_rate):
+            self.profile.transfer(int(len(data) * self.profile.fraction()))
+            raise IOError('Имитация: разрыв соединения данных при загрузке {}'.format(src))
+        self.profile.transfer(len(data))
+        return data
+
+    def repo_is_busy(self):
+        self._wait()
+        return self.profile.is_busy() or self.dispatcher.repo_is_busy()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Снимок локального индекса
+
+Разобранный локальный индекс и построенные по нему данные сохраняются в рабочей директории в двоичном виде
+(pickle) и читаются одним чтением файла, без разбора json. Снимок действителен, пока совпадают версия формата
+и ключ - хэш индекса, размер и время изменения файла индекса.
+"""
+import os
+import pickle
+
+SNAPSHOT_VERSION = 1
+
+
+def index_key(index_file: str, hash_file: str):
+    """
+    Ключ снимка для текущего состояния файлов индекса
+
+    :return: (хэш, размер, время изменения) или None, если индекса нет
+    """
+    try:
+        st = os.stat(index_file)
+        with open(hash_file, encoding='ascii') as fp:
+            digest = fp.read().strip()
+    except (OSError, ValueError):
+        return None
+    return digest, st.st_size, st.st_mtime_ns
+
+
+def load_snapshot(path: str, key) -> dict:
+    """
+    Данные снимка или None - снимка нет, он поврежден или не соответствует ключу
+
+    :return: {'index': индекс, ..сохраненные данные}
+    """
+    if key is None:
+        return None
+    try:
+        with open(path, 'rb') as fp:
+            data = pickle.loads(fp.read())
+    except Exception:  # нет снимка или он поврежден
+        return None
+    if not isinstance(data, dict) or not data.get('version') == SNAPSHOT_VERSION or not data.get('key') == key:
+        return None
+    return data
+
+
+def save_snapshot(path: str, key, index: dict, **derived) -> bool:
+    """Запись снимка индекса и построенных по нему данных"""
+    if key is None:
+        return False
+    data = dict(derived, version=SNAPSHOT_VERSION, key=key, index=index)
+    tmp = '{}.tmp'.format(path)
+    try:
+        with open(tmp, 'wb') as fp:
+            fp.write(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp, path)
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Локальное хранилище файлов пакетов по контрольной сумме
+
+Хранилище (`WORK_DIR/store`) содержит:
+    objects/<xx>/<sha1>                   - файлы, по одному экземпляру на контрольную сумму;
+    manifests/<пакет>/<поколение>.json     - данные индекса установленных версий пакета (поколений).
+
+Установленный пакет собирается из объектов хранилища жесткими ссылками (копированием, если ссылку создать
+нельзя), поэтому одинаковые файлы разных пакетов и версий занимают место на диске один раз. Хранится
+несколько последних поколений пакета: откат на предыдущую версию - сборка папки по манифесту без загрузки.
+
+Файлы, которые подсистемы изменяют на месте (базы данных, настройки), из хранилища копируются, чтобы изменение
+не затронуло объект хранилища и другие пакеты. Прочие установленные файлы - те же объекты хранилища: изменение такого
+файла на месте изменяет и объект. Поэтому объект проверяется по контрольной сумме перед размещением и перед
+повторным использованием (`check`), поврежденный объект удаляется. Файлы папки установки добавляются в хранилище
+копией. С кэшем состояния файлов (`eiisclient.filecache`) проверка неизмененного объекта не читает файл.
+"""
+import logging
+import os
+import threading
+import time
+
+from eiisclient import DEFAULT_ENCODING
+from eiisclient.functions import file_hash_calc, jsonify, read_file, remove, rmtree, unjsonify, write_data
+from eiisclient.install import STAGING_SUFFIX, link_or_copy, stream_copy, walk_files
+
+GENERATIONS = 3  # количество хранимых поколений пакета
+COPY_EXTENSIONS = ('.ini', '.cfg', '.dbf', '.cdx', '.fpt', '.mdb', '.db')  # файлы, изменяемые на месте
+
+
+def get_stdout_logger() -> logging.Logger:
+    return logging.Logger(__name__)
+
+
+class StoreError(Exception):
+    pass
+
+
+class ObjectStore:
+    """Хранилище файлов пакетов по контрольной сумме"""
+
+    def __init__(self, root: str, generations=GENERATIONS, copy_extensions=COPY_EXTENSIONS, logger=None, cache=None):
+        """
+        :param cache: кэш состояния файлов (`FileStateCache`) для проверки объектов
+        """
+        self.root = root
+        self.generations = max(generations, 1)
+        self.copy_extensions = tuple(ext.lower() for ext in copy_extensions)
+        self.logger = logger or get_stdout_logger()
+        self.cache = cache
+        self.objects = os.path.join(root, 'objects')
+        self.manifests_dir = os.path.join(root, 'manifests')
+
+    def __repr__(self):
+        return '<ObjectStore: {}>'.format(self.root)
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def has(self, digest: str) -> bool:
+        return os.path.isfile(self.object_path(digest))
+
+    def _digest(self, path: str) -> str:
+        if self.cache is not None:
+            return self.cache.digest(path)
+        return file_hash_calc(path)
+
+    def _drop(self, digest: str):
+        obj = self.object_path(digest)
+        remove(obj)
+        if self.cache is not None:
+            self.cache.discard(obj)
+
+    def check(self, digest: str) -> bool:
+        """Объект есть и соответствует контрольной сумме; поврежденный объект удаляется"""
+        if not self.has(digest):
+            return False
+        if self._digest(self.object_path(digest)) == digest:
+            return True
+        self.logger.warning('Объект {} хранилища поврежден (изменен установленный файл) и удален'.format(digest))
+        self._drop(digest)
+        return False
+
+    def add(self, path: str, digest: str, verify=False, copy=False):
+        """
+        Добавление проверенного файла в хранилище (жесткой ссылкой, при невозможности - копией)
+
+        :param verify: проверить контрольную сумму файла перед добавлением
+        :param copy: добавить копию - для файлов папки установки, которые могут быть изменены на месте
+        """
+        if self.check(digest):
+            return
+        if verify and not file_hash_calc(path) == digest:
+            raise StoreError('Файл {} не соответствует контрольной сумме'.format(path))
+        obj = self.object_path(digest)
+        os.makedirs(os.path.dirname(obj), exist_ok=True)
+        tmp = '{}.{}.tmp'.format(obj, threading.get_ident())
+        remove(tmp)
+        if copy:
+            stream_copy(path, tmp)
+        else:
+            link_or_copy(path, tmp)
+        os.replace(tmp, obj)
+        if self.cache is not None:
+            self.cache.put(obj, digest)
+
+    def materialize(self, digest: str, dst: str, verify=True):
+        """
+        Размещение объекта хранилища по пути `dst`
+
+        :param verify: проверить объект (см. `check`)
+        """
+        obj = self.object_path(digest)
+        if verify and not self.check(digest):
+            raise StoreError('Объект {} хранилища поврежден или отсутствует'.format(digest))
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.splitext(dst)[1].lower() in self.copy_extensions:
+            stream_copy(obj, dst)
+        else:
+            link_or_copy(obj, dst)
+
+    def stage(self, files: dict, live: str, known=(), verify=True, keep=()) -> str:
+        """
+        Сборка пакета по данным файлов индекса в папке `<live>.staging`
+
+        :param files: файлы пакета: {относительный путь: контрольная сумма}
+        :param live: папка установки пакета
+        :param known: файлы пакета по индексу прежней версии; прочие файлы установленной папки (созданные
+        подсистемой или пользователем) переносятся в собранную папку
+        :param verify: проверять объекты хранилища
+        :param keep: файлы, переносимые из установленной папки, а не из хранилища (не изменены в индексе и могли
+        быть изменены на месте, как при установке без хранилища); отсутствующие в папке размещаются из хранилища
+        :return: путь к собранной папке
+        """
+        staging = live + STAGING_SUFFIX
+        if os.path.exists(staging):
+            rmtree(staging)
+        os.makedirs(staging)
+        keep = {os.path.normcase(os.path.normpath(rel)) for rel in keep}
+        try:
+            for rel, digest in files.items():
+                target = os.path.join(staging, rel)
+                installed = os.path.join(live, rel)
+                if os.path.normcase(os.path.normpath(rel)) in keep and os.path.isfile(installed):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    link_or_copy(installed, target)
+                else:
+                    self.materialize(digest, target, verify=verify)
+            if os.path.isdir(live):
+                managed = {os.path.normcase(os.path.normpath(rel)) for rel in set(files) | set(known)}
+                for rel in walk_files(live):
+                    if os.path.normcase(rel) in managed:
+                        continue
+                    target = os.path.join(staging, rel)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    link_or_copy(os.path.join(live, rel), target)
+        except Exception:
+            rmtree(staging, ignore_errors=True)
+            raise
+        return staging
+
+    # manifests
+    def _manifest_dir(self, package: str) -> str:
+        return os.path.join(self.manifests_dir, package)
+
+    def generations_of(self, package: str) -> list:
+        """Поколения пакета, от старых к новым"""
+        try:
+            names = os.listdir(self._manifest_dir(package))
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith('.json') and name[:-5].isdigit())
+
+    def manifest(self, package: str, generation: int) -> dict:
+        data = read_file(os.path.join(self._manifest_dir(package), '{}.json'.format(generation)),
+                         encoding=DEFAULT_ENCODING)
+        if data is None:
+            raise StoreError('Нет данных поколения {} пакета `{}`'.format(generation, package))
+        return unjsonify(data)
+
+    def save_manifest(self, package: str, entry: dict, gc=True) -> int:
+        """
+        Сохранение поколения пакета с удалением устаревших поколений и неиспользуемых объектов
+
+        :param entry: данные пакета из индекса репозитория
+        :param gc: удалить неиспользуемые объекты; при параллельной установке пакетов выполняется после установки
+        всех пакетов, чтобы не удалить объекты пакета, поколение которого еще не сохранено
+        :return: номер поколения
+        """
+        generations = self.generations_of(package)
+        if generations and self.manifest(package, generations[-1]).get('phash') == entry.get('phash'):
+            return generations[-1]
+
+        generation = max(int(time.time() * 1000), generations[-1] + 1 if generations else 0)
+        path = os.path.join(self._manifest_dir(package), '{}.json'.format(generation))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_data('{}.tmp'.format(path), jsonify(entry))
+        os.replace('{}.tmp'.format(path), path)
+
+        for old in (generations + [generation])[:-self.generations]:
+            remove(os.path.join(self._manifest_dir(package), '{}.json'.format(old)))
+        if gc:
+            self.gc()
+        return generation
+
+    def drop(self, package: str):
+        """Удаление поколений пакета (пакет удален)"""
+        rmtree(self._manifest_dir(package), ignore_errors=True)
+        self.gc()
+
+    def gc(self) -> int:
+        """Удаление объектов, на которые не ссылается ни одно поколение"""
+        referenced = set()
+        if os.path.isdir(self.manifests_dir):
+            for package in os.listdir(self.manifests_dir):
+                for generation in self.generations_of(package):
+                    referenced.update(self.manifest(package, generation).get('files', {}).values())
+        removed = 0
+        for digest in self.digests():
+            if digest not in referenced:
+                self._drop(digest)
+                removed += 1
+        if removed:
+            self.logger.debug('store: удалено неиспользуемых объектов: {}'.format(removed))
+        return removed
+
+    def digests(self):
+        if not os.path.isdir(self.objects):
+            return
+        for prefix in os.listdir(self.objects):
+            for name in os.listdir(os.path.join(self.objects, prefix)):
+                if not name.endswith('.tmp'):
+                    yield name
@@ -1,5 +1,6 @@
 import sys
-from collections import MutableMapping, namedtuple
+from collections import namedtuple
+from collections.abc import MutableMapping
 
 from enum import Enum
 
@@ -10,7 +11,10 @@ from enum import Enum
 # NEW = 3  # новый, будет установлен
 
 
-Task = namedtuple('Task', ('packetname action src dst hash'))
+Task = namedtuple('Task', ('packetname action src dst hash size patch blocks'))
+# размер файла по индексу; патч: (путь в репозитории, установленный файл);
+# блоки: (установленный файл, размер блока, контрольные суммы блоков)
+Task.__new__.__defaults__ = (None, None, None)
 
 
 class State(Enum):
@@ -80,6 +84,14 @@ class PackList(MutableMapping):
         self._store.clear()
         self._origin.clear()
 
+    def diff(self, other) -> set:
+        """Пакеты, добавленные, удаленные или измененные в `other` относительно этого перечня"""
+        changed = set(self._store) ^ set(other)
+        for key in set(self._store) & set(other):
+            if not vars(self._store[key]) == vars(other[key]):
+                changed.add(key)
+        return changed
+
     def get_action(self, pack):
         val = self._store[pack]
         if val.checked and val.installed and (val.status == State.UPD or val.status == State.NEW):
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Временная шкала работы потоков обработки файлов
+
+Включается параметром настроек `timeline`. Для каждого потока полос обработки (см. `eiisclient.executor`)
+записываются интервалы: ожидание задачи, подключение, проверка блокировки репозитория, загрузка, проверка
+контрольной суммы, удаление; для потока постановки задач - ожидание места в очереди и окончания обработки;
+для каждой задачи - время от постановки в обработку до завершения. Шкала выгружается в формате
+Chrome trace-event (json) и открывается в chrome://tracing или https://ui.perfetto.dev: по ней видно,
+во что упирается обработка - в сеть, в подсчет контрольных сумм или в постановку задач.
+
+Запись события - добавление кортежа в список, без форматирования (события преобразуются при выгрузке);
+без включенной шкалы используется `NULL_TIMELINE`, вызовы которого ничего не делают.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from eiisclient.timing import NULL_PHASE
+
+PRODUCER = 'producer'  # поток постановки задач
+
+
+class Timeline:
+    """Запись интервалов работы потоков"""
+    enabled = True
+
+    def __init__(self):
+        self._origin = time.perf_counter()
+        self._events = []  # (тип, поток, название, категория, начало, окончание или id, аргументы)
+        self._ids = iter(range(1, 1 << 62))
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Timeline: {} events>'.format(len(self._events))
+
+    def complete(self, tid: str, name: str, start: float, end: float, cat='', args=None):
+        """Интервал потока `tid` (время - по `time.perf_counter`)"""
+        self._events.append(('X', tid, name, cat, start, end, args))
+
+    @contextmanager
+    def _span(self, tid, name, cat, args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._events.append(('X', tid, name, cat, start, time.perf_counter(), args))
+
+    def span(self, tid: str, name: str, cat='', args=None):
+        """Интервал потока `tid` (контекстный менеджер)"""
+        return self._span(tid, name, cat, args)
+
+    def begin(self, name: str, cat='task', args=None) -> int:
+        """Начало асинхронного интервала (задачи), возвращает его идентификатор для `end`"""
+        with self._lock:
+            event_id = next(self._ids)
+        self._events.append(('b', None, name, cat, time.perf_counter(), event_id, args))
+        return event_id
+
+    def end(self, event_id: int, name: str, cat='task', args=None):
+        self._events.append(('e', None, name, cat, time.perf_counter(), event_id, args))
+
+    def _us(self, value: float) -> float:
+        return round((value - self._origin) * 1e6, 1)
+
+    def trace_events(self) -> list:
+        """События в формате Chrome trace-event"""
+        pid = os.getpid()
+        tids = {}  # поток: номер
+        events = []
+        for kind, tid, name, cat, start, end, args in list(self._events):
+            event = {'ph': kind, 'name': name, 'cat': cat or 'default', 'pid': pid, 'ts': self._us(start)}
+            if kind == 'X':
+                event['tid'] = tids.setdefault(tid, len(tids) + 1)
+                event['dur'] = round((end - start) * 1e6, 1)
+            else:  # асинхронные интервалы задач
+                event['tid'] = 0
+                event['id'] = end
+            if args:
+                event['args'] = args
+            events.append(event)
+        names = [{'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': number, 'args': {'name': tid}}
+                 for tid, number in tids.items()]
+        names.append({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': 0, 'args': {'name': 'tasks'}})
+        return names + events
+
+    def export(self, path: str):
+        """Запись шкалы в файл json"""
+        with open(path, 'w', encoding='utf-8') as fp:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, fp, ensure_ascii=False)
+
+
+class _NullTimeline:
+    """Шкала выключена"""
+    enabled = False
+
+    def complete(self, *args, **kwargs):
+        pass
+
+    def span(self, *args, **kwargs):
+        return NULL_PHASE
+
+    def begin(self, *args, **kwargs):
+        return None
+
+    def end(self, *args, **kwargs):
+        pass
+
+
+NULL_TIMELINE = _NullTimeline()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Отчет о запуске проверки обновлений и обновления
+
+`RunReport` собирает время этапов запуска (активация диспетчера, загрузка и разбор индекса, построение перечня
+пакетов, планирование, загрузка и проверка файлов, установка, ярлыки, фиксация индекса) и счетчики: объем
+загруженных данных, пропущенные и повторно обработанные файлы. Время этапов - собственное: время вложенного
+этапа не входит во время внешнего, сумма этапов не превышает общего времени запуска. Этапы учитываются только
+в потоке, начавшем запуск (фоновая загрузка в буфер в отчет не попадает).
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from eiisclient.functions import write_data
+
+PHASES = OrderedDict((
+    ('activate', 'активация диспетчера'),
+    ('index_hash', 'хэш индекса'),
+    ('index_download', 'загрузка индекса'),
+    ('index_parse', 'разбор индекса'),
+    ('pack_list', 'перечень пакетов'),
+    ('planning', 'планирование'),
+    ('delete', 'удаление пакетов'),
+    ('transfer', 'загрузка и проверка файлов'),
+    ('install', 'установка'),
+    ('shortcuts', 'ярлыки'),
+    ('commit', 'фиксация индекса'),
+))
+KINDS = {'check': 'проверка обновлений', 'update': 'обновление', 'repair': 'восстановление'}
+
+
+class _NullPhase:
+    """Этап вне запуска - без замера"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class RunReport:
+    """Время этапов и счетчики одного запуска"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.time()
+        self.elapsed = None  # type: float # общее время, сек.; None - запуск не завершен
+        self.result = None  # type: str
+        self.phases = OrderedDict()  # {этап: сек.}
+        self.counters = OrderedDict((('files', 0), ('bytes', 0), ('skipped', 0), ('retries', 0), ('failed', 0)))
+        self.lanes = {}  # статистика полос обработки (см. `TaskExecutor.stats`)
+        self.connections = []  # счетчики соединений загрузки (см. `TaskExecutor.connections`)
+        self.packages = {}  # загрузка по пакетам: {пакет: {'files', 'bytes', 'transfer'}}
+        self._start = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._stack = []  # время вложенных этапов для открытых этапов
+
+    def __repr__(self):
+        return '<RunReport: {}>'.format(self.kind)
+
+    @contextmanager
+    def _phase(self, name):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def phase(self, name):
+        """Замер этапа `name` (контекстный менеджер)"""
+        if not threading.get_ident() == self._thread:
+            return NULL_PHASE
+        return self._phase(name)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self, result='ok'):
+        self.elapsed = time.perf_counter() - self._start
+        self.result = result
+
+    @property
+    def throughput(self) -> float:
+        """Скорость загрузки файлов, байт/сек."""
+        transfer = self.phases.get('transfer')
+        return self.counters['bytes'] / transfer if transfer else 0.0
+
+    def as_dict(self) -> dict:
+        return OrderedDict((
+            ('kind', self.kind),
+            ('started', self.started),
+            ('elapsed', None if self.elapsed is None else round(self.elapsed, 3)),
+            ('result', self.result),
+            ('phases', OrderedDict((name, round(value, 3)) for name, value in self.phases.items())),
+            ('counters', self.counters),
+            ('throughput', round(self.throughput)),
+            ('lanes', self.lanes),
+            ('connections', self.connections),
+            ('packages', self.packages),
+        ))
+
+    def summary(self) -> str:
+        """Строка для информации о последнем запуске"""
+        text = '{}: {:.1f} сек.'.format(KINDS.get(self.kind, self.kind), self.elapsed or 0.0)
+        if self.counters['files']:
+            text += ', файлов {}, загружено {:.1f} МБ ({:.1f} МБ/с)'.format(
+                self.counters['files'], self.counters['bytes'] / 1024 ** 2, self.throughput / 1024 ** 2)
+            for name, title in (('skipped', 'пропущено'), ('retries', 'повторов'), ('failed', 'с ошибками')):
+                if self.counters[name]:
+                    text += ', {} {}'.format(title, self.counters[name])
+        slowest = sorted(self.phases.items(), key=lambda item: item[1], reverse=True)[:3]
+        if slowest:
+            text += '; ' + ', '.join('{} {:.2f}'.format(PHASES.get(name, name), value) for name, value in slowest)
+        return text
+
+    def save(self, path: str):
+        write_data(path, json.dumps(self.as_dict(), ensure_ascii=False, indent=2))
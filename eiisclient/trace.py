@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Трассировка обработки файлов
+
+Замена отладочных сообщений `logger.debug('...'.format(...))` на горячих путях (формирование задач, потоки
+обработки, постановка задач): сообщение форматируется, только когда оно действительно выводится в журнал.
+
+    trace = Tracer(logger, capacity=1000, sample=10)
+    trace('worker {}: <{}> файл {} загружен в буфер', worker, task_id, dst)
+
+Событие всегда записывается в кольцевой буфер последних событий (шаблон и аргументы, без форматирования),
+который выгружается в файл при ошибке запуска (`dump`). В журнал событие выводится только при уровне DEBUG,
+с прореживанием `sample`: выводится каждое `sample`-е событие (в буфере остаются все).
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from eiisclient.functions import write_data
+
+RING_SIZE = 2000  # событий в кольцевом буфере
+
+
+def _format(message: str, args: tuple) -> str:
+    try:
+        return message.format(*args)
+    except Exception:  # ошибка шаблона не должна прерывать обработку
+        return '{} {}'.format(message, args)
+
+
+class Tracer:
+    """Отложенное форматирование, фильтр по уровню журнала, прореживание и кольцевой буфер событий"""
+
+    def __init__(self, logger: logging.Logger, capacity=RING_SIZE, sample=1):
+        """
+        :param capacity: событий в кольцевом буфере; 0 - без буфера
+        :param sample: в журнал выводится каждое `sample`-е событие
+        """
+        self.logger = logger
+        self.sample = max(int(sample or 1), 1)
+        self.ring = deque(maxlen=capacity) if capacity else None
+        self._count = 0
+
+    def __repr__(self):
+        return '<Tracer: {}>'.format(len(self.ring) if self.ring is not None else '-')
+
+    def __call__(self, message: str, *args):
+        if self.ring is not None:
+            self.ring.append((time.time(), threading.current_thread().name, message, args))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._count += 1
+            if self._count >= self.sample:
+                self._count = 0
+                self.logger.debug(_format(message, args))
+
+    @property
+    def enabled(self) -> bool:
+        """События выводятся в журнал"""
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def lines(self) -> list:
+        """События кольцевого буфера, от старых к новым"""
+        result = []
+        for stamp, thread, message, args in list(self.ring or ()):
+            result.append('{}.{:03d} [{}] {}'.format(time.strftime('%H:%M:%S', time.localtime(stamp)),
+                                                     int(stamp * 1000) % 1000, thread, _format(message, args)))
+        return result
+
+    def dump(self, path: str) -> int:
+        """
+        Выгрузка кольцевого буфера в файл
+
+        :return: количество выгруженных событий
+        """
+        lines = self.lines()
+        if lines:
+            write_data(path, '\n'.join(lines) + '\n')
+        return len(lines)
+
+    def clear(self):
+        if self.ring is not None:
+            self.ring.clear()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Удаление пакетов через корзину
+
+Удаляемая папка пакета переименовывается в `<пакет>.<метка времени>.removed` в той же папке установки -
+это мгновенно и не зависит от количества файлов. Так же называются прежние версии пакетов после установки
+(см. `eiisclient.install`). Содержимое таких папок удаляет фоновый поток (`functions.rmtree`: защита от записи
+снимается со всего дерева за один проход, без пауз на каждом файле). Папки, которые не удалось удалить,
+и оставшиеся после перезапуска программы, удаляются при следующем запуске очистки.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eiisclient.functions import rmtree
+from eiisclient.install import REMOVED_SUFFIX
+
+PURGE_THREADS = 2
+
+
+def get_stdout_logger() -> logging.Logger:
+    return logging.Logger(__name__)
+
+
+class Trash:
+    """Корзина удаляемых папок пакетов с фоновой очисткой"""
+
+    def __init__(self, roots, logger=None, workers=PURGE_THREADS):
+        """
+        :param roots: папки установки, в которых ищутся папки на удаление, или функция, возвращающая их; функция
+        вызывается при каждом поиске - путь установки может быть изменен в настройках во время работы
+        """
+        self._roots = roots
+        self.workers = max(workers, 1)  # папок, удаляемых одновременно
+        self.logger = logger or get_stdout_logger()
+        self.lock = threading.RLock()  # переименования папок установки (см. `Installer.swap`)
+        self.purged = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None  # type: threading.Thread
+        self._start_lock = threading.Lock()
+
+    def __repr__(self):
+        return '<Trash: {}>'.format(self.roots)
+
+    @property
+    def roots(self) -> list:
+        return list(self._roots() if callable(self._roots) else self._roots)
+
+    def move(self, path: str) -> str:
+        """
+        Перенос папки в корзину
+
+        :return: путь к папке в корзине
+        """
+        target = '{}.{}{}'.format(path, int(time.time() * 1000), REMOVED_SUFFIX)
+        with self.lock:
+            os.rename(path, target)
+        self.logger.debug('trash: {} -> {}'.format(path, target))
+        self.wake()
+        return target
+
+    def pending(self) -> list:
+        """Папки в корзине"""
+        result = []
+        with self.lock:
+            for root in self.roots:
+                try:
+                    entries = list(os.scandir(root))
+                except FileNotFoundError:
+                    continue
+                result.extend(entry.path for entry in entries
+                              if entry.name.endswith(REMOVED_SUFFIX) and entry.is_dir(follow_symlinks=False))
+        return sorted(result)
+
+    def purge(self) -> int:
+        """Удаление папок из корзины (параллельно по папкам); возвращает количество удаленных папок"""
+        pending = self.pending()
+        if not pending:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+            count = sum(pool.map(self._purge_one, pending))
+        self.purged += count
+        return count
+
+    def _purge_one(self, path: str) -> int:
+        if self._stop.is_set():
+            return 0
+        try:
+            rmtree(path)
+        except Exception as err:
+            self.logger.debug('trash: ошибка удаления {}: {}'.format(path, err))
+            return 0
+        self.logger.debug('trash: удалена {}'.format(path))
+        return 1
+
+    def start(self):
+        """Запуск фоновой очистки корзины"""
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='trash-purger', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            self.purge()
+            self._wake.wait()
+
+    def wake(self):
+        """Запуск очистки корзины в фоновом потоке; поток запускается при первом обращении, после `stop` - нет"""
+        if not self._stop.is_set():
+            self.start()
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        """Остановка очистки; удаляемая папка удаляется до конца"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
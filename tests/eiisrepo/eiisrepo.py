@@ -10,18 +10,21 @@
 рабочих местах с локальным доступом или по SMB.
 """
 
-import glob
+import getpass
 import gzip
 import hashlib
 import json
 import logging
 import os
+import shutil
 import sys
 import time
 from _socket import gethostbyname, gethostname
 from collections import defaultdict
 from datetime import datetime
 from eiisclient import DEFAULT_ENCODING as DEFAULT_ENCODE
+from eiisclient.delta import (DELTA_DIR, DELTA_MAX_RATIO, DELTA_MIN_SIZE, SYNC_BLOCK_SIZE, block_digests, delta_key,
+                              make_delta)
 
 
 def get_null_logger():
@@ -50,7 +53,7 @@ class _Dispatcher(object):
         self.logger = kwargs.get('logger')
         self.encoding = kwargs.get('encoding') or DEFAULT_ENCODE
         self.repo = repo
-        self.pidinfo = '{} {} {}'.format(os.getlogin(), gethostname(), gethostbyname(gethostname()))
+        self.pidinfo = '{} {} {}'.format(getpass.getuser(), gethostname(), gethostbyname(gethostname()))
         self.pidfile = self.joinpath(repo, self.pidfile)
         self.indexfile = self.joinpath(repo, self.indexfile)
         self.hashfilename = '{}.sha1'.format(self.indexfile)
@@ -92,7 +95,7 @@ class _Dispatcher(object):
             gzip_fname += 'gz'
 
         with gzip.open(gzip_fname, mode='wt', compresslevel=self.gzcompression, encoding=self.encoding) as fp:
-            fp.write_data(data)
+            fp.write(data)
 
     def _gzip_read(self, gzip_fname):
         """Чтение данных из gzip архива"""
@@ -160,9 +163,10 @@ class _Dispatcher(object):
     def list_packages(self):
         self.logger.debug('построение списка пакетов подсистем')
 
-        for pkg in glob.glob(r'{}\*'.format(self.repo)):
-            if os.path.isdir(pkg):
-                _, name = os.path.split(pkg)
+        for name in sorted(os.listdir(self.repo)):
+            if name.startswith('__'):  # служебные папки репозитория
+                continue
+            if os.path.isdir(os.path.join(self.repo, name)):
                 yield name
 
     def walkpackage(self, package):
@@ -182,6 +186,14 @@ class _Dispatcher(object):
     def read(self):
         return self._from_json(self._gzip_read(self.indexfile))
 
+    def read_backup(self) -> dict:
+        """Данные прежнего индекса (резервной копии) или пустой словарь"""
+        try:
+            with gzip.open(self.indexfilebkp, mode='rt', encoding=self.encoding) as fp:
+                return self._from_json(fp.read())
+        except (FileNotFoundError, OSError, ValueError):
+            return {}
+
     def write_data(self, data):
         self.logger.debug('запись индекс-файла')
         json_data = self._to_json(data)
@@ -209,7 +221,8 @@ class _Dispatcher(object):
 class Manager(object):
     """Индексирование репозитория ЕИИС "Соцстрах" """
 
-    def __init__(self, repo, excludes=None, aliases=None, logger=None, encoding=None):
+    def __init__(self, repo, excludes=None, aliases=None, logger=None, encoding=None, deltas=False,
+                 delta_min_size=DELTA_MIN_SIZE, blocks=False):
         '''
         :param repo: - полный путь к репозиторию
         :param excludes: - список подсистем исключаемых из индексации
@@ -217,11 +230,17 @@ class Manager(object):
         в случае, если подсистема имеет английское или плохо воспринмаемое название
         :param logger: - объект логгера для логгирование процесса
         :param encoding: - кодировка символов
+        :param deltas: - строить патчи для больших файлов относительно прежней версии
+        :param delta_min_size: - размер файла, начиная с которого строятся патчи и блоки
+        :param blocks: - записывать в индекс контрольные суммы блоков больших файлов для поблочной загрузки
         '''
         self.repo = repo
         self.excludes = excludes or []
         self.aliases = aliases or {}
         self.indexdata = defaultdict(dict)
+        self.deltas = deltas
+        self.delta_min_size = delta_min_size
+        self.blocks = blocks
         self.logger = logger or get_null_logger()
         self.fd = _Dispatcher(repo, logger=self.logger, encoding=encoding)
 
@@ -243,6 +262,7 @@ class Manager(object):
         self.logger.info('репозиторий {} - начинаем индексацию'.format(self.repo))
 
         self.fd.init()
+        previous = self.fd.read_backup().get('packages', {})
 
         for package in self.fd:
             if package in self.excludes:
@@ -254,17 +274,71 @@ class Manager(object):
                 # fdata['alias'] = self.aliases.get(package, None)  # добавление ключа с алиасом
                 files.update(fdata)
             self.indexdata[package]['files'] = files
+            # размеры файлов - для допуска загрузок в очередь клиента по объему данных
+            sizes = {fname: os.path.getsize(self.fd.joinpath(self.repo, package, fname)) for fname in files}
+            self.indexdata[package]['sizes'] = sizes
+            self.indexdata[package]['size'] = sum(sizes.values())
+            if self.blocks:
+                self.indexdata[package]['blocks'] = {
+                    fname: {'size': SYNC_BLOCK_SIZE,
+                            'digests': block_digests(self.fd.joinpath(self.repo, package, fname), SYNC_BLOCK_SIZE)}
+                    for fname, size in sizes.items() if size >= self.delta_min_size}
             self.indexdata[package]['alias'] = self.aliases.get(package, None)
             self.indexdata[package]['phash'] = self.fd._packet_hash_calc(files)
 
             self.logger.info('{} - обработан'.format(package))
 
-        self.fd.write(self.indexdata)
+        data = {'meta': {'stamp': time.time()}, 'packages': self.indexdata}
+        if self.deltas:
+            data['deltas'] = self.make_deltas(previous)
+        self.fd.write_data(data)
         self.fd.write_hash_sum()
         self.fd.clean()
 
         self.logger.info('индексация завершена')
 
+    def make_deltas(self, previous: dict) -> dict:
+        '''
+        Построение патчей больших файлов относительно их прежних версий
+
+        Для построения патча нужна прежняя версия файла, поэтому копии больших файлов текущей версии сохраняются
+        в папке `__deltas__/base` до следующей индексации. Публикуются патчи, которые меньше доли DELTA_MAX_RATIO
+        размера файла. Устаревшие патчи и копии удаляются.
+        :param previous: данные пакетов прежнего индекса
+        :return: словарь патчей для индекса: {ключ прежняя-новая версия: {'path': путь в репозитории, 'size': размер}}
+        '''
+        deltadir = self.fd.joinpath(self.repo, DELTA_DIR)
+        basedir = os.path.join(deltadir, 'base')
+        os.makedirs(basedir, exist_ok=True)
+        deltas, bases = {}, set()
+
+        for package, pdata in self.indexdata.items():
+            for fname, fhash in pdata['files'].items():
+                size = pdata['sizes'][fname]
+                if size < self.delta_min_size:
+                    continue
+                fpath = self.fd.joinpath(self.repo, package, fname)
+                bases.add(fhash)
+                old_hash = previous.get(package, {}).get('files', {}).get(fname)
+                old_base = os.path.join(basedir, old_hash or '')
+                if old_hash and not old_hash == fhash and os.path.isfile(old_base):
+                    key = delta_key(old_hash, fhash)
+                    patch = os.path.join(deltadir, '{}.patch'.format(key))
+                    psize = os.path.getsize(patch) if os.path.isfile(patch) else make_delta(old_base, fpath, patch)
+                    if psize < size * DELTA_MAX_RATIO:
+                        deltas[key] = {'path': os.path.relpath(patch, self.repo), 'size': psize}
+                        self.logger.info('{} - патч {}: {} байт'.format(package, fname, psize))
+                if not os.path.isfile(os.path.join(basedir, fhash)):
+                    shutil.copyfile(fpath, os.path.join(basedir, fhash))
+
+        for fn in os.listdir(deltadir):
+            if fn.endswith('.patch') and fn[:-len('.patch')] not in deltas:
+                os.unlink(os.path.join(deltadir, fn))
+        for fn in os.listdir(basedir):
+            if fn not in bases:
+                os.unlink(os.path.join(basedir, fn))
+        return deltas
+
     def get_index(self) -> dict:
         '''
         Возвращает словарь с данными индекс-файла
@@ -279,6 +353,6 @@ class Manager(object):
             data['Дата изменения'] = datetime.fromtimestamp(os.path.getmtime(self.fd.indexfile)).strftime(
                 '%d-%m-%Y %H:%M:%S')
             data['Контрольная сумма'] = open(self.fd.hashfilename).read()
-            data['Проиндексировано'] = len(self.get_index().keys())
+            data['Проиндексировано'] = len(self.get_index().get('packages', {}))
 
         return data
@@ -0,0 +1,128 @@
+import os
+import unittest
+
+from eiisclient import cli
+from eiisclient.exceptions import NoUpdates, PartialUpdateError, RepoIsBusy
+from eiisclient.structures import PackData, PackList, State
+from tests.utils import ManagerTestCase
+
+
+class VerifyCommandTestCase(ManagerTestCase):
+    files = {'a.exe': b'exe' * 1000, 'dir0/file0.txt': b'text' * 1000, 'dir0/file1.txt': b'other'}
+
+    def setUp(self):
+        super(VerifyCommandTestCase, self).setUp()
+        self.logger = cli.get_logger()
+        self.make_repo({'pack': self.files})
+
+    def install(self, **config):
+        manager = self.get_manager(**config)
+        manager.check_updates(cli.ConsoleProgress())
+        manager.pack_list['pack'].checked = True
+        manager.start_update(cli.ConsoleProgress())
+        return manager
+
+    def damage(self):
+        pack = os.path.join(self.eiis, 'pack')
+        with open(os.path.join(pack, 'dir0', 'file0.txt'), 'r+b') as fp:  # изменение на месте
+            fp.write(b'edited')
+        os.remove(os.path.join(pack, 'a.exe'))
+        with open(os.path.join(pack, 'user.ini'), 'w') as fp:
+            fp.write('user')
+
+    def check_repair(self, **config):
+        manager = self.install(**config)
+        self.assertEqual(cli.verify(manager, cli.get_args(['verify']), self.logger), cli.EXIT_OK)
+        self.damage()
+
+        output = {}
+        self.assertEqual(cli.verify(manager, cli.get_args(['verify', '-p', 'pack']), self.logger, output),
+                         cli.EXIT_DIFF)
+        self.assertEqual(output['packages'], {'pack': {'missing': ['a.exe'], 'modified': ['dir0/file0.txt'],
+                                                       'extra': ['user.ini']}})
+        self.assertEqual(cli.verify(manager, cli.get_args(['verify', '--repair']), self.logger), cli.EXIT_OK)
+        self.assertEqual(manager.verify(), {'pack': {'missing': [], 'modified': [], 'extra': ['user.ini']}})
+        for rel, data in self.files.items():
+            with open(os.path.join(self.eiis, 'pack', rel), 'rb') as fp:
+                self.assertEqual(fp.read(), data)
+
+    def test_repair(self):
+        self.check_repair()
+
+    def test_repair_with_store(self):
+        self.check_repair(store=True)
+
+
+class UpdateManager:
+    def __init__(self, check_error=None, update_error=None):
+        self.check_error = check_error
+        self.update_error = update_error
+        self.pack_list = PackList()
+        self.pack_list['pack'] = PackData(origin='pack', installed=True, checked=True, status=State.UPD)
+        self.pack_list['new'] = PackData(origin='new', installed=False, checked=False, status=State.NEW)
+        self.last_run = None
+        self.updated = False
+
+    def check_updates(self, processBar):
+        if self.check_error:
+            raise self.check_error
+
+    def set_full(self, value=False):
+        pass
+
+    def start_update(self, processBar):
+        self.updated = True
+        if self.update_error:
+            raise self.update_error
+
+
+class UpdateCommandTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = cli.get_logger()
+
+    def test_check(self):
+        output = {}
+        self.assertEqual(cli.check(UpdateManager(), cli.get_args(['check']), self.logger, output), cli.EXIT_DIFF)
+        self.assertEqual(output['packages'], {'pack': 'upd'})
+        self.assertEqual(cli.check(UpdateManager(NoUpdates()), cli.get_args(['check']), self.logger), cli.EXIT_OK)
+        self.assertEqual(cli.check(UpdateManager(RepoIsBusy()), cli.get_args(['check']), self.logger), cli.EXIT_BUSY)
+
+    def test_update_selected(self):
+        manager = UpdateManager(NoUpdates())
+        output = {}
+        args = cli.get_args(['update', '-p', 'new', '-r', 'pack'])
+        self.assertEqual(cli.update(manager, args, self.logger, output), cli.EXIT_OK)
+        self.assertTrue(manager.updated)
+        self.assertEqual(output['packages'], {'new': 'new', 'pack': 'del'})
+
+    def test_update_outcomes(self):
+        manager = UpdateManager(NoUpdates())
+        manager.pack_list['pack'].status = State.NON
+        self.assertEqual(cli.update(manager, cli.get_args(['update']), self.logger), cli.EXIT_OK)
+        self.assertFalse(manager.updated)  # обновлений нет и пакеты не выбраны
+        manager = UpdateManager(update_error=PartialUpdateError({'pack': [('a.exe', 'IOError')]}))
+        output = {}
+        self.assertEqual(cli.update(manager, cli.get_args(['update']), self.logger, output), cli.EXIT_PARTIAL)
+        self.assertEqual(output['failures'], {'pack': ['a.exe']})
+        manager = UpdateManager(update_error=RepoIsBusy())
+        self.assertEqual(cli.update(manager, cli.get_args(['update']), self.logger), cli.EXIT_BUSY)
+        with self.assertRaises(ValueError):
+            cli.update(UpdateManager(), cli.get_args(['update', '-p', 'unknown']), self.logger)
+
+    def test_progress(self):
+        percents = []
+        progress = cli.ConsoleProgress(percents.append, step=25)
+        progress.SetRange(200)
+        for value in (0, 10, 60, 120, 150, 200, 0):
+            progress.SetValue(value)
+        self.assertEqual(percents, [0, 30, 60, 100, 0])
+
+
+class HistoryCommandTestCase(ManagerTestCase):
+    def test_history_disabled(self):
+        manager = self.get_manager(history=False)
+        self.assertEqual(cli.history(manager, cli.get_args(['history']), cli.get_logger()), cli.EXIT_ERROR)
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
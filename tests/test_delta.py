@@ -0,0 +1,67 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.delta import DeltaError, apply_delta, block_digests, make_delta, missing_ranges, plan_blocks, \
+    sync_blocks
+
+
+class DeltaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='delta_')
+        self.old = os.path.join(self.tmp.name, 'old.dbf')
+        self.new = os.path.join(self.tmp.name, 'new.dbf')
+        self.patch = os.path.join(self.tmp.name, 'patch')
+        self.result = os.path.join(self.tmp.name, 'result.dbf')
+        data = bytearray(os.urandom(1024 * 1024))
+        with open(self.old, 'wb') as fp:
+            fp.write(data)
+        data[5000:5010] = b'0123456789'
+        data += b'appended records'
+        with open(self.new, 'wb') as fp:
+            fp.write(data)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _read(self, path):
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def test_roundtrip(self):
+        size = make_delta(self.old, self.new, self.patch, block_size=4096)
+        self.assertLess(size, 16 * 1024)
+        apply_delta(self.old, self.patch, self.result)
+        self.assertEqual(self._read(self.result), self._read(self.new))
+
+    def test_corrupted_patch(self):
+        with open(self.patch, 'wb') as fp:
+            fp.write(b'not a patch')
+        with self.assertRaises(DeltaError):
+            apply_delta(self.old, self.patch, self.result)
+
+    def test_sync_blocks_fetches_missing_ranges(self):
+        ranges = []
+        new = self._read(self.new)
+
+        def fetch(offset, length):
+            ranges.append((offset, length))
+            return new[offset:offset + length]
+
+        fetched = sync_blocks(self.old, self.result, len(new), 4096, block_digests(self.new, 4096), fetch)
+        self.assertEqual(self._read(self.result), new)
+        self.assertEqual(ranges, [(4096, 4096), (1024 * 1024, 16)])
+        self.assertEqual(fetched, 4096 + 16)
+
+        with self.assertRaises(DeltaError):
+            sync_blocks(self.old, self.result, len(new), 4096, ['0' * 16] * 10, fetch)
+
+    def test_plan_blocks(self):
+        plan = plan_blocks(self.old, block_digests(self.new, 4096), 4096)
+        self.assertEqual(len(plan), 257)
+        self.assertEqual([i for i, offset in enumerate(plan) if offset is None], [1, 256])
+        self.assertEqual(list(missing_ranges(plan, 4096, 1024 * 1024 + 16)), [(4096, 4096), (1024 * 1024, 16)])
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
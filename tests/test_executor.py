@@ -0,0 +1,193 @@
+import logging
+import os
+import unittest
+from queue import Queue
+from tempfile import TemporaryDirectory
+
+from eiisclient.delta import block_digests, make_delta
+from eiisclient.dispatch import FileDispatcher
+from eiisclient.exceptions import HashMismatchError
+from eiisclient.executor import RETRIES, RETRY_BACKOFF, ByteBudget, TaskExecutor
+from eiisclient.functions import file_hash_calc
+from eiisclient.structures import State, Task
+from eiisclient.timeline import Timeline
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+class ExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger(__name__)
+        self.tmp = TemporaryDirectory(prefix='executor_')
+        self.repo = os.path.join(self.tmp.name, 'repo')
+        self.buffer = os.path.join(self.tmp.name, 'buffer')
+        self.eiis = os.path.join(self.tmp.name, 'eiis')
+        for i in range(10):
+            _write(os.path.join(self.repo, 'pack', 'file{}'.format(i)), os.urandom(1024 * (i + 1)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _executor(self, threads=2, **kwargs):
+        dispatchers = [FileDispatcher(self.repo, logger=self.logger) for _ in range(threads)]
+        return TaskExecutor(dispatchers, logger=self.logger, exc_queue=Queue(), size_queue=Queue(), **kwargs)
+
+    def _task(self, name, action=State.NEW, hash=None):
+        src = os.path.join(self.repo, 'pack', name)
+        return Task('pack', action, src, os.path.join(self.buffer, 'pack', name), hash or file_hash_calc(src),
+                    os.path.getsize(src))
+
+    def _run(self, executor, tasks):
+        executor.start()
+        try:
+            for task in tasks:
+                while not executor.submit(task, timeout=0.1):
+                    pass
+            while not executor.join(timeout=0.1):
+                if executor.stopper.is_set():
+                    break
+        finally:
+            executor.shutdown()
+
+    def test_download_and_verify(self):
+        executor = self._executor(maxsize=3, budget=8192, large_size=4096, hash_process_min_size=4096)
+        tasks = [self._task('file{}'.format(i)) for i in range(10)]
+        self._run(executor, tasks)
+        self.assertTrue(executor.exc_queue.empty())
+        for task in tasks:
+            self.assertEqual(file_hash_calc(task.dst), task.hash)
+        stats = executor.stats()
+        self.assertEqual(sorted(stats), ['hash', 'net'])
+        self.assertEqual(stats['net']['done'], 10)
+        self.assertEqual(stats['hash']['done'], 20)  # поиск в буфере + проверка
+
+    def test_buffer_hit_skips_download(self):
+        task = self._task('file1')
+        _write(task.dst, open(task.src, 'rb').read())
+        executor = self._executor()
+        self._run(executor, [task])
+        self.assertEqual(executor.stats()['net']['done'], 0)
+        self.assertEqual(executor.size_queue.get_nowait(), os.path.getsize(task.dst))
+
+    def test_none_settings_use_defaults(self):
+        executor = self._executor(retries=None, backoff=None, hash_process_min_size=None)
+        self.assertEqual(executor.retries, RETRIES)
+        self.assertEqual(executor.backoff, RETRY_BACKOFF)
+        self.assertEqual(self._executor(retries=0).retries, 0)
+
+    def test_hash_mismatch_deferred(self):
+        executor = self._executor()
+        self._run(executor, [self._task('file1', hash='0' * 40), self._task('file2')])
+        self.assertFalse(executor.stopper.is_set())
+        self.assertTrue(executor.exc_queue.empty())
+        deferred = executor.take_deferred()
+        self.assertEqual(len(deferred), 1)
+        task, err = deferred[0]
+        self.assertTrue(task.src.endswith('file1'))
+        self.assertIsInstance(err, HashMismatchError)
+        self.assertEqual(executor.stats()['net']['done'], executor.max_repeat + 1)
+        self.assertEqual(executor.take_deferred(), [])
+
+    def test_timeline(self):
+        timeline = Timeline()
+        executor = self._executor(timeline=timeline)
+        self._run(executor, [self._task('file{}'.format(i)) for i in range(3)])
+        events = timeline.trace_events()
+        threads = {event['args']['name'] for event in events if event['ph'] == 'M'}
+        self.assertEqual(len([name for name in threads if name.startswith('NET')]), 2)
+        names = [event['name'] for event in events if event['ph'] == 'X']
+        self.assertEqual(names.count('transfer'), 3)
+        self.assertEqual(names.count('connect'), 2)
+        self.assertEqual(names.count('verify'), 3)
+        self.assertEqual(len([event for event in events if event['ph'] in 'be']), 6)
+
+    def test_patch_applied_in_hash_lane(self):
+        data = bytearray(os.urandom(256 * 1024))
+        installed = os.path.join(self.eiis, 'pack', 'base.dbf')
+        _write(installed, bytes(data))
+        data[1000:1010] = b'0123456789'
+        _write(os.path.join(self.repo, 'pack', 'base.dbf'), bytes(data))
+        patch = os.path.join(self.repo, 'pack.patch')
+        patch_size = make_delta(installed, os.path.join(self.repo, 'pack', 'base.dbf'), patch, block_size=4096)
+        task = self._task('base.dbf')._replace(patch=(patch, installed))
+        timeline = Timeline()
+        executor = self._executor(timeline=timeline)
+        self._run(executor, [task])
+        self.assertEqual(file_hash_calc(task.dst), task.hash)
+        stats = executor.stats()
+        self.assertEqual(stats['net']['bytes'], patch_size)  # по сети передан только патч
+        self.assertEqual(sum(connection.bytes for connection in executor.connections()), patch_size)
+        self.assertEqual(stats['hash']['done'], 3)  # поиск в буфере + сборка + проверка
+        assemble = [event for event in timeline.trace_events() if event.get('name') == 'assemble']
+        self.assertEqual(len(assemble), 1)
+
+    def test_broken_patch_falls_back_to_full_download(self):
+        installed = os.path.join(self.eiis, 'pack', 'file1')
+        _write(installed, b'installed')
+        patch = os.path.join(self.repo, 'pack.patch')
+        _write(patch, b'not a patch')
+        task = self._task('file1')._replace(patch=(patch, installed))
+        executor = self._executor()
+        self._run(executor, [task])
+        self.assertEqual(file_hash_calc(task.dst), task.hash)
+        self.assertEqual(executor.stats()['net']['bytes'], len(b'not a patch') + task.size)
+        self.assertEqual(executor.take_deferred(), [])
+
+    def test_blocks_fetch_only_missing_ranges(self):
+        data = bytearray(os.urandom(64 * 1024))
+        installed = os.path.join(self.eiis, 'pack', 'base.dbf')
+        _write(installed, bytes(data))
+        data[5000:5010] = b'0123456789'
+        src = os.path.join(self.repo, 'pack', 'base.dbf')
+        _write(src, bytes(data))
+        task = self._task('base.dbf')._replace(blocks=(installed, 4096, block_digests(src, 4096)))
+        executor = self._executor()
+        self._run(executor, [task])
+        self.assertEqual(file_hash_calc(task.dst), task.hash)
+        stats = executor.stats()
+        self.assertEqual(stats['net']['bytes'], 4096)  # загружен один измененный блок
+        self.assertEqual(sum(connection.bytes for connection in executor.connections()), 4096)
+        self.assertEqual(stats['hash']['done'], 4)  # поиск в буфере + план + сборка + проверка
+
+    def test_blocks_fall_back_to_full_download(self):
+        installed = os.path.join(self.eiis, 'pack', 'file3')
+        _write(installed, os.urandom(4096))  # ни одного совпадающего блока
+        src = os.path.join(self.repo, 'pack', 'file3')
+        task = self._task('file3')._replace(blocks=(installed, 1024, block_digests(src, 1024)))
+        executor = self._executor()
+        self._run(executor, [task])
+        self.assertEqual(file_hash_calc(task.dst), task.hash)
+        self.assertEqual(executor.stats()['net']['bytes'], task.size)
+
+
+class ByteBudgetTestCase(unittest.TestCase):
+    def test_small_files_flow_while_large_stream(self):
+        budget = ByteBudget(budget=100, large_size=20, max_large=2)
+        for size in (50, 25):  # большие файлы занимают бюджет за вычетом резерва
+            self.assertTrue(budget.fits(size))
+            budget.take(size)
+        self.assertFalse(budget.fits(20))  # лимит количества больших файлов
+        self.assertTrue(budget.fits(10))  # мелкие файлы идут в резерве
+        budget.take(10)
+        budget.take(10)
+        self.assertTrue(budget.fits(5))
+        budget.take(5)
+        self.assertFalse(budget.fits(5))  # резерв исчерпан
+        budget.give(50)
+        self.assertTrue(budget.fits(5))
+        self.assertTrue(budget.fits(40))
+
+    def test_oversized_task_admitted_alone(self):
+        budget = ByteBudget(budget=100, large_size=20, max_large=2)
+        self.assertTrue(budget.fits(500))
+        budget.take(500)
+        self.assertFalse(budget.fits(30))
+        self.assertTrue(budget.fits(10))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.filecache import FileStateCache
+
+
+class FileStateCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='filecache_')
+        self.path = os.path.join(self.tmp.name, 'filestate.json')
+        self.file = os.path.join(self.tmp.name, 'file.bin')
+        with open(self.file, 'wb') as fp:
+            fp.write(b'data')
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def hasher(self, path):
+        self.calls.append(path)
+        return 'digest-{}'.format(len(self.calls))
+
+    def test_digest_cached_and_persisted(self):
+        cache = FileStateCache(self.path)
+        self.assertEqual(cache.digest(self.file, self.hasher), 'digest-1')
+        self.assertEqual(cache.digest(self.file, self.hasher), 'digest-1')
+        cache.save()
+
+        cache = FileStateCache(self.path)
+        self.assertEqual(cache.digest(self.file, self.hasher), 'digest-1')
+        self.assertEqual(len(self.calls), 1)
+
+    def test_invalidated_on_change(self):
+        cache = FileStateCache(self.path)
+        cache.digest(self.file, self.hasher)
+        with open(self.file, 'ab') as fp:
+            fp.write(b'more')
+        self.assertIsNone(cache.get(self.file))
+        self.assertEqual(cache.digest(self.file, self.hasher), 'digest-2')
+
+    def test_transfer_on_rename(self):
+        cache = FileStateCache(self.path)
+        cache.digest(self.file, self.hasher)
+        moved = os.path.join(self.tmp.name, 'moved.bin')
+        os.rename(self.file, moved)
+        cache.transfer(self.file, moved)
+        self.assertEqual(cache.get(moved), 'digest-1')
+        self.assertIsNone(cache.get(self.file))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
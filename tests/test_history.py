@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+
+from eiisclient.history import RunHistory
+from eiisclient.timing import RunReport
+
+
+def make_report(kind='update', result='ok', elapsed=10.0, packages=None, started=None):
+    report = RunReport(kind)
+    report.finish(result)
+    report.elapsed = elapsed
+    if started is not None:
+        report.started = started
+    report.phases['transfer'] = elapsed / 2
+    report.count('files', 2)
+    report.count('bytes', 4096)
+    report.packages = packages or {}
+    return report
+
+
+class RunHistoryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.history = RunHistory(os.path.join(self.tmp.name, 'history.sqlite'), limit=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_and_prune(self):
+        for elapsed in (1.0, 2.0, 3.0, 4.0):
+            self.history.add(make_report(elapsed=elapsed, packages={'pack': {'files': 1, 'bytes': 10,
+                                                                             'transfer': elapsed}}),
+                             repo='\\\\server\\eiis', dispatcher='smb', threads=4)
+        runs = self.history.runs()
+        self.assertEqual([run['elapsed'] for run in runs], [4.0, 3.0, 2.0])  # хранятся последние limit
+        self.assertEqual(runs[0]['phases'], {'transfer': 2.0})
+        self.assertEqual(runs[0]['threads'], 4)
+        self.assertEqual(self.history.top_packages()[0]['runs'], 3)  # загрузка по пакетам удалена вместе с запуском
+
+    def test_trend(self):
+        self.history.limit = 10
+        self.history.add(make_report(elapsed=10.0), repo='a', dispatcher='ftp')
+        self.history.add(make_report(elapsed=30.0), repo='a', dispatcher='ftp')
+        self.history.add(make_report(elapsed=50.0, result='OSError: нет связи'), repo='a', dispatcher='ftp')
+        self.history.add(make_report(elapsed=5.0), repo='b', dispatcher='file')
+        self.history.add(make_report(elapsed=99.0, started=time.time() - 40 * 24 * 3600), repo='b', dispatcher='file')
+        trend = self.history.trend(days=30)
+        self.assertEqual([(row['repo'], row['runs'], row['median']) for row in trend], [('a', 2, 20.0), ('b', 1, 5.0)])
+        self.assertEqual(len(self.history.runs(days=0)), 5)
+        self.assertEqual(len(self.history.runs(days=30)), 4)
+        self.assertEqual(self.history.runs(kind='check'), [])
+
+    def test_top_packages(self):
+        self.history.add(make_report(packages={'big': {'files': 3, 'bytes': 3000, 'transfer': 3.0},
+                                               'small': {'files': 1, 'bytes': 100, 'transfer': 1.0}}))
+        top = self.history.top_packages(limit=1)
+        self.assertEqual(len(top), 1)
+        self.assertEqual(top[0]['package'], 'big')
+        self.assertAlmostEqual(top[0]['share'], 0.75)
+        self.history.clear()
+        self.assertEqual(self.history.top_packages(), [])
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,73 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from eiisclient.install import Installer, REMOVED_SUFFIX, STAGING_SUFFIX
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as fp:
+        fp.write(data)
+
+
+def _read(path):
+    with open(path) as fp:
+        return fp.read()
+
+
+class InstallerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='install_')
+        self.buffer = os.path.join(self.tmp.name, 'buffer', 'pack')
+        self.live = os.path.join(self.tmp.name, 'eiis', 'pack')
+        self.installer = Installer()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_new_package_renamed(self):
+        _write(os.path.join(self.buffer, 'a.exe'), 'new')
+        self.assertIsNone(self.installer.install(self.buffer, self.live))
+        self.assertEqual(_read(os.path.join(self.live, 'a.exe')), 'new')
+        self.assertFalse(os.path.exists(self.buffer))
+
+    def test_update_staged_and_swapped(self):
+        _write(os.path.join(self.live, 'a.exe'), 'old')
+        _write(os.path.join(self.live, 'keep.dbf'), 'keep')
+        _write(os.path.join(self.live, 'obsolete.txt'), 'old')
+        _write(os.path.join(self.buffer, 'a.exe'), 'new')
+        _write(os.path.join(self.buffer, 'sub', 'b.ini'), 'new')
+
+        old = self.installer.install(self.buffer, self.live, deleted={'obsolete.txt'})
+        self.assertTrue(old.endswith(REMOVED_SUFFIX))
+        self.assertEqual(_read(os.path.join(self.live, 'a.exe')), 'new')
+        self.assertEqual(_read(os.path.join(self.live, 'sub', 'b.ini')), 'new')
+        self.assertEqual(_read(os.path.join(self.live, 'keep.dbf')), 'keep')
+        self.assertFalse(os.path.exists(os.path.join(self.live, 'obsolete.txt')))
+        self.assertEqual(_read(os.path.join(old, 'a.exe')), 'old')
+        self.assertFalse(os.path.exists(self.live + STAGING_SUFFIX))
+        self.assertFalse(os.path.exists(self.buffer))
+
+    def test_rollback_on_swap_error(self):
+        _write(os.path.join(self.live, 'a.exe'), 'old')
+        _write(os.path.join(self.buffer, 'a.exe'), 'new')
+        rename = os.rename
+
+        def failing_rename(src, dst):
+            if src.endswith(STAGING_SUFFIX):
+                raise PermissionError(dst)
+            return rename(src, dst)
+
+        with mock.patch('eiisclient.install.os.rename', failing_rename):
+            with self.assertRaises(PermissionError):
+                self.installer.install(self.buffer, self.live)
+
+        self.assertEqual(_read(os.path.join(self.live, 'a.exe')), 'old')
+        self.assertEqual(_read(os.path.join(self.buffer, 'a.exe')), 'new')  # буфер сохранен для повтора
+        self.assertEqual(os.listdir(os.path.dirname(self.live)), ['pack'])
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
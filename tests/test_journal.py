@@ -0,0 +1,94 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.journal import UpdateJournal
+from eiisclient.structures import State, Task
+
+
+class JournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='journal_')
+        self.path = os.path.join(self.tmp.name, 'update.journal')
+        self.dst = os.path.join(self.tmp.name, 'buffer', 'file')
+        os.makedirs(os.path.dirname(self.dst))
+        with open(self.dst, 'wb') as fp:
+            fp.write(b'data')
+        self.task = Task('pack', State.NEW, 'pack/file', self.dst, 'hash', 4)
+        self.index = {'packages': {'pack': {'files': {'file': 'hash'}}}}
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resume_state(self):
+        journal = UpdateJournal(self.path)
+        self.assertFalse(journal.pending)
+        journal.start('index-hash', self.index, [('Пакет', 'pack')], [self.task])
+        journal.file_done(self.task)
+        journal.package_done('pack')
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        self.assertTrue(journal.pending)
+        self.assertEqual(journal.index_hash, 'index-hash')
+        self.assertEqual(journal.tasks(), [self.task])
+        self.assertDictEqual(journal.index(), self.index)
+        self.assertTrue(journal.file_completed(self.task))
+        self.assertIn('pack', journal.packages)
+
+        # файл изменен после проверки
+        with open(self.dst, 'ab') as fp:
+            fp.write(b'more')
+        self.assertFalse(journal.file_completed(self.task))
+
+    def test_truncated_record_ignored(self):
+        journal = UpdateJournal(self.path)
+        journal.start('index-hash', self.index, [], [self.task])
+        journal.close()
+        with open(self.path, 'a') as fp:
+            fp.write('{"op": "file", "pa')
+        journal = UpdateJournal(self.path)
+        self.assertTrue(journal.pending)
+        self.assertFalse(journal.file_completed(self.task))
+
+    def test_append_after_truncated_record(self):
+        journal = UpdateJournal(self.path)
+        journal.start('index-hash', self.index, [('Пакет', 'pack')], [self.task])
+        journal.close()
+        with open(self.path, 'a') as fp:  # обрыв записи
+            fp.write('{"op": "file", "pa')
+
+        journal = UpdateJournal(self.path)  # продолжение обновления дописывает журнал
+        journal.file_done(self.task)
+        journal.package_done('pack')
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        self.assertTrue(journal.file_completed(self.task))
+        self.assertEqual(journal.packages, {'pack'})
+
+    def test_unreadable_line_skipped(self):
+        journal = UpdateJournal(self.path)
+        journal.start('index-hash', self.index, [], [self.task])
+        journal.close()
+        with open(self.path, 'a') as fp:
+            fp.write('{"op": "file", "pa{"op": "package", "name": "other"}\n')
+        journal = UpdateJournal(self.path)
+        journal.package_done('pack')
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        self.assertTrue(journal.pending)
+        self.assertEqual(journal.packages, {'pack'})
+
+    def test_commit_removes_journal(self):
+        journal = UpdateJournal(self.path)
+        journal.start('index-hash', self.index, [], [self.task])
+        journal.commit()
+        self.assertFalse(journal.pending)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(os.path.exists(journal.index_path))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.listing import DirListing
+from eiisclient.structures import PackData, PackList, State
+
+
+class DirListingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='listing_')
+        for name in ('pack1', 'pack2', 'pack3.staging', 'pack4.1.removed'):
+            os.makedirs(os.path.join(self.tmp.name, name))
+        with open(os.path.join(self.tmp.name, 'file.txt'), 'w') as fp:
+            fp.write('data')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scanned_once(self):
+        listing = DirListing(self.tmp.name)
+        self.assertEqual(listing.names(), {'pack1', 'pack2'})
+        os.makedirs(os.path.join(self.tmp.name, 'pack5'))
+        self.assertNotIn('pack5', listing)
+        self.assertTrue(listing.add('pack5'))
+        self.assertFalse(listing.add('pack5'))
+        self.assertTrue(listing.discard('pack1'))
+        self.assertEqual(listing.names(), {'pack2', 'pack5'})
+        listing.invalidate()
+        self.assertEqual(listing.names(), {'pack1', 'pack2', 'pack5'})
+
+    def test_missing_dir(self):
+        listing = DirListing(os.path.join(self.tmp.name, 'none'))
+        self.assertEqual(len(listing), 0)
+
+
+class PackListDiffTestCase(unittest.TestCase):
+    def test_diff(self):
+        old, new = PackList(), PackList()
+        old['a'] = PackData(origin='a', installed=True, checked=True, status=State.NON)
+        old['b'] = PackData(origin='b', installed=True, checked=True, status=State.NON)
+        old['c'] = PackData(origin='c', installed=False, checked=False, status=State.NEW)
+        new['a'] = PackData(origin='a', installed=True, checked=True, status=State.NON)
+        new['b'] = PackData(origin='b', installed=True, checked=True, status=State.UPD)
+        new['d'] = PackData(origin='d', installed=False, checked=False, status=State.NEW)
+        self.assertEqual(old.diff(new), {'b', 'c', 'd'})
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,252 @@
+import os
+import threading
+import unittest
+from unittest import mock
+
+import eiisclient.manager
+from eiisclient.cli import ConsoleProgress
+from eiisclient.exceptions import NoUpdates, PartialUpdateError
+from eiisclient.functions import hash_calc, jsonify, read_file, write_data
+from eiisclient.snapshot import index_key, load_snapshot
+from tests.utils import ManagerTestCase
+
+
+def _read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def _write(path, data):
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+
+class PartialCommitTestCase(ManagerTestCase):
+    def setUp(self):
+        super(PartialCommitTestCase, self).setUp()
+        self.make_repo({'a': {'a.exe': b'a1'}, 'b': {'b.exe': b'b1', 'b.dat': b'data'}})
+        self.manager = self.get_manager(retries=0)
+        self.manager.check_updates(ConsoleProgress())
+        for pack in ('a', 'b'):
+            self.manager.pack_list[pack].checked = True
+        self.manager.start_update(ConsoleProgress())
+
+    def test_failed_package_retried(self):
+        manager = self.manager
+        self.make_repo({'a': {'a.exe': b'a2'}, 'b': {'b.exe': b'b2'}})
+        manager.check_updates(ConsoleProgress())
+        _write(os.path.join(self.repo, 'b', 'b.exe'), b'broken')  # файл не соответствует индексу
+
+        with mock.patch.object(manager.logger, 'warning') as warning:
+            with self.assertRaises(PartialUpdateError) as ctx:
+                manager.start_update(ConsoleProgress())
+        self.assertEqual(list(ctx.exception.failures), ['b'])
+        # файлы пакета с ошибкой оставлены в буфере без предупреждения о постороннем пакете
+        self.assertFalse([call for call in warning.call_args_list if 'нет в списке' in call[0][0]])
+        self.assertEqual(_read(os.path.join(self.eiis, 'a', 'a.exe')), b'a2')
+        self.assertEqual(_read(os.path.join(self.eiis, 'b', 'b.exe')), b'b1')
+        self.assertEqual(manager.local_index_packages['a'], manager.remote_index_packages['a'])
+        self.assertNotEqual(manager.local_index_packages['b'], manager.remote_index_packages['b'])
+
+        _write(os.path.join(self.repo, 'b', 'b.exe'), b'b2')
+        manager.check_updates(ConsoleProgress())  # индекс зафиксирован частично - обновления есть
+        self.assertEqual([pack for pack, _ in manager._action_list()['update']], ['b'])
+        manager.start_update(ConsoleProgress())
+        self.assertEqual(_read(os.path.join(self.eiis, 'b', 'b.exe')), b'b2')
+        self.assertEqual(manager.local_index_hash, manager.remote_index_hash)
+        with self.assertRaises(NoUpdates):
+            manager.check_updates(ConsoleProgress())
+
+
+class ConfigResetTestCase(ManagerTestCase):
+    def test_update_after_config_reset(self):
+        self.make_repo({'pack': {'a.exe': b'a1'}})
+        manager = self.get_manager(store=True)
+        manager.check_updates(ConsoleProgress())
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+
+        # настройки, сохраненные прежней версией окна настроек: только его параметры
+        repopath = manager.config.repopath
+        manager.config.clear()
+        manager.config.update(repopath=repopath, install_to_profile=False, threads=2, ftpencode='CP1251',
+                              links_in_dir=False, repopathlist=[])
+        self.make_repo({'pack': {'a.exe': b'a2'}})
+        manager.check_updates(ConsoleProgress())
+        manager.start_update(ConsoleProgress())
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'a2')
+        self.assertEqual(manager._setting('retries'), eiisclient.manager.RETRIES)
+
+
+class FullUpdateTestCase(ManagerTestCase):
+    def test_installed_files_hashed_in_pool(self):
+        self.make_repo({'pack': {'a.exe': b'a1', 'b.dll': b'b1', 'c.dat': b'c1'}})
+        manager = self.get_manager()
+        manager.check_updates(ConsoleProgress())
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+        _write(os.path.join(self.eiis, 'pack', 'b.dll'), b'broken')
+
+        threads = set()
+        installed_hash = manager._installed_hash
+
+        def hashed(package, file):
+            threads.add(threading.current_thread())
+            return installed_hash(package, file)
+
+        manager.set_full(True)
+        with mock.patch.object(manager, '_installed_hash', side_effect=hashed) as checker:
+            tasks = list(manager.get_task(manager._action_list()['update']))
+        self.assertEqual(checker.call_count, 3)
+        self.assertNotIn(threading.current_thread(), threads)  # не в потоке формирования задач
+        self.assertEqual([os.path.basename(task.src) for task in tasks], ['b.dll'])
+
+        manager.start_update(ConsoleProgress())
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'b.dll')), b'b1')
+
+
+class PrefetchTestCase(ManagerTestCase):
+    def test_prefetch_then_update(self):
+        self.make_repo({'pack': {'a.exe': b'a1', 'lib.dll': b'lib1'}})
+        manager = self.get_manager(prefetch=True)
+        manager.check_updates(ConsoleProgress())
+        self.assertFalse(manager.prefetching)  # новые пакеты не отмечены - загружать нечего
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+
+        self.make_repo({'pack': {'a.exe': b'a2', 'lib.dll': b'lib2'}})
+        manager.check_updates(ConsoleProgress())
+        self.assertIsNotNone(manager._prefetch)  # отмечены обновляемые установленные пакеты
+        manager._prefetch.join(30)
+        self.assertIsNone(manager._prefetch.error)
+        self.assertEqual(manager._prefetch.failures, {})
+        self.assertEqual(manager._prefetch.GetValue(), manager._prefetch.GetRange())
+        buffer = os.path.join(self.work, 'buffer', 'pack')
+        self.assertEqual(_read(os.path.join(buffer, 'a.exe')), b'a2')
+        # фоновая загрузка не устанавливает пакеты и не фиксирует индекс
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'a1')
+        self.assertTrue(manager.repo_updated)
+        self.assertFalse(manager.journal.pending)
+
+        manager.start_update(ConsoleProgress())
+        self.assertIsNone(manager._prefetch)
+        self.assertEqual(manager._lane_stats['net']['done'], 0)  # файлы взяты из буфера без загрузки
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'a2')
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'lib.dll')), b'lib2')
+        self.assertFalse(os.path.isdir(buffer))
+        self.assertFalse(manager.repo_updated)
+
+    def test_update_stops_prefetch(self):
+        self.make_repo({'pack': {'a.exe': b'a1'}})
+        manager = self.get_manager()
+        manager.check_updates(ConsoleProgress())
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+        self.make_repo({'pack': {'a.exe': b'a2'}})
+        manager.check_updates(ConsoleProgress())
+        self.assertIsNone(manager._prefetch)  # фоновая загрузка выключена в настройках
+        self.assertTrue(manager.start_prefetch())
+        manager.start_update(ConsoleProgress())  # останавливает загрузку и догружает недостающее
+        self.assertIsNone(manager._prefetch)
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'a2')
+
+
+class NotifyTestCase(ManagerTestCase):
+    def setUp(self):
+        super(NotifyTestCase, self).setUp()
+        self.events = []
+        self.make_repo({'pack': {'a.exe': b'a1'}})
+        self.manager = self.get_manager()
+        self.manager.subscribe(self.listener)
+
+    def listener(self, packages, info):
+        self.events.append((packages, info))
+
+    def changed(self) -> set:
+        packages = set()
+        for changed, _ in self.events:
+            packages.update(changed)
+        del self.events[:]
+        return packages
+
+    def test_notifications(self):
+        manager = self.manager
+        manager.check_updates(ConsoleProgress())
+        self.assertIn('pack', self.changed())  # пакет появился в перечне по индексу репозитория
+
+        manager._refresh()  # перечни не изменились - оповещения нет
+        self.assertEqual(self.events, [])
+
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+        self.assertEqual(self.changed(), {'pack'})  # пакет установлен
+
+        self.make_repo({'pack': {'a.exe': b'a2'}, 'other': {'b.exe': b'b1'}})
+        manager.check_updates(ConsoleProgress())
+        self.assertEqual(self.changed(), {'pack', 'other'})  # обновление пакета и новый пакет
+
+        manager.unsubscribe(self.listener)
+        manager.start_update(ConsoleProgress())
+        self.assertEqual(self.events, [])
+
+    def test_listener_error_ignored(self):
+        def broken(packages, info):
+            raise RuntimeError('listener')
+
+        self.manager.subscribe(broken)
+        self.manager.subscribe(broken)  # повторная подписка не дублирует оповещения
+        self.manager.check_updates(ConsoleProgress())
+        self.assertIn('pack', self.changed())
+        self.assertEqual(self.manager._listeners, [self.listener, broken])
+
+
+class SnapshotTestCase(ManagerTestCase):
+    def setUp(self):
+        super(SnapshotTestCase, self).setUp()
+        self.make_repo({'pack': {'a.exe': b'a1'}, 'other': {'b.exe': b'b1'}})
+        manager = self.get_manager()
+        manager.check_updates(ConsoleProgress())
+        for pack in ('pack', 'other'):
+            manager.pack_list[pack].checked = True
+        manager.start_update(ConsoleProgress())
+        self.index = manager.local_index
+
+    def local_index(self):
+        """Локальный индекс нового менеджера и признак чтения файла индекса"""
+        manager = self.get_manager()
+        with mock.patch('eiisclient.manager.read_file', wraps=read_file) as reader:
+            index = manager.local_index
+        paths = [call[0][0] for call in reader.call_args_list]
+        return manager, index, eiisclient.manager.LOCAL_INDEX_FILE in paths
+
+    def key(self):
+        return index_key(eiisclient.manager.LOCAL_INDEX_FILE, eiisclient.manager.LOCAL_INDEX_FILE_HASH)
+
+    def test_index_from_snapshot(self):
+        self.assertIsNotNone(load_snapshot(eiisclient.manager.INDEX_SNAPSHOT_FILE, self.key()))
+        manager, index, read = self.local_index()
+        self.assertFalse(read)  # файл индекса не читается
+        self.assertEqual(index, self.index)
+        self.assertEqual(sorted(manager._local_entries), [('other', 'other'), ('pack', 'pack')])
+        self.assertEqual(sorted(manager.pack_list), ['other', 'pack'])
+
+    def test_stale_snapshot(self):
+        index = dict(self.index, packages={'pack': self.index['packages']['pack']})
+        write_data(eiisclient.manager.LOCAL_INDEX_FILE, jsonify(index))
+        write_data(eiisclient.manager.LOCAL_INDEX_FILE_HASH, hash_calc(index))
+        manager, loaded, read = self.local_index()
+        self.assertTrue(read)  # индекс изменен - снимок не действителен
+        self.assertEqual(sorted(loaded['packages']), ['pack'])
+        self.assertEqual(manager._local_entries, [('pack', 'pack')])
+        self.assertEqual(load_snapshot(eiisclient.manager.INDEX_SNAPSHOT_FILE, self.key())['index'], loaded)
+
+    def test_damaged_snapshot(self):
+        write_data(eiisclient.manager.INDEX_SNAPSHOT_FILE, 'damaged')
+        _, index, read = self.local_index()
+        self.assertTrue(read)
+        self.assertEqual(index, self.index)
+        self.assertIsNotNone(load_snapshot(eiisclient.manager.INDEX_SNAPSHOT_FILE, self.key()))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,74 @@
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from eiisclient.dispatch import BUSYMESSAGE, FileDispatcher
+from eiisclient.netsim import NetProfile, SimulatedDispatcher
+
+
+class SimulatedDispatcherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.tmp.name, 'repo')
+        os.makedirs(self.repo)
+        with open(os.path.join(self.repo, 'file.dat'), 'wb') as fp:
+            fp.write(os.urandom(10000))
+        self.dst = os.path.join(self.tmp.name, 'out', 'file.dat')
+        self.logger = logging.getLogger(__name__)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def disp(self, **params):
+        disp = SimulatedDispatcher(FileDispatcher(self.repo, logger=self.logger), NetProfile.get(params),
+                                   logger=self.logger)
+        disp.up()
+        return disp
+
+    def test_transparent(self):
+        disp = self.disp()
+        self.assertEqual(disp.get_file('file.dat', self.dst), self.dst)
+        self.assertEqual(os.path.getsize(self.dst), 10000)
+        self.assertEqual(len(disp.get_range('file.dat', 9000, 5000)), 1000)
+        self.assertFalse(disp.repo_is_busy())
+
+    def test_bandwidth(self):
+        disp = self.disp(bandwidth=100000)
+        start = time.monotonic()
+        disp.get_file('file.dat', self.dst)
+        disp.get_range('file.dat', 0, 10000)
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_failures(self):
+        with self.assertRaises(IOError):
+            self.disp(fail_rate=1).get_file('file.dat', self.dst)
+        with self.assertRaises(IOError):
+            self.disp(drop_rate=1, seed=3).get_file('file.dat', self.dst)
+        self.assertLess(os.path.getsize(self.dst), 10000)
+
+    def test_seed(self):
+        def run(seed):
+            profile = NetProfile(latency=0.1, jitter=0.05, fail_rate=0.5, seed=seed)
+            return [(profile.chance(0.5), profile.delay()) for _ in range(20)]
+
+        self.assertEqual(run(7), run(7))
+        self.assertNotEqual(run(7), run(8))
+
+    def test_busy_after(self):
+        disp = self.disp(busy_after=0.05)
+        self.assertFalse(disp.repo_is_busy())
+        time.sleep(0.06)
+        self.assertTrue(disp.repo_is_busy())
+        open(os.path.join(self.repo, BUSYMESSAGE), 'w').close()
+        self.assertTrue(self.disp().repo_is_busy())
+
+    def test_profile_name(self):
+        self.assertEqual(NetProfile.get('branch-2mbit').bandwidth, 250000)
+        with self.assertRaises(ValueError):
+            NetProfile.get('unknown')
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.snapshot import index_key, load_snapshot, save_snapshot
+
+
+class SnapshotTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='snapshot_')
+        self.index = os.path.join(self.tmp.name, 'index.json')
+        self.hash = '{}.sha1'.format(self.index)
+        self.path = os.path.join(self.tmp.name, 'index.snapshot')
+        self.write('{"packages": {}}', 'a' * 40)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, index, digest):
+        with open(self.index, 'w') as fp:
+            fp.write(index)
+        with open(self.hash, 'w') as fp:
+            fp.write(digest)
+
+    def test_roundtrip(self):
+        key = index_key(self.index, self.hash)
+        index = {'packages': {'pack': {'files': {'a.txt': 'b' * 40}}}}
+        self.assertTrue(save_snapshot(self.path, key, index, entries=[('pack', 'pack')]))
+        data = load_snapshot(self.path, index_key(self.index, self.hash))
+        self.assertEqual(data['index'], index)
+        self.assertEqual(data['entries'], [('pack', 'pack')])
+
+    def test_stale_key(self):
+        save_snapshot(self.path, index_key(self.index, self.hash), {})
+        self.write('{"packages": {"pack": {}}}', 'c' * 40)
+        self.assertIsNone(load_snapshot(self.path, index_key(self.index, self.hash)))
+
+    def test_missing_or_corrupt(self):
+        key = index_key(self.index, self.hash)
+        self.assertIsNone(load_snapshot(self.path, key))
+        with open(self.path, 'wb') as fp:
+            fp.write(b'garbage')
+        self.assertIsNone(load_snapshot(self.path, key))
+        self.assertIsNone(index_key(os.path.join(self.tmp.name, 'none.json'), self.hash))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+from eiisclient.cli import ConsoleProgress
+from eiisclient.exceptions import PacketInstallError
+from eiisclient.filecache import FileStateCache
+from eiisclient.store import ObjectStore, StoreError
+from tests.utils import ManagerTestCase
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    return hashlib.sha1(data).hexdigest()
+
+
+def _read(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+class ObjectStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='store_')
+        self.store = ObjectStore(os.path.join(self.tmp.name, 'store'), generations=2)
+        self.src = os.path.join(self.tmp.name, 'src')
+        self.live = os.path.join(self.tmp.name, 'eiis', 'pack')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_deduplicates(self):
+        first = _write(os.path.join(self.src, 'a.exe'), b'same')
+        second = _write(os.path.join(self.src, 'b.exe'), b'same')
+        self.store.add(os.path.join(self.src, 'a.exe'), first)
+        self.store.add(os.path.join(self.src, 'b.exe'), second)
+        self.assertEqual(list(self.store.digests()), [first])
+        with self.assertRaises(StoreError):
+            self.store.add(os.path.join(self.src, 'a.exe'), 'bad', verify=True)
+
+    def test_stage_keeps_user_files(self):
+        digest = _write(os.path.join(self.src, 'a.exe'), b'new')
+        self.store.add(os.path.join(self.src, 'a.exe'), digest)
+        _write(os.path.join(self.live, 'a.exe'), b'old')
+        _write(os.path.join(self.live, 'obsolete.dll'), b'old')
+        _write(os.path.join(self.live, 'user.txt'), b'user')
+
+        staging = self.store.stage({'a.exe': digest}, self.live, known={'a.exe': '', 'obsolete.dll': ''})
+        self.assertEqual(sorted(os.listdir(staging)), ['a.exe', 'user.txt'])
+        self.assertEqual(_read(os.path.join(staging, 'a.exe')), b'new')
+
+    def test_damaged_object(self):
+        self.store.cache = FileStateCache(os.path.join(self.tmp.name, 'filestate.json'))
+        digest = _write(os.path.join(self.src, 'a.exe'), b'good')
+        self.store.add(os.path.join(self.src, 'a.exe'), digest)
+        self.store.materialize(digest, os.path.join(self.live, 'a.exe'))
+        with open(os.path.join(self.live, 'a.exe'), 'r+b') as fp:  # изменение установленного файла на месте
+            fp.write(b'b')
+
+        with self.assertRaises(StoreError):
+            self.store.materialize(digest, os.path.join(self.tmp.name, 'other', 'a.exe'))
+        self.assertFalse(self.store.has(digest))
+        _write(os.path.join(self.src, 'b.exe'), b'good')
+        self.store.add(os.path.join(self.src, 'b.exe'), digest, copy=True)
+        self.assertTrue(self.store.check(digest))
+        self.assertEqual(os.stat(os.path.join(self.src, 'b.exe')).st_nlink, 1)
+
+    def test_generations_pruned_and_collected(self):
+        digests = []
+        for n in range(3):
+            digest = _write(os.path.join(self.src, str(n)), str(n).encode())
+            self.store.add(os.path.join(self.src, str(n)), digest)
+            self.store.save_manifest('pack', {'phash': str(n), 'files': {'a.exe': digest}})
+            digests.append(digest)
+
+        generations = self.store.generations_of('pack')
+        self.assertEqual(len(generations), 2)
+        self.assertEqual(self.store.manifest('pack', generations[0])['phash'], '1')
+        self.assertEqual(sorted(self.store.digests()), sorted(digests[1:]))
+
+        self.store.drop('pack')
+        self.assertEqual(list(self.store.digests()), [])
+
+
+class StoreManagerTestCase(ManagerTestCase):
+    def update(self, manager):
+        manager.check_updates(ConsoleProgress())
+        manager.pack_list['pack'].checked = True
+        manager.start_update(ConsoleProgress())
+
+    def test_rollback_after_edit(self):
+        self.make_repo({'pack': {'a.exe': b'first', 'lib.dll': b'shared' * 100}})
+        manager = self.get_manager(store=True)
+        self.update(manager)
+        self.make_repo({'pack': {'a.exe': b'second'}})
+        self.update(manager)
+        lib = os.path.join(self.eiis, 'pack', 'lib.dll')
+        with open(lib, 'r+b') as fp:  # файл не изменялся между версиями - объект общий для обоих поколений
+            fp.write(b'edited')
+
+        with self.assertRaises(PacketInstallError):  # поврежденный объект не возвращается откатом
+            manager.rollback_package('pack')
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'second')
+        self.assertFalse(manager.store.has(hashlib.sha1(b'shared' * 100).hexdigest()))
+
+    def check_local_edit(self, **config):
+        self.make_repo({'pack': {'a.ini': b'setting=1', 'b.exe': b'first'}})
+        manager = self.get_manager(**config)
+        self.update(manager)
+        ini = os.path.join(self.eiis, 'pack', 'a.ini')
+        _write(ini, b'setting=USER')  # файл не изменяется в репозитории
+        self.make_repo({'pack': {'b.exe': b'second'}})
+        self.update(manager)
+        self.assertEqual(_read(ini), b'setting=USER')
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'b.exe')), b'second')
+        return manager
+
+    def test_local_edit_survives_update(self):
+        self.check_local_edit(store=False)
+
+    def test_local_edit_survives_update_with_store(self):
+        manager = self.check_local_edit(store=True)
+        ini = os.path.join(self.eiis, 'pack', 'a.ini')
+        os.remove(ini)  # отсутствующий неизмененный файл размещается из хранилища
+        self.make_repo({'pack': {'b.exe': b'third'}})
+        self.update(manager)
+        self.assertEqual(_read(ini), b'setting=1')
+
+    def test_rollback(self):
+        self.make_repo({'pack': {'a.exe': b'first', 'lib.dll': b'shared'}})
+        manager = self.get_manager(store=True)
+        self.update(manager)
+        self.make_repo({'pack': {'a.exe': b'second'}})
+        self.update(manager)
+        with open(os.path.join(self.eiis, 'pack', 'a.exe'), 'r+b') as fp:  # объект только текущего поколения
+            fp.write(b'x')
+
+        manager.rollback_package('pack')
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'a.exe')), b'first')
+        self.assertEqual(_read(os.path.join(self.eiis, 'pack', 'lib.dll')), b'shared')
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from eiisclient.timing import RunReport
+
+
+class RunReportTestCase(unittest.TestCase):
+    def test_nested_phases(self):
+        report = RunReport('update')
+        with report.phase('transfer'):
+            time.sleep(0.02)
+            with report.phase('index_download'):
+                time.sleep(0.03)
+        report.finish()
+        self.assertGreaterEqual(report.phases['index_download'], 0.03)
+        self.assertLess(report.phases['transfer'], 0.03)
+        self.assertLessEqual(sum(report.phases.values()), report.elapsed)
+
+    def test_other_thread(self):
+        report = RunReport('check')
+
+        def run():
+            with report.phase('transfer'):
+                pass
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertNotIn('transfer', report.phases)
+
+    def test_summary_and_save(self):
+        report = RunReport('update')
+        report.phases['transfer'] = 2.0
+        report.count('files', 10)
+        report.count('bytes', 4 * 1024 ** 2)
+        report.count('retries')
+        report.finish()
+        self.assertEqual(report.throughput, 2 * 1024 ** 2)
+        self.assertIn('повторов 1', report.summary())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'lastrun.json')
+            report.save(path)
+            with open(path, encoding='utf-8') as fp:
+                data = json.load(fp)
+        self.assertEqual((data['result'], data['counters']['files']), ('ok', 10))
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -0,0 +1,67 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from eiisclient.trace import Tracer
+
+
+class Counted:
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted += 1
+        return 'value'
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super(ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TracerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger('test_trace')
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.logger.handlers = [self.handler]
+
+    def test_lazy_when_not_debug(self):
+        self.logger.setLevel(logging.INFO)
+        trace, value = Tracer(self.logger), Counted()
+        for _ in range(10):
+            trace('event {}', value)
+        self.assertEqual(value.formatted, 0)
+        self.assertEqual(self.handler.messages, [])
+        self.assertEqual(len(trace.ring), 10)
+
+    def test_sample(self):
+        self.logger.setLevel(logging.DEBUG)
+        trace = Tracer(self.logger, sample=3)
+        for i in range(9):
+            trace('event {}', i)
+        self.assertEqual(self.handler.messages, ['event 2', 'event 5', 'event 8'])
+
+    def test_ring_dump(self):
+        self.logger.setLevel(logging.INFO)
+        trace = Tracer(self.logger, capacity=3)
+        for i in range(5):
+            trace('event {}', i)
+        trace('broken {} {}', 1)  # ошибка шаблона не прерывает обработку
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'trace.log')
+            self.assertEqual(trace.dump(path), 3)
+            with open(path, encoding='utf-8') as fp:
+                lines = fp.read().splitlines()
+        self.assertTrue(lines[0].endswith('event 3'))
+        self.assertIn('broken', lines[-1])
+        self.assertIsNone(Tracer(self.logger, capacity=0).ring)
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
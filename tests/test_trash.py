@@ -0,0 +1,115 @@
+import gc
+import logging
+import os
+import stat
+import time
+import unittest
+import weakref
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from eiisclient.functions import prepare_tree
+from eiisclient.trash import Trash
+from tests.utils import ManagerTestCase
+
+
+class TrashTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = TemporaryDirectory(prefix='trash_')
+        self.package = os.path.join(self.tmp.name, 'pack')
+        os.makedirs(os.path.join(self.package, 'sub'))
+        for name in ('a.exe', os.path.join('sub', 'b.dbf')):
+            path = os.path.join(self.package, name)
+            with open(path, 'w') as fp:
+                fp.write(name)
+            os.chmod(path, stat.S_IREAD)
+        self.trash = Trash([self.tmp.name])
+
+    def tearDown(self):
+        self.trash.stop()
+        prepare_tree(self.tmp.name)
+        self.tmp.cleanup()
+
+    def test_prepare_tree(self):
+        self.assertEqual(prepare_tree(self.package), 2)
+        self.assertEqual(prepare_tree(self.package), 0)
+
+    def test_purge(self):
+        removed = self.package + '.1.removed'
+        os.rename(self.package, removed)
+        self.assertEqual(self.trash.pending(), [removed])
+
+        self.assertEqual(self.trash.purge(), 1)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_move_starts_purge(self):
+        self.assertIsNone(self.trash._thread)
+        removed = self.trash.move(self.package)
+        self.assertFalse(os.path.exists(self.package))
+        self.assertTrue(removed.endswith('.removed'))
+        deadline = time.time() + 5
+        while os.path.exists(removed) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_background_purge_resumes(self):
+        os.rename(self.package, self.package + '.1.removed')  # осталась после перезапуска
+        self.trash.start()
+        deadline = time.time() + 5
+        while self.trash.pending() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.trash.pending(), [])
+
+    def test_roots_function(self):
+        roots = [os.path.join(self.tmp.name, 'other')]
+        trash = Trash(lambda: roots)
+        removed = self.package + '.1.removed'
+        os.rename(self.package, removed)
+        self.assertEqual(trash.pending(), [])
+        roots.append(self.tmp.name)  # путь установки изменен
+        self.assertEqual(trash.pending(), [removed])
+
+
+class ManagerTrashTestCase(ManagerTestCase):
+    def test_install_path_changed(self):
+        profile = os.path.join(self.tmp.name, 'profile')
+        with mock.patch('eiisclient.manager.PROFILE_INSTALL_PATH', profile):
+            manager = self.get_manager()
+            removed = os.path.join(profile, 'pack.1.removed')
+            os.makedirs(removed)
+            self.assertEqual(manager.trash.pending(), [])
+            manager.config.install_to_profile = True
+            self.assertEqual(manager.trash.pending(), [removed])
+            manager.trash.wake()
+            deadline = time.time() + 5
+            while os.path.exists(removed) and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertFalse(os.path.exists(removed))
+
+    def test_manager_not_pinned(self):
+        from eiisclient.manager import Manager
+
+        self.get_manager()  # файл настроек
+        manager = Manager(logger=logging.getLogger('tests.manager'))
+        trash = manager.trash
+        self.assertIsNone(trash._thread)  # поток очистки не запускается при создании менеджера
+        trash.wake()
+        self.assertTrue(trash._thread.is_alive())
+        ref = weakref.ref(manager)
+        del manager
+        gc.collect()
+        self.assertIsNone(ref())  # поток очистки не удерживает менеджер
+        self.assertFalse(trash._thread.is_alive())  # очистка остановлена при удалении менеджера
+
+    def test_close(self):
+        manager = self.get_manager()
+        manager.trash.wake()
+        manager.close()
+        self.assertFalse(manager.trash._thread.is_alive())
+        manager.trash.wake()  # после завершения работы поток не запускается
+        self.assertFalse(manager.trash._thread.is_alive())
+        manager.close()
+
+
+if __name__ == '__main__':  # pragma: nocover
+    unittest.main()
@@ -1,11 +1,14 @@
+import json
 import logging
 import os
 import string
 
 import random
 import sys
+import unittest
 from os.path import join
 from tempfile import TemporaryDirectory as TempDir
+from unittest import mock
 
 symbols = string.digits + string.ascii_lowercase
 packages_count = random.randint(5, 15)
@@ -103,6 +106,71 @@ def update_index_file(repo_path):
     os.unlink(join(repo_path, 'Бухгалтерия', FILEFORDELETE))
 
 
+class ManagerTestCase(unittest.TestCase):
+    """
+    Менеджер обновлений с рабочей директорией, папкой установки и репозиторием во временной папке
+
+    Пути рабочей директории (%APPDATA%) и папки установки заданы константами `eiisclient.manager`, на время теста
+    они подменяются (как в `benchmarks/benchenv.py`).
+    """
+    WORK_FILES = ('LOCAL_INDEX_FILE', 'JOURNAL_FILE', 'STORE_DIR', 'FILE_STATE_CACHE', 'SUMMARY_FILE',
+                  'INDEX_SNAPSHOT_FILE', 'RUN_REPORT_FILE', 'TIMELINE_FILE', 'TRACE_FILE', 'METRICS_FILE',
+                  'HISTORY_FILE')
+
+    def setUp(self):
+        import eiisclient.manager as manager
+
+        self.tmp = TempDir(prefix='manager_')
+        self.addCleanup(self.tmp.cleanup)
+        self.work = join(self.tmp.name, 'work')
+        self.repo = join(self.tmp.name, 'repo')
+        self.eiis = join(self.tmp.name, 'eiis')
+        for path in (self.work, self.repo):
+            os.makedirs(path)
+        paths = {name: join(self.work, os.path.basename(getattr(manager, name))) for name in self.WORK_FILES}
+        paths.update(WORK_DIR=self.work, CONFIGFILE=join(self.work, 'config.json'), DEFAULT_INSTALL_PATH=self.eiis,
+                     LOCAL_INDEX_FILE_HASH='{}.sha1'.format(paths['LOCAL_INDEX_FILE']))
+        patcher = mock.patch.multiple(manager, **paths)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        os.makedirs(os.path.expandvars('%TEMP%'), exist_ok=True)  # вне Windows - относительный путь
+
+    def make_repo(self, packages: dict):
+        """
+        Запись файлов пакетов в репозиторий и индексация
+
+        :param packages: {пакет: {относительный путь: данные}}; None вместо данных - удалить файл
+        """
+        from tests.eiisrepo.eiisrepo import Manager as Repomanager
+
+        for package, files in packages.items():
+            for rel, data in files.items():
+                path = join(self.repo, package, rel)
+                if data is None:
+                    os.remove(path)
+                    continue
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as fp:
+                    fp.write(data)
+        Repomanager(self.repo).index()
+
+    def get_manager(self, **config):
+        """Менеджер с настройками `config` (путь к репозиторию - временный)"""
+        from eiisclient.manager import CONFIGFILE, Manager
+
+        config.setdefault('repopath', self.repo)
+        with open(CONFIGFILE, 'w', encoding=encode) as fp:
+            json.dump(config, fp)
+        logger = logging.getLogger('tests.manager')
+        logger.addHandler(logging.NullHandler())
+        manager = Manager(logger=logger)
+        self.addCleanup(manager.close)
+        return manager
+
+
 if __name__ == '__main__':
     logger = logging.Logger('test')
     logger.addHandler(logging.StreamHandler(sys.stdout))